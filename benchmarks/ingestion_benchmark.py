@@ -0,0 +1,202 @@
+"""
+Benchmark of ingestion hot path: TinkoffCollector.__collect_data -> IStorage.save_batch for every storage.
+Results (messages/sec, p50/p99 per-message latency, peak memory) are written as JSON.
+
+Run from the project root:
+python -m benchmarks.ingestion_benchmark --instruments 50 --rate 5000 --duration 10 --profile opening_auction \
+    --output bench_results.json
+python -m benchmarks.ingestion_benchmark --batch-size 1
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from tinkoff.invest import MarketDataResponse
+
+from benchmarks.synthetic_market_data import SyntheticMarketData, SyntheticStreamService, PROFILES
+from configuration.settings import StorageSettings, DataCollectionSettings, StorageQueueSettings, StorageBatchSettings, \
+    PrewarmSettings, TradingScheduleSettings
+from data_collector.tinkoff_collector import TinkoffCollector
+from data_storage.base_storage import IStorage
+from data_storage.queued_storage import QueuedStorage
+from data_storage.storage_factory import StorageFactory
+from invest_api.market_data_record import MarketDataRecord
+from invest_api.market_data_type import MarketDataType
+from observation.instrument_activity_tracker import InstrumentActivityTracker
+
+STORAGE_TYPES = ["FILES_CSV", "FILES_COLUMNAR", "JOURNAL", "SQLITE"]
+
+
+class TimingStorage(IStorage):
+    """
+    Keeps completion time (perf_counter_ns) of every saved message
+    """
+    def __init__(self, storage: IStorage, count: int) -> None:
+        self.__storage = storage
+        self.__index = 0
+
+        self.save_times: list[int] = [0] * count
+
+    @property
+    def keeps_messages(self) -> bool:
+        return self.__storage.keeps_messages
+
+    async def wait_writable(self) -> None:
+        await self.__storage.wait_writable()
+
+    def save(self, market_data: MarketDataResponse) -> None:
+        self.__storage.save(market_data)
+
+        self.save_times[self.__index] = time.perf_counter_ns()
+        self.__index += 1
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.__storage.save_record(record)
+
+        self.save_times[self.__index] = time.perf_counter_ns()
+        self.__index += 1
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        self.__storage.save_batch(records)
+
+        saved = time.perf_counter_ns()
+        for _ in records:
+            self.save_times[self.__index] = saved
+            self.__index += 1
+
+    def flush(self) -> None:
+        self.__storage.flush()
+
+    def close(self) -> None:
+        self.__storage.close()
+
+
+def storage_settings(root_path: str) -> StorageSettings:
+    return StorageSettings(settings={"root_path": root_path, "buffer_row_size": "1000"})
+
+
+def new_collector(storage: IStorage, stream_service: SyntheticStreamService, figies: list[str],
+                  data_collection_settings: DataCollectionSettings,
+                  storage_batch_settings: StorageBatchSettings) -> TinkoffCollector:
+    return TinkoffCollector(
+        "", "", storage, stream_service, figies, data_collection_settings, storage_batch_settings,
+        PrewarmSettings(), TradingScheduleSettings(), 0, InstrumentActivityTracker(20, 900, 20)
+    )
+
+
+def collect(collector: TinkoffCollector) -> None:
+    # The hot path is measured directly, name mangling is expected here
+    asyncio.run(collector._TinkoffCollector__collect_data())
+
+
+def run_storage(storage_type: str, queued: bool, generator: SyntheticMarketData,
+                messages: list, paced: bool, data_collection_settings: DataCollectionSettings,
+                storage_batch_settings: StorageBatchSettings) -> dict:
+    with tempfile.TemporaryDirectory() as root_path:
+        storage = StorageFactory.new_factory(storage_type, storage_settings(root_path))
+        if queued:
+            storage = QueuedStorage(storage, StorageQueueSettings(enabled=True, max_size=100000))
+
+        timing_storage = TimingStorage(storage, len(messages))
+        stream_service = SyntheticStreamService(messages, paced)
+
+        start = time.perf_counter()
+        collect(new_collector(timing_storage, stream_service, generator.figies, data_collection_settings,
+                              storage_batch_settings))
+        duration = time.perf_counter() - start
+
+        # all data is written (queue is drained) before close is finished
+        timing_storage.close()
+        total_duration = time.perf_counter() - start
+
+        latencies_us = sorted(
+            (saved - yielded) / 1000 for saved, yielded in zip(timing_storage.save_times, stream_service.yield_times)
+        )
+
+    with tempfile.TemporaryDirectory() as root_path:
+        storage = StorageFactory.new_factory(storage_type, storage_settings(root_path))
+        if queued:
+            storage = QueuedStorage(storage, StorageQueueSettings(enabled=True, max_size=100000))
+
+        tracemalloc.start()
+        collect(new_collector(storage, SyntheticStreamService(messages, False), generator.figies,
+                              data_collection_settings, storage_batch_settings))
+        storage.close()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "storage": storage_type,
+        "queued": queued,
+        "batch_size": storage_batch_settings.max_size,
+        "messages": len(messages),
+        "duration_sec": duration,
+        "messages_per_sec": len(messages) / duration,
+        "messages_per_sec_including_close": len(messages) / total_duration,
+        "latency_us": {
+            "p50": latencies_us[len(latencies_us) // 2],
+            "p99": latencies_us[min(len(latencies_us) - 1, int(len(latencies_us) * 0.99))],
+            "max": latencies_us[-1],
+            "mean": statistics.fmean(latencies_us)
+        },
+        "peak_memory_bytes": peak_memory
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingestion hot path benchmark")
+    parser.add_argument("--instruments", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=2000, help="Base rate, messages per second")
+    parser.add_argument("--duration", type=float, default=10, help="Duration of synthetic market data, seconds")
+    parser.add_argument("--profile", choices=list(PROFILES.keys()), default="steady")
+    parser.add_argument("--paced", action="store_true", help="Yield messages by schedule instead of max speed")
+    parser.add_argument("--queued", action="store_true", help="Write via QueuedStorage")
+    parser.add_argument("--storage", action="append", choices=STORAGE_TYPES, help="Default: all storages")
+    parser.add_argument("--batch-size", type=int, default=100, help="Max records in a batch, 1 - no batching")
+    parser.add_argument("--batch-delay-ms", type=float, default=5, help="Max delay of a batch, milliseconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    data_collection_settings = DataCollectionSettings(candles=True, trades=True, last_price=True)
+    storage_batch_settings = StorageBatchSettings(max_size=args.batch_size, max_delay_ms=args.batch_delay_ms)
+
+    generator = SyntheticMarketData(
+        args.instruments, args.rate, args.duration, args.profile,
+        [MarketDataType.CANDLE, MarketDataType.TRADE, MarketDataType.TRADE, MarketDataType.LAST_PRICE],
+        args.seed
+    )
+    messages = generator.generate()
+
+    results = []
+    for storage_type in args.storage or STORAGE_TYPES:
+        result = run_storage(storage_type, args.queued, generator, messages, args.paced, data_collection_settings,
+                             storage_batch_settings)
+        results.append(result)
+
+        print(f"{storage_type:15} {result['messages_per_sec']:12.0f} msg/s   "
+              f"p50 {result['latency_us']['p50']:10.1f} us   p99 {result['latency_us']['p99']:10.1f} us   "
+              f"peak {result['peak_memory_bytes'] / 2 ** 20:8.1f} MiB")
+
+    with open(args.output, "w", encoding="UTF8") as file:
+        json.dump(
+            {
+                "parameters": vars(args),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results
+            },
+            file,
+            indent=2
+        )
+
+    print(f"Results have been written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
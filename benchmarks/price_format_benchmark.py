@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of csv price formatting: Decimal (quotation_to_decimal) against fixed point formatting.
+Output of both ways is compared for every sample before measurement.
+
+Run from the project root:
+python -m benchmarks.price_format_benchmark
+"""
+import csv
+import io
+import random
+import timeit
+
+from tinkoff.invest import Quotation
+from tinkoff.invest.utils import quotation_to_decimal
+
+from invest_api.fixed_point_price import format_quotation
+
+ROWS = 100_000
+
+
+def samples() -> list[list[Quotation]]:
+    # candle rows: open, close, high, low with prices like MOEX stocks (1, 2 or 9 fraction digits)
+    generator = random.Random(42)
+    rows = []
+
+    for _ in range(ROWS):
+        units = generator.randint(0, 5000)
+        nano = generator.choice((0, generator.randint(0, 99) * 10_000_000, generator.randint(0, 999_999_999)))
+
+        rows.append([Quotation(units=units, nano=nano) for _ in range(4)])
+
+    rows.append([Quotation(units=0, nano=nano) for nano in (0, 1, 999, 5000)])
+
+    return rows
+
+
+def decimal_rows(rows: list[list[Quotation]]) -> list[list]:
+    return [[quotation_to_decimal(price) for price in row] for row in rows]
+
+
+def fixed_point_rows(rows: list[list[Quotation]]) -> list[list]:
+    return [[format_quotation(price) for price in row] for row in rows]
+
+
+def write_csv(rows: list[list]) -> str:
+    text = io.StringIO()
+    csv.writer(text).writerows(rows)
+
+    return text.getvalue()
+
+
+def main() -> None:
+    rows = samples()
+
+    if write_csv(decimal_rows(rows)) != write_csv(fixed_point_rows(rows)):
+        raise Exception("Fixed point formatting isn't byte-identical with Decimal formatting")
+
+    decimal_sec = timeit.timeit(lambda: write_csv(decimal_rows(rows)), number=1)
+    fixed_point_sec = timeit.timeit(lambda: write_csv(fixed_point_rows(rows)), number=1)
+
+    decimal_format_sec = timeit.timeit(lambda: [[str(price) for price in row] for row in decimal_rows(rows)], number=1)
+    fixed_point_format_sec = timeit.timeit(lambda: fixed_point_rows(rows), number=1)
+
+    print(f"Rows: {len(rows)} (4 prices per row), csv output is byte-identical")
+    print(f"Prices formatting, Decimal:     {decimal_format_sec / len(rows) * 1e6:.3f} us per row")
+    print(f"Prices formatting, fixed point: {fixed_point_format_sec / len(rows) * 1e6:.3f} us per row")
+    print(f"Csv row, Decimal:               {decimal_sec / len(rows) * 1e6:.3f} us per row")
+    print(f"Csv row, fixed point:           {fixed_point_sec / len(rows) * 1e6:.3f} us per row")
+    print(f"Speedup (prices / csv row):     {decimal_format_sec / fixed_point_format_sec:.1f}x / "
+          f"{decimal_sec / fixed_point_sec:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
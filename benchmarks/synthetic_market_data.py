@@ -0,0 +1,155 @@
+import asyncio
+import datetime
+import random
+import time
+from typing import AsyncGenerator, Callable, Optional
+
+from tinkoff.invest import MarketDataResponse, Candle, Trade, LastPrice, Quotation, TradeDirection, \
+    SubscriptionInterval
+
+from configuration.settings import DataCollectionSettings
+from invest_api.market_data_type import MarketDataType
+
+__all__ = ("SyntheticMarketData", "SyntheticStreamService", "PROFILES")
+
+# Burst shapes: function of (offset in sec, duration in sec) -> rate multiplier
+PROFILES: dict[str, Callable[[float, float], float]] = {
+    "steady": lambda offset, duration: 1.0,
+    # 10x rate during the first 10% of the run, then the base rate
+    "opening_auction": lambda offset, duration: 10.0 if offset < duration * 0.1 else 1.0,
+    # 5x rate for one second every ten seconds
+    "bursty": lambda offset, duration: 5.0 if offset % 10 < 1 else 1.0,
+}
+
+
+class SyntheticMarketData:
+    """
+    Deterministic generator of candles, trades and last prices.
+    Every message has schedule offset (seconds from the start) by the burst profile.
+    """
+    def __init__(
+            self,
+            instruments: int,
+            rate_per_sec: float,
+            duration_sec: float,
+            profile: str,
+            data_types: list[MarketDataType],
+            seed: int = 42
+    ) -> None:
+        self.__figies = [f"SYNTH{index:06d}" for index in range(instruments)]
+        self.__rate_per_sec = rate_per_sec
+        self.__duration_sec = duration_sec
+        self.__profile = PROFILES[profile]
+        self.__data_types = data_types
+        self.__random = random.Random(seed)
+
+        self.__prices = {figi: self.__random.randint(10, 5000) * 1_000_000_000 for figi in self.__figies}
+        self.__start_time = datetime.datetime(2022, 11, 2, 7, 0, tzinfo=datetime.timezone.utc)
+
+    @property
+    def figies(self) -> list[str]:
+        return self.__figies
+
+    def generate(self) -> list[tuple[float, MarketDataResponse]]:
+        """
+        :return: List of (schedule offset in seconds, market data)
+        """
+        messages = []
+
+        offset = 0.0
+        while offset < self.__duration_sec:
+            figi = self.__random.choice(self.__figies)
+            data_type = self.__random.choice(self.__data_types)
+
+            messages.append((offset, self.__market_data(figi, data_type, offset)))
+
+            offset += self.__random.expovariate(self.__rate_per_sec * self.__profile(offset, self.__duration_sec))
+
+        return messages
+
+    def __market_data(self, figi: str, data_type: MarketDataType, offset: float) -> MarketDataResponse:
+        # random walk of price by 0.01
+        price = self.__prices[figi] = max(10_000_000, self.__prices[figi] + self.__random.randint(-3, 3) * 10_000_000)
+        event_time = self.__start_time + datetime.timedelta(seconds=offset)
+
+        match data_type:
+            case MarketDataType.CANDLE:
+                return MarketDataResponse(
+                    candle=Candle(
+                        figi=figi,
+                        interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE,
+                        open=SyntheticMarketData.__quotation(price),
+                        high=SyntheticMarketData.__quotation(price + 50_000_000),
+                        low=SyntheticMarketData.__quotation(price - 50_000_000),
+                        close=SyntheticMarketData.__quotation(price + 10_000_000),
+                        volume=self.__random.randint(1, 10000),
+                        time=event_time.replace(second=0, microsecond=0)
+                    )
+                )
+            case MarketDataType.TRADE:
+                return MarketDataResponse(
+                    trade=Trade(
+                        figi=figi,
+                        direction=self.__random.choice(
+                            (TradeDirection.TRADE_DIRECTION_BUY, TradeDirection.TRADE_DIRECTION_SELL)
+                        ),
+                        price=SyntheticMarketData.__quotation(price),
+                        quantity=self.__random.randint(1, 100),
+                        time=event_time
+                    )
+                )
+            case _:
+                return MarketDataResponse(
+                    last_price=LastPrice(
+                        figi=figi,
+                        price=SyntheticMarketData.__quotation(price),
+                        time=event_time
+                    )
+                )
+
+    @staticmethod
+    def __quotation(price: int) -> Quotation:
+        return Quotation(units=price // 1_000_000_000, nano=price % 1_000_000_000)
+
+
+class SyntheticStreamService:
+    """
+    MarketDataStreamService replacement which yields pre-generated market data.
+    If paced, messages are yielded by their schedule, otherwise as fast as possible.
+    Yield time of every message is kept in yield_times (perf_counter_ns) by message index.
+    """
+    def __init__(self, messages: list[tuple[float, MarketDataResponse]], paced: bool) -> None:
+        self.__messages = messages
+        self.__paced = paced
+
+        self.yield_times: list[int] = [0] * len(messages)
+
+    async def start_async_candles_stream(
+            self,
+            figies: list[str],
+            settings: DataCollectionSettings,
+            on_reconnect: Optional[Callable[[list[str]], None]] = None
+    ) -> AsyncGenerator[MarketDataResponse, None]:
+        start = time.perf_counter()
+
+        for index, (offset, market_data) in enumerate(self.__messages):
+            if self.__paced:
+                delay = start + offset - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                # latency is calculated from the scheduled time, so backlog under bursts is visible
+                self.yield_times[index] = int((start + offset) * 1e9)
+            else:
+                self.yield_times[index] = time.perf_counter_ns()
+
+            yield market_data
+
+    def is_ready(self) -> bool:
+        return True
+
+    def stop_candles_stream(self) -> None:
+        pass
+
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        pass
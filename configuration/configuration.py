@@ -1,13 +1,18 @@
-from configparser import ConfigParser
+from configparser import ConfigParser, SectionProxy
+from typing import Optional, Union
 
-from configuration.settings import DataCollectionSettings, StockFigi, StorageSettings, WatcherSettings
+from configuration.settings import DataCollectionSettings, StockFigi, StorageSettings, StorageQueueSettings, \
+    StorageBatchSettings, DedupSettings, CompactionSettings, WatcherSettings, MarketDataStreamSettings, \
+    PrewarmSettings, TradingScheduleSettings, BackfillSettings, MetricsSettings, LoggingSettings
 
 __all__ = ("ProgramConfiguration")
 
 
 class ProgramConfiguration:
     """
-    Represent collector configuration
+    Represent collector configuration.
+    Sections and options added after the first version are optional: defaults of settings classes are used
+    for missing ones, so an existing settings.ini is loaded as is.
     """
     def __init__(self, file_name: str) -> None:
         # classic ini file
@@ -16,6 +21,9 @@ class ProgramConfiguration:
 
         self.__tinkoff_token = config["INVEST_API"]["TOKEN"]
         self.__tinkoff_app_name = config["INVEST_API"]["APP_NAME"]
+        # Empty values mean the default API endpoint and system root certificates
+        self.__tinkoff_target = config["INVEST_API"].get("TARGET", "")
+        self.__tinkoff_root_certificates = config["INVEST_API"].get("ROOT_CERTIFICATES", "")
 
         self.__data_collection_settings = DataCollectionSettings(
             candles=bool(int(config["DATA_COLLECTION"]["CANDLES"])),
@@ -23,9 +31,63 @@ class ProgramConfiguration:
             last_price=bool(int(config["DATA_COLLECTION"]["LAST_PRICE"]))
         )
 
+        watcher = config["WATCHER"]
         self.__watcher_settings = WatcherSettings(
-            max_sec_api_silence=int(config["WATCHER"]["MAX_SEC_API_SILENCE"]),
-            delay_between_api_errors_sec=int(config["WATCHER"]["DELAY_BETWEEN_API_ERRORS_SEC"])
+            max_sec_api_silence=int(watcher["MAX_SEC_API_SILENCE"]),
+            delay_between_api_errors_sec=int(watcher["DELAY_BETWEEN_API_ERRORS_SEC"]),
+            instrument_silence_min_sec=int(
+                watcher.get("INSTRUMENT_SILENCE_MIN_SEC", WatcherSettings.instrument_silence_min_sec)
+            ),
+            instrument_silence_max_sec=int(
+                watcher.get("INSTRUMENT_SILENCE_MAX_SEC", WatcherSettings.instrument_silence_max_sec)
+            ),
+            instrument_silence_rate_factor=float(
+                watcher.get("INSTRUMENT_SILENCE_RATE_FACTOR", WatcherSettings.instrument_silence_rate_factor)
+            )
+        )
+
+        stream = self.__section(config, "MARKET_DATA_STREAM")
+        self.__market_data_stream_settings = MarketDataStreamSettings(
+            shards_count=int(stream.get("SHARDS_COUNT", MarketDataStreamSettings.shards_count)),
+            reconnect_delay_sec=int(stream.get("RECONNECT_DELAY_SEC", MarketDataStreamSettings.reconnect_delay_sec)),
+            redundant=bool(int(stream.get("REDUNDANT", MarketDataStreamSettings.redundant))),
+            redundant_window=int(stream.get("REDUNDANT_WINDOW", MarketDataStreamSettings.redundant_window)),
+            redundant_silence_sec=int(
+                stream.get("REDUNDANT_SILENCE_SEC", MarketDataStreamSettings.redundant_silence_sec)
+            )
+        )
+
+        prewarm = self.__section(config, "PREWARM")
+        self.__prewarm_settings = PrewarmSettings(
+            lead_time_sec=int(prewarm.get("LEAD_TIME_SEC", PrewarmSettings.lead_time_sec)),
+            pre_session_policy=prewarm.get("PRE_SESSION_POLICY", PrewarmSettings.pre_session_policy),
+            max_buffer_size=int(prewarm.get("MAX_BUFFER_SIZE", PrewarmSettings.max_buffer_size))
+        )
+
+        schedule = self.__section(config, "TRADING_SCHEDULE")
+        self.__trading_schedule_settings = TradingScheduleSettings(
+            window_days=int(schedule.get("WINDOW_DAYS", TradingScheduleSettings.window_days)),
+            cache_path=schedule.get("CACHE_PATH", TradingScheduleSettings.cache_path),
+            cache_ttl_hours=float(schedule.get("CACHE_TTL_HOURS", TradingScheduleSettings.cache_ttl_hours))
+        )
+
+        backfill = self.__section(config, "BACKFILL")
+        self.__backfill_settings = BackfillSettings(
+            enabled=bool(int(backfill.get("ENABLED", BackfillSettings.enabled))),
+            max_concurrency=int(backfill.get("MAX_CONCURRENCY", BackfillSettings.max_concurrency))
+        )
+
+        metrics = self.__section(config, "METRICS")
+        self.__metrics_settings = MetricsSettings(
+            enabled=bool(int(metrics.get("ENABLED", MetricsSettings.enabled))),
+            host=metrics.get("HOST", MetricsSettings.host),
+            port=int(metrics.get("PORT", MetricsSettings.port))
+        )
+
+        logging_section = self.__section(config, "LOGGING")
+        self.__logging_settings = LoggingSettings(
+            level=logging_section.get("LEVEL", LoggingSettings.level).upper(),
+            debug_sample_rate=float(logging_section.get("DEBUG_SAMPLE_RATE", LoggingSettings.debug_sample_rate))
         )
 
         self.__stock_figies: list[StockFigi] = []
@@ -43,6 +105,42 @@ class ProgramConfiguration:
             settings=dict(config["STORAGE_SETTINGS"])
         )
 
+        queue = self.__section(config, "STORAGE_QUEUE")
+        self.__storage_queue_settings = StorageQueueSettings(
+            enabled=bool(int(queue.get("ENABLED", StorageQueueSettings.enabled))),
+            max_size=int(queue.get("MAX_SIZE", StorageQueueSettings.max_size)),
+            overflow_policy=queue.get("OVERFLOW_POLICY", StorageQueueSettings.overflow_policy),
+            spill_path=queue.get("SPILL_PATH", StorageQueueSettings.spill_path)
+        )
+
+        batch = self.__section(config, "STORAGE_BATCH")
+        self.__storage_batch_settings = StorageBatchSettings(
+            max_size=int(batch.get("MAX_SIZE", StorageBatchSettings.max_size)),
+            max_delay_ms=float(batch.get("MAX_DELAY_MS", StorageBatchSettings.max_delay_ms))
+        )
+
+        dedup = self.__section(config, "DEDUP")
+        self.__dedup_settings = DedupSettings(
+            enabled=bool(int(dedup.get("ENABLED", DedupSettings.enabled))),
+            recent_trades=int(dedup.get("RECENT_TRADES", DedupSettings.recent_trades)),
+            candle_close_delay_sec=float(dedup.get("CANDLE_CLOSE_DELAY_SEC", DedupSettings.candle_close_delay_sec))
+        )
+
+        compaction = self.__section(config, "COMPACTION")
+        self.__compaction_settings = CompactionSettings(
+            enabled=bool(int(compaction.get("ENABLED", CompactionSettings.enabled))),
+            partition=compaction.get("PARTITION", CompactionSettings.partition),
+            processes=int(compaction.get("PROCESSES", CompactionSettings.processes)),
+            block_rows=int(compaction.get("BLOCK_ROWS", CompactionSettings.block_rows))
+        )
+
+    @staticmethod
+    def __section(config: ConfigParser, name: str) -> Union[SectionProxy, dict]:
+        """
+        :return: Section or empty dict if the section is missing, options are read with defaults
+        """
+        return config[name] if config.has_section(name) else dict()
+
     @property
     def tinkoff_token(self) -> str:
         return self.__tinkoff_token
@@ -51,6 +149,14 @@ class ProgramConfiguration:
     def tinkoff_app_name(self) -> str:
         return self.__tinkoff_app_name
 
+    @property
+    def tinkoff_target(self) -> Optional[str]:
+        return self.__tinkoff_target or None
+
+    @property
+    def tinkoff_root_certificates(self) -> str:
+        return self.__tinkoff_root_certificates
+
     @property
     def data_collection_settings(self) -> DataCollectionSettings:
         return self.__data_collection_settings
@@ -59,6 +165,30 @@ class ProgramConfiguration:
     def watcher_settings(self) -> WatcherSettings:
         return self.__watcher_settings
 
+    @property
+    def market_data_stream_settings(self) -> MarketDataStreamSettings:
+        return self.__market_data_stream_settings
+
+    @property
+    def prewarm_settings(self) -> PrewarmSettings:
+        return self.__prewarm_settings
+
+    @property
+    def trading_schedule_settings(self) -> TradingScheduleSettings:
+        return self.__trading_schedule_settings
+
+    @property
+    def backfill_settings(self) -> BackfillSettings:
+        return self.__backfill_settings
+
+    @property
+    def metrics_settings(self) -> MetricsSettings:
+        return self.__metrics_settings
+
+    @property
+    def logging_settings(self) -> LoggingSettings:
+        return self.__logging_settings
+
     @property
     def download_figi(self) -> list[str]:
         return [stock.figi for stock in self.__stock_figies]
@@ -70,3 +200,19 @@ class ProgramConfiguration:
     @property
     def storage_settings(self) -> StorageSettings:
         return self.__storage_settings
+
+    @property
+    def storage_queue_settings(self) -> StorageQueueSettings:
+        return self.__storage_queue_settings
+
+    @property
+    def storage_batch_settings(self) -> StorageBatchSettings:
+        return self.__storage_batch_settings
+
+    @property
+    def dedup_settings(self) -> DedupSettings:
+        return self.__dedup_settings
+
+    @property
+    def compaction_settings(self) -> CompactionSettings:
+        return self.__compaction_settings
@@ -1,6 +1,10 @@
 from dataclasses import dataclass, field
 
-__all__ = ("DataCollectionSettings", "StockFigi", "StorageSettings", "WatcherSettings")
+__all__ = (
+    "DataCollectionSettings", "StockFigi", "StorageSettings", "StorageQueueSettings", "StorageBatchSettings",
+    "DedupSettings", "CompactionSettings", "WatcherSettings", "MarketDataStreamSettings", "PrewarmSettings",
+    "TradingScheduleSettings", "BackfillSettings", "MetricsSettings", "LoggingSettings"
+)
 
 
 @dataclass(eq=False, repr=True)
@@ -27,3 +31,101 @@ class StorageSettings:
 class WatcherSettings:
     max_sec_api_silence: int
     delay_between_api_errors_sec: int
+    # Per instrument silence: rate_factor * average interval between events, limited by [min_sec, max_sec]
+    instrument_silence_min_sec: int = 20
+    instrument_silence_max_sec: int = 900
+    instrument_silence_rate_factor: float = 20
+
+
+@dataclass(eq=False, repr=True)
+class StorageQueueSettings:
+    enabled: bool = False
+    max_size: int = 10000
+    # BLOCK, DROP_OLDEST or SPILL
+    overflow_policy: str = "DROP_OLDEST"
+    spill_path: str = ""
+
+
+@dataclass(eq=False, repr=True)
+class StorageBatchSettings:
+    # Market data is saved by batches: a batch is saved if it has max_size records or it is older than max_delay_ms
+    max_size: int = 100
+    max_delay_ms: float = 5
+
+
+@dataclass(eq=False, repr=True)
+class DedupSettings:
+    # Duplicates (e.g. re-sent after resubscribe) are dropped before storage
+    enabled: bool = False
+    # Count of recent trades per figi to compare with
+    recent_trades: int = 1000
+    # A collapsed candle is saved if its minute was finished more than the delay ago (or the next minute has come)
+    candle_close_delay_sec: float = 10
+
+
+@dataclass(eq=False, repr=True)
+class CompactionSettings:
+    # Csv files (FILES_CSV storage) are compacted after trade session
+    enabled: bool = False
+    # DAY or MONTH: files of a day or of a month are merged into one compressed file
+    partition: str = "DAY"
+    # Figies are compacted in parallel processes
+    processes: int = 2
+    # Rows per compressed block (one index entry per block)
+    block_rows: int = 10000
+
+
+@dataclass(eq=False, repr=True)
+class MarketDataStreamSettings:
+    # Subscriptions (figi and data type pairs) are split between shards. Every shard is a separate stream.
+    shards_count: int = 1
+    reconnect_delay_sec: int = 5
+    # Every subscription is received by two independent streams, the first received event wins
+    redundant: bool = False
+    # Count of recent events remembered to drop their copies from the other stream
+    redundant_window: int = 20000
+    # A stream is restarted if it has received nothing this long while the same stream of the other copy has
+    redundant_silence_sec: int = 30
+
+
+@dataclass(eq=False, repr=True)
+class PrewarmSettings:
+    # The stream is connected and subscribed lead_time_sec before session start
+    lead_time_sec: int = 0
+    # Market data received before session start: BUFFER - save it at session start, DROP - drop it
+    pre_session_policy: str = "BUFFER"
+    # Max count of buffered records, the rest is dropped
+    max_buffer_size: int = 100000
+
+
+@dataclass(eq=False, repr=True)
+class TradingScheduleSettings:
+    # Schedule of window_days days is requested by one call
+    window_days: int = 14
+    # File of cached schedule, empty - cache in memory only
+    cache_path: str = ""
+    # Older schedule is refreshed in background (it is served meanwhile)
+    cache_ttl_hours: float = 12
+
+
+@dataclass(eq=False, repr=True)
+class BackfillSettings:
+    enabled: bool = False
+    # Max count of concurrent historical candles requests
+    max_concurrency: int = 4
+
+
+@dataclass(eq=False, repr=True)
+class MetricsSettings:
+    enabled: bool = False
+    # Local endpoint by default: http://127.0.0.1:9108/metrics
+    host: str = "127.0.0.1"
+    port: int = 9108
+
+
+@dataclass(eq=False, repr=True)
+class LoggingSettings:
+    # Name of logging level: DEBUG, INFO, WARNING, ERROR
+    level: str = "INFO"
+    # Share of per-message debug logs to write: 1 - all, 0.01 - every hundredth, 0 - nothing
+    debug_sample_rate: float = 0.01
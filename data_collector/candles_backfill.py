@@ -0,0 +1,111 @@
+import asyncio
+import datetime
+import logging
+import time
+
+from tinkoff.invest import HistoricCandle
+
+from data_storage.base_storage import IStorage
+from invest_api.fixed_point_price import quotation_to_nanos
+from invest_api.market_data_record import CandleRecord, figi_id, figi_by_id, datetime_to_ns, ns_to_datetime
+from invest_api.services.market_data_service import MarketDataService
+
+__all__ = ("CandlesBackfill")
+
+logger = logging.getLogger(__name__)
+
+
+class CandlesBackfill:
+    """
+    The class fills gaps of one minute candles after stream reconnects via historical candles API.
+
+    The last persisted candle time is tracked for every figi. After reconnect completed candles
+    from the last persisted candle to the current (in progress) minute are downloaded and saved.
+    The last persisted candle is downloaded again: it has been usually persisted from the stream while in progress,
+    its final update is saved after it (the later row of a minute is the later update, see DedupStorage).
+    The current minute isn't downloaded, the stream sends it after reconnect.
+    """
+    def __init__(self, market_data_service: MarketDataService, storage: IStorage, max_concurrency: int) -> None:
+        self.__market_data_service = market_data_service
+        self.__storage = storage
+
+        # Limits count of concurrent API requests across all figies
+        self.__semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        # figi id -> time (ns since epoch) of the last persisted candle
+        self.__last_candle_times: dict[int, int] = dict()
+
+    def reset(self) -> None:
+        """
+        Forgets last candles (e.g. a new trade day)
+        """
+        self.__last_candle_times.clear()
+
+    def update(self, candle: CandleRecord) -> None:
+        last_time = self.__last_candle_times.get(candle.figi_id)
+
+        if not last_time or last_time < candle.time_ns:
+            self.__last_candle_times[candle.figi_id] = candle.time_ns
+
+    async def backfill(self, figies: list[str]) -> None:
+        """
+        Fills gaps for figies with known last candle. The method doesn't raise exceptions.
+        """
+        now = datetime_to_ns(
+            datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc, second=0, microsecond=0)
+        )
+        figi_ids = {figi_id(figi) for figi in figies}
+
+        await asyncio.gather(
+            *[
+                self.__backfill_figi(figi_by_id(id_), last_time, now)
+                for id_, last_time in self.__last_candle_times.items()
+                if id_ in figi_ids and last_time < now
+            ]
+        )
+
+    async def __backfill_figi(self, figi: str, last_time: int, current_minute: int) -> None:
+        async with self.__semaphore:
+            try:
+                logger.info(f"Backfill candles for {figi} from {ns_to_datetime(last_time)} "
+                            f"to {ns_to_datetime(current_minute)}")
+
+                candles = await self.__market_data_service.get_one_minute_candles(
+                    figi,
+                    ns_to_datetime(last_time),
+                    ns_to_datetime(current_minute)
+                )
+
+                receive_time_ns = time.time_ns()
+
+                batch = []
+                for historic_candle in candles:
+                    candle = CandlesBackfill.__to_record(figi, historic_candle)
+                    candle.receive_time_ns = receive_time_ns
+
+                    # the current minute is skipped
+                    if historic_candle.is_complete and last_time <= candle.time_ns < current_minute:
+                        batch.append(candle)
+
+                if batch:
+                    self.__storage.save_batch(batch)
+
+                    for candle in batch:
+                        self.update(candle)
+
+                logger.info(f"Backfill candles for {figi} has been finished: {len(batch)} candles")
+
+            except Exception as ex:
+                logger.error(f"Backfill candles for {figi} error: {repr(ex)}")
+
+    @staticmethod
+    def __to_record(figi: str, historic_candle: HistoricCandle) -> CandleRecord:
+        return CandleRecord(
+            figi_id(figi),
+            datetime_to_ns(historic_candle.time),
+            quotation_to_nanos(historic_candle.open),
+            quotation_to_nanos(historic_candle.close),
+            quotation_to_nanos(historic_candle.high),
+            quotation_to_nanos(historic_candle.low),
+            historic_candle.volume
+        )
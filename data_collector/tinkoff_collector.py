@@ -1,24 +1,56 @@
 import asyncio
 import datetime
 import logging
+import time
+from typing import Optional
 
-from tinkoff.invest import MarketDataResponse
-
-from configuration.settings import DataCollectionSettings
+from configuration.settings import DataCollectionSettings, StorageBatchSettings, PrewarmSettings, \
+    TradingScheduleSettings
+from data_collector.candles_backfill import CandlesBackfill
+from data_storage.files_csv.csv_compaction import CSVCompaction
 from data_storage.base_storage import IStorage
+from invest_api.market_data_record import MarketDataRecord, CandleRecord, market_data_record, figi_by_id
+from invest_api.market_data_type import MarketDataType
 from invest_api.services.instrument_service import InstrumentService
 from invest_api.services.market_data_stream_service import MarketDataStreamService
+from invest_api.services.trading_schedule_service import TradingScheduleService
+from metrics.metrics_registry import REGISTRY, LATENCY_BUCKETS
+from observation.instrument_activity_tracker import InstrumentActivityTracker
 from observation.observable import IObservableDataCollector
 
 __all__ = ("TinkoffCollector")
 
 logger = logging.getLogger(__name__)
 
+MESSAGES_RECEIVED = REGISTRY.counter(
+    "messages_received_total", "Market data messages received by figi and data type", ("figi", "type")
+)
+RECEIVE_LAG_SECONDS = REGISTRY.histogram(
+    "receive_lag_seconds",
+    "Receive time minus exchange time of market data (candles: since the candle minute start)",
+    (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+    ("type",)
+)
+STORAGE_SAVE_SECONDS = REGISTRY.histogram(
+    "storage_save_seconds", "Duration of IStorage.save_batch call in the collector loop", LATENCY_BUCKETS
+)
+STORAGE_BATCH_SIZE = REGISTRY.histogram(
+    "storage_batch_size", "Count of records in saved batches", (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+)
+PRE_SESSION_DROPPED = REGISTRY.counter(
+    "pre_session_dropped_total", "Market data received before session start and dropped (policy or full buffer)"
+)
+
 
 class TinkoffCollector(IObservableDataCollector):
     """
     The class encapsulate market data collection process
+
+    The stream is started before session start (pre-warm lead time): connection and subscriptions are ready
+    when the session starts. Market data received before session start is buffered or dropped by policy.
     """
+    __BUFFER_POLICY = "BUFFER"
+    __DROP_POLICY = "DROP"
 
     def __init__(
             self,
@@ -28,15 +60,49 @@ class TinkoffCollector(IObservableDataCollector):
             market_data_stream_service: MarketDataStreamService,
             download_figi: list[str],
             data_collection_settings: DataCollectionSettings,
-            api_errors_delay: int
+            storage_batch_settings: StorageBatchSettings,
+            prewarm_settings: PrewarmSettings,
+            trading_schedule_settings: TradingScheduleSettings,
+            api_errors_delay: int,
+            activity_tracker: InstrumentActivityTracker,
+            candles_backfill: Optional[CandlesBackfill] = None,
+            csv_compaction: Optional[CSVCompaction] = None,
+            target: Optional[str] = None
     ) -> None:
-        self.__token = token
-        self.__app_name = app_name
+        # The schedule is cached between days
+        self.__trading_schedule_service = TradingScheduleService(
+            InstrumentService(token, app_name, target),
+            trading_schedule_settings
+        )
 
         self.__storage = storage
-
-        self.__last_event: datetime = None
+        # Original messages are kept in records for storages which write them as is
+        self.__keep_messages = storage.keeps_messages
+
+        # Records are gathered from the stream and saved by batches: by count or by time since the first record
+        self.__batch_max_size = max(1, storage_batch_settings.max_size)
+        self.__batch_max_delay_sec = storage_batch_settings.max_delay_ms / 1000
+        self.__batch: list[MarketDataRecord] = []
+        self.__batch_timer: Optional[asyncio.TimerHandle] = None
+
+        self.__prewarm_lead_time = datetime.timedelta(seconds=max(0, prewarm_settings.lead_time_sec))
+        self.__pre_session_policy = prewarm_settings.pre_session_policy.upper()
+        if self.__pre_session_policy not in (self.__BUFFER_POLICY, self.__DROP_POLICY):
+            raise Exception(f"TinkoffCollector: Unknown pre-session policy: {prewarm_settings.pre_session_policy}")
+
+        self.__pre_session_max_size = max(0, prewarm_settings.max_buffer_size)
+        # Records received before session start (BUFFER policy), they are saved at session start
+        self.__pre_session_buffer: list[MarketDataRecord] = []
+        self.__pre_session_dropped = 0
+        self.__pre_session = False
+        self.__session_timer: Optional[asyncio.TimerHandle] = None
+
+        # monotonic time of the last received event
+        self.__last_event = 0.0
+        self.__has_events = False
         self.__collections_progress = False
+        self.__collection_started = asyncio.Event()
+        self.__collection_stopped = asyncio.Event()
 
         self.__market_data_stream_service = market_data_stream_service
 
@@ -45,6 +111,13 @@ class TinkoffCollector(IObservableDataCollector):
 
         self.__api_errors_delay = api_errors_delay
 
+        self.__activity_tracker = activity_tracker
+
+        self.__candles_backfill = candles_backfill if data_collection_settings.candles else None
+        self.__backfill_tasks: set[asyncio.Task] = set()
+
+        self.__csv_compaction = csv_compaction
+
     async def worker(self) -> None:
         logger.info("Start every day data collecting")
 
@@ -52,10 +125,8 @@ class TinkoffCollector(IObservableDataCollector):
             logger.info("Check trading schedule on today")
 
             try:
-                is_trading_day, start_time, end_time = InstrumentService(
-                    self.__token,
-                    self.__app_name
-                ).moex_today_trading_schedule()
+                is_trading_day, start_time, end_time = \
+                    await self.__trading_schedule_service.moex_today_trading_schedule()
                 # for tests purposes
                 # is_trading_day, start_time, end_time = \
                 #    True, \
@@ -65,16 +136,21 @@ class TinkoffCollector(IObservableDataCollector):
                 if is_trading_day and datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc) < end_time:
                     logger.info(f"Today is trading day. Data collection will start after {start_time}")
 
-                    await TinkoffCollector.__sleep_to(start_time)
+                    if self.__candles_backfill:
+                        self.__candles_backfill.reset()
+
+                    await TinkoffCollector.__sleep_to(start_time - self.__prewarm_lead_time)
 
                     while datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc) < end_time:
                         try:
-                            await self.__collect_data()
+                            await self.__collect_data(start_time)
                         except Exception as ex:
                             logger.info(f"Collect error: {repr(ex)}")
                             logger.info(f"Try again after {self.__api_errors_delay} seconds")
                             await asyncio.sleep(self.__api_errors_delay)
 
+                    await self.__compact()
+
                 else:
                     logger.info("Nothing to collect today")
 
@@ -88,49 +164,216 @@ class TinkoffCollector(IObservableDataCollector):
             logger.info("Sleep to next morning")
             await TinkoffCollector.__sleep_to_next_morning()
 
-    async def __collect_data(self) -> None:
+    async def __collect_data(self, session_start: Optional[datetime.datetime] = None) -> None:
         logger.info(f"Trading day has been started")
 
-        self.__update_collection_status(True)
+        before_session_sec = (
+            session_start - datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+        ).total_seconds() if session_start else 0
+
+        if before_session_sec > 0:
+            # The watcher starts at session start, there is no market data before it
+            logger.info(f"Pre-warm: stream is started {before_session_sec:.1f} sec before session start")
+
+            self.__pre_session = True
+            self.__session_timer = asyncio.get_running_loop().call_later(before_session_sec, self.__start_session)
+        else:
+            self.__update_collection_status(True)
+
+        # Gaps since the previous collection (after restart or error) are filled
+        self.__start_backfill(self.__download_figi)
 
         try:
             async for marketdata in self.__market_data_stream_service.start_async_candles_stream(
                     self.__download_figi,
-                    self.__data_collection_settings
+                    self.__data_collection_settings,
+                    self.__start_backfill
             ):
-                self.__update_last_event(marketdata)
-                self.__storage.save(marketdata)
+                # Market data is converted once, storages and trackers get the record
+                record = market_data_record(marketdata)
+                if record is None:
+                    continue
+
+                # Storages behind the queue write receive time of the event loop
+                record.receive_time_ns = time.time_ns()
+
+                if self.__keep_messages:
+                    record.market_data = marketdata
+
+                if self.__pre_session:
+                    self.__keep_pre_session(record)
+                    continue
+
+                self.__update_last_event(record)
+
+                self.__batch.append(record)
+
+                if len(self.__batch) >= self.__batch_max_size:
+                    self.__save_batch()
+                    # Back-pressure of the storage once per batch (e.g. full storage queue with BLOCK policy)
+                    await self.__storage.wait_writable()
+                elif not self.__batch_timer:
+                    await self.__storage.wait_writable()
+                    self.__batch_timer = asyncio.get_running_loop().call_later(
+                        self.__batch_max_delay_sec,
+                        self.__save_batch
+                    )
+
+                if self.__candles_backfill and type(record) is CandleRecord:
+                    self.__candles_backfill.update(record)
         finally:
-            self.__update_collection_status(False)
+            if self.__session_timer:
+                self.__session_timer.cancel()
+                self.__session_timer = None
+
+            self.__save_batch()
+
+            # The watcher isn't started before session. Buffered records are kept for the next try.
+            if not self.__pre_session:
+                self.__update_collection_status(False)
+            self.__pre_session = False
+
+            self.__storage.flush()
 
         logger.info(f"Trading day has been finished")
 
-    def __update_last_event(self, market_data: MarketDataResponse) -> None:
-        if market_data.candle:
-            if (not self.__last_event) or self.__last_event < market_data.candle.time:
-                self.__last_event = market_data.candle.time
-        elif market_data.trade:
-            if (not self.__last_event) or self.__last_event < market_data.trade.time:
-                self.__last_event = market_data.trade.time
-        elif market_data.last_price:
-            if (not self.__last_event) or self.__last_event < market_data.last_price.time:
-                self.__last_event = market_data.last_price.time
-
-    def last_event_time(self) -> datetime:
+    def __keep_pre_session(self, record: MarketDataRecord) -> None:
+        if self.__pre_session_policy == self.__BUFFER_POLICY \
+                and len(self.__pre_session_buffer) < self.__pre_session_max_size:
+            self.__pre_session_buffer.append(record)
+        else:
+            self.__pre_session_dropped += 1
+            PRE_SESSION_DROPPED.inc()
+
+    def __start_session(self) -> None:
+        self.__session_timer = None
+        self.__pre_session = False
+
+        if self.__market_data_stream_service.is_ready():
+            logger.info("Session has been started, market data stream is ready")
+        else:
+            logger.warning("Session has been started, market data stream isn't ready yet")
+
+        buffered, self.__pre_session_buffer = self.__pre_session_buffer, []
+        if buffered:
+            logger.info(f"Pre-session market data is saved: {len(buffered)} records")
+
+            self.__batch.extend(buffered)
+            self.__save_batch()
+
+            if self.__candles_backfill:
+                for record in buffered:
+                    if type(record) is CandleRecord:
+                        self.__candles_backfill.update(record)
+
+        if self.__pre_session_dropped:
+            logger.info(f"Pre-session market data has been dropped: {self.__pre_session_dropped} records")
+            self.__pre_session_dropped = 0
+
+        self.__update_collection_status(True)
+
+    def __save_batch(self) -> None:
+        if self.__batch_timer:
+            self.__batch_timer.cancel()
+            self.__batch_timer = None
+
+        if not self.__batch:
+            return
+
+        batch, self.__batch = self.__batch, []
+
+        save_start = time.perf_counter()
+        self.__storage.save_batch(batch)
+        STORAGE_SAVE_SECONDS.observe(time.perf_counter() - save_start)
+        STORAGE_BATCH_SIZE.observe(len(batch))
+
+    async def __compact(self) -> None:
+        if self.__csv_compaction:
+            # Today's files can be still written (e.g. via storage queue), they are compacted after the next session
+            await asyncio.to_thread(self.__csv_compaction.compact, datetime.datetime.utcnow().date())
+
+    def __start_backfill(self, figies: list[str]) -> None:
+        if self.__candles_backfill:
+            task = asyncio.create_task(self.__candles_backfill.backfill(figies))
+
+            self.__backfill_tasks.add(task)
+            task.add_done_callback(self.__backfill_tasks.discard)
+
+    def __update_last_event(self, record: MarketDataRecord) -> None:
+        # It is called for every event: receive time is taken once, the watchdog deadline is re-armed by assignment
+        now = self.__last_event = time.monotonic()
+        self.__has_events = True
+
+        figi, data_type = figi_by_id(record.figi_id), record.DATA_TYPE
+
+        self.__activity_tracker.update(figi, data_type, now)
+
+        MESSAGES_RECEIVED.inc((figi, data_type.value))
+        RECEIVE_LAG_SECONDS.observe((record.receive_time_ns - record.time_ns) / 1e9, (data_type.value,))
+
+    def last_event_time(self) -> float:
         return self.__last_event
 
+    def has_events(self) -> bool:
+        return self.__has_events
+
     def __update_collection_status(self, status: bool) -> None:
         self.__collections_progress = status
-        self.__last_event = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc) if status else None
+        self.__last_event = time.monotonic()
+        self.__has_events = False
+
+        if status:
+            self.__activity_tracker.start(self.__subscriptions(), self.__last_event)
+            self.__collection_stopped.clear()
+            self.__collection_started.set()
+        else:
+            self.__activity_tracker.stop()
+            self.__collection_started.clear()
+            # Waiters are woken even if the next collection is started before they run
+            self.__collection_stopped.set()
+
+    def __subscriptions(self) -> list[tuple[str, MarketDataType]]:
+        subscriptions = []
+
+        if self.__data_collection_settings.candles:
+            subscriptions.extend((figi, MarketDataType.CANDLE) for figi in self.__download_figi)
+        if self.__data_collection_settings.trades:
+            subscriptions.extend((figi, MarketDataType.TRADE) for figi in self.__download_figi)
+        if self.__data_collection_settings.last_price:
+            subscriptions.extend((figi, MarketDataType.LAST_PRICE) for figi in self.__download_figi)
+
+        return subscriptions
 
     def is_collection_in_progress(self) -> bool:
         return self.__collections_progress
 
+    async def wait_collection_in_progress(self) -> None:
+        await self.__collection_started.wait()
+
+    async def wait_collection_stopped(self) -> None:
+        await self.__collection_stopped.wait()
+
     def restart(self) -> None:
         if self.is_collection_in_progress():
             logger.info(f"Restart required. Stopping stream. ")
             self.__market_data_stream_service.stop_candles_stream()
 
+            # The watchdog waits for the next collection start
+            self.__update_collection_status(False)
+
+    def stale_subscriptions(self) -> list[tuple[str, MarketDataType]]:
+        return self.__activity_tracker.stale(time.monotonic())
+
+    def next_stale_deadline(self) -> float:
+        return self.__activity_tracker.next_deadline()
+
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        if self.is_collection_in_progress():
+            logger.info(f"Resubscribe required: {figi} {data_type.value}")
+
+            self.__market_data_stream_service.resubscribe(figi, data_type)
+            self.__activity_tracker.reset(figi, data_type, time.monotonic())
+
     @staticmethod
     async def __sleep_to_next_morning() -> None:
         future = datetime.datetime.utcnow() + datetime.timedelta(days=1)
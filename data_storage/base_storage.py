@@ -1,11 +1,71 @@
 import abc
+import datetime
 
 from tinkoff.invest import MarketDataResponse
 
-__all__ = ("IStorage")
+from invest_api.market_data_record import MarketDataRecord, record_to_market_data
+from metrics.metrics_registry import REGISTRY, LATENCY_BUCKETS
+
+__all__ = ("IStorage", "STORAGE_WRITE_SECONDS", "STORAGE_BYTES_WRITTEN")
+
+# Storages record their physical writes (buffer flush, journal append, database commit) by storage type name
+STORAGE_WRITE_SECONDS = REGISTRY.histogram(
+    "storage_write_seconds", "Duration of physical writes of storages", LATENCY_BUCKETS, ("storage",)
+)
+STORAGE_BYTES_WRITTEN = REGISTRY.counter("storage_bytes_written_total", "Bytes written by file storages", ("storage",))
 
 
 class IStorage(abc.ABC):
     @abc.abstractmethod
     def save(self, market_data: MarketDataResponse) -> None:
         pass
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        """
+        Saves internal record (see market_data_record), it is used by the collector.
+        The default implementation converts record back to SDK dataclasses, storages override it to skip conversion.
+        """
+        self.save(record_to_market_data(record))
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        """
+        Saves records in order of the list, the collector gathers them from the stream by count or by time.
+        The default implementation saves records one by one, storages override it to write whole batch at once.
+        """
+        for record in records:
+            self.save_record(record)
+
+    @property
+    def keeps_messages(self) -> bool:
+        """
+        The storage writes original messages of the stream as is (e.g. all fields of protobuf message).
+        The collector sets MarketDataRecord.market_data for such storages only.
+        """
+        return False
+
+    async def wait_writable(self) -> None:
+        """
+        Waits until the storage can take more data (back-pressure for async producers, e.g. the collector).
+        The default implementation returns at once.
+        """
+        pass
+
+    def tail_records(self, day: datetime.date, max_records: int) -> list[MarketDataRecord]:
+        """
+        Returns the last written records of the day: up to max_records per figi and data type, in write order.
+        It is called on startup to restore state of deduplication (see DedupStorage).
+        The default implementation returns nothing, storages override it to read the end of their files.
+        """
+        return []
+
+    def flush(self) -> None:
+        """
+        Writes all buffered data. Is called when market data stream has been stopped.
+        """
+        pass
+
+    def close(self) -> None:
+        """
+        Writes all buffered data and releases all resources. Is called on shutdown.
+        """
+        pass
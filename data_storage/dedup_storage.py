@@ -0,0 +1,294 @@
+import collections
+import datetime
+import logging
+import time
+from typing import Optional
+
+from tinkoff.invest import MarketDataResponse
+
+from configuration.settings import DedupSettings
+from data_storage.base_storage import IStorage
+from invest_api.market_data_record import MarketDataRecord, CandleRecord, TradeRecord, PriceRecord, \
+    market_data_record
+from metrics.metrics_registry import REGISTRY
+
+__all__ = ("DedupStorage")
+
+logger = logging.getLogger(__name__)
+
+DEDUP_DROPPED = REGISTRY.counter(
+    "storage_dedup_dropped_total", "Duplicates dropped before storage", ("data_type",)
+)
+DEDUP_COLLAPSED = REGISTRY.counter(
+    "storage_dedup_collapsed_total", "Candle updates collapsed into one candle per minute"
+)
+
+
+class _TradeWindow:
+    """
+    Recent saved trades of a figi. Equal trades (the same time, direction, price and quantity) are counted:
+    [saved, received] per key, received trades are counted again when the stream re-sends recent trades.
+    """
+    __slots__ = ("keys", "counts", "last_time_ns")
+
+    def __init__(self) -> None:
+        # keys (time, direction, price, quantity) of saved trades in arrival order
+        self.keys: collections.deque = collections.deque()
+        self.counts: dict[tuple, list[int]] = dict()
+        # time of the last received trade
+        self.last_time_ns = 0
+
+    def resend(self) -> None:
+        for counts in self.counts.values():
+            counts[1] = 0
+
+
+class DedupStorage(IStorage):
+    """
+    The class drops duplicates of market data before they are saved into wrapped storage.
+    The stream re-sends the current candle and sometimes recent trades after every resubscribe.
+
+    State is kept per figi and data type, its size doesn't depend on length of the day:
+    - candles: updates of a minute are collapsed (last write wins). The candle is saved when a candle
+      of the next minute has come or its minute has been finished (candle_close_delay_sec ago).
+      Finished minutes (e.g. backfill after reconnect) are saved as is, a candle equal to the saved candle
+      of the same minute (from the window of recent minutes) is dropped
+    - trades: a trade older than the window of recent trades (recent_trades) is dropped. Equal trades are counted,
+      a trade is dropped if equal trades received since the stream has re-sent trades (a trade earlier than
+      the previous one, restart, stream stop) don't outnumber the saved ones. So equal real trades of the same time
+      are kept and re-sent trades are dropped
+    - last prices: a price earlier than the last one or the same price of the same time is dropped
+
+    The state is restored on startup by the end of today's data of wrapped storage (IStorage.tail_records).
+    The last saved minute is open again: the stream re-sends it after restart.
+    The class is used from the event loop only.
+    """
+    __ONE_MINUTE_NS = 60 * 1_000_000_000
+    __CANDLE_CHECK_INTERVAL_SEC = 1.0
+    # Count of saved minutes per figi to compare finished candles with
+    __RECENT_CANDLES = 240
+
+    def __init__(self, storage: IStorage, settings: DedupSettings) -> None:
+        self.__storage = storage
+        self.__recent_trades = max(1, settings.recent_trades)
+        self.__candle_close_delay_ns = int(settings.candle_close_delay_sec * 1_000_000_000)
+
+        # figi id -> time of the last saved candle, later candles are collapsed by minutes
+        self.__candle_marks: dict[int, int] = dict()
+        # figi id -> candle of the last minute, it isn't saved yet
+        self.__open_candles: dict[int, CandleRecord] = dict()
+        # figi id -> time of recent saved minutes -> (open, close, high, low, volume) of saved candle
+        self.__saved_candles: dict[int, collections.OrderedDict] = dict()
+        # figi id -> recent saved trades
+        self.__trade_windows: dict[int, _TradeWindow] = dict()
+        # figi id -> (time, price) of the last saved price
+        self.__last_prices: dict[int, tuple[int, int]] = dict()
+
+        self.__next_candle_check = 0.0
+
+        self.__restore()
+
+    def save(self, market_data: MarketDataResponse) -> None:
+        record = market_data_record(market_data)
+
+        if record:
+            self.save_record(record)
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.save_batch([record])
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        unique: list[MarketDataRecord] = []
+
+        for record in records:
+            record_type = type(record)
+
+            if record_type is CandleRecord:
+                self.__add_candle(record, unique)
+            elif record_type is TradeRecord:
+                if self.__is_new_trade(record):
+                    unique.append(record)
+                else:
+                    DEDUP_DROPPED.inc((TradeRecord.DATA_TYPE.value,))
+            else:
+                if self.__is_new_price(record):
+                    unique.append(record)
+                else:
+                    DEDUP_DROPPED.inc((PriceRecord.DATA_TYPE.value,))
+
+        now = time.monotonic()
+        if now >= self.__next_candle_check:
+            self.__next_candle_check = now + self.__CANDLE_CHECK_INTERVAL_SEC
+            self.__close_candles(unique, time.time_ns() - self.__ONE_MINUTE_NS - self.__candle_close_delay_ns)
+
+        if unique:
+            self.__storage.save_batch(unique)
+
+    @property
+    def keeps_messages(self) -> bool:
+        return self.__storage.keeps_messages
+
+    async def wait_writable(self) -> None:
+        await self.__storage.wait_writable()
+
+    def tail_records(self, day: datetime.date, max_records: int) -> list[MarketDataRecord]:
+        return self.__storage.tail_records(day, max_records)
+
+    def flush(self) -> None:
+        # The stream has been stopped, it re-sends recent trades after reconnect
+        for window in self.__trade_windows.values():
+            window.resend()
+
+        # Candles of the current minute are kept: the stream re-sends them after reconnect
+        closed: list[MarketDataRecord] = []
+        self.__close_candles(closed, time.time_ns() - self.__ONE_MINUTE_NS - self.__candle_close_delay_ns)
+
+        if closed:
+            self.__storage.save_batch(closed)
+
+        self.__storage.flush()
+
+    def close(self) -> None:
+        closed: list[MarketDataRecord] = []
+        self.__close_candles(closed, None)
+
+        if closed:
+            self.__storage.save_batch(closed)
+
+        self.__storage.close()
+
+    def __restore(self) -> None:
+        records = self.__storage.tail_records(datetime.datetime.utcnow().date(), self.__recent_trades)
+
+        for record in records:
+            record_type = type(record)
+
+            if record_type is CandleRecord:
+                self.__is_new_candle(record)
+
+                # candles can be written out of time order (backfill), the last row of a minute wins
+                open_candle = self.__open_candles.get(record.figi_id)
+                if open_candle is None or open_candle.time_ns <= record.time_ns:
+                    self.__open_candles[record.figi_id] = record
+            elif record_type is TradeRecord:
+                self.__is_new_trade(record)
+            else:
+                self.__is_new_price(record)
+
+        # updates of the last saved minute are collapsed again, the same candle isn't saved twice
+        for id_, candle in self.__open_candles.items():
+            self.__candle_marks[id_] = candle.time_ns - self.__ONE_MINUTE_NS
+
+        # the stream re-sends recent trades after restart
+        for window in self.__trade_windows.values():
+            window.resend()
+
+        logger.info(f"Deduplication state has been restored by {len(records)} records")
+
+    def __add_candle(self, candle: CandleRecord, records: list[MarketDataRecord]) -> None:
+        mark = self.__candle_marks.get(candle.figi_id)
+
+        if mark is not None and candle.time_ns <= mark:
+            # a finished minute (e.g. backfill after reconnect)
+            self.__save_candle(candle, records)
+            return
+
+        open_candle = self.__open_candles.get(candle.figi_id)
+
+        if open_candle is None or open_candle.time_ns < candle.time_ns:
+            if open_candle is not None:
+                self.__save_candle(open_candle, records)
+
+            self.__open_candles[candle.figi_id] = candle
+        elif open_candle.time_ns == candle.time_ns:
+            self.__open_candles[candle.figi_id] = candle
+            DEDUP_COLLAPSED.inc()
+        else:
+            # a finished minute before the open one (e.g. backfill after reconnect)
+            self.__save_candle(candle, records)
+
+    def __save_candle(self, candle: CandleRecord, records: list[MarketDataRecord]) -> None:
+        if not self.__is_new_candle(candle):
+            DEDUP_DROPPED.inc((CandleRecord.DATA_TYPE.value,))
+            return
+
+        records.append(candle)
+
+        if self.__candle_marks.get(candle.figi_id, -1) < candle.time_ns:
+            self.__candle_marks[candle.figi_id] = candle.time_ns
+
+    def __is_new_candle(self, candle: CandleRecord) -> bool:
+        """
+        The candle isn't equal to the saved candle of the same minute, it is remembered as saved
+        """
+        saved = self.__saved_candles.get(candle.figi_id)
+        if saved is None:
+            saved = self.__saved_candles[candle.figi_id] = collections.OrderedDict()
+
+        values = (candle.open, candle.close, candle.high, candle.low, candle.volume)
+
+        if saved.get(candle.time_ns) == values:
+            return False
+
+        saved[candle.time_ns] = values
+        saved.move_to_end(candle.time_ns)
+
+        if len(saved) > self.__RECENT_CANDLES:
+            saved.popitem(last=False)
+
+        return True
+
+    def __close_candles(self, records: list[MarketDataRecord], before_ns: Optional[int]) -> None:
+        """
+        Saves open candles started not later than before_ns (all open candles for None)
+        """
+        for id_, candle in list(self.__open_candles.items()):
+            if before_ns is None or candle.time_ns <= before_ns:
+                del self.__open_candles[id_]
+                self.__save_candle(candle, records)
+
+    def __is_new_trade(self, trade: TradeRecord) -> bool:
+        window = self.__trade_windows.get(trade.figi_id)
+        if window is None:
+            window = self.__trade_windows[trade.figi_id] = _TradeWindow()
+
+        if window.keys and trade.time_ns < window.keys[0][0]:
+            return False
+
+        if trade.time_ns < window.last_time_ns:
+            # the stream re-sends recent trades (e.g. after resubscribe)
+            window.resend()
+        window.last_time_ns = trade.time_ns
+
+        key = (trade.time_ns, trade.direction, trade.price, trade.quantity)
+
+        counts = window.counts.get(key)
+        if counts is None:
+            counts = window.counts[key] = [0, 0]
+
+        counts[1] += 1
+        if counts[1] <= counts[0]:
+            return False
+
+        counts[0] += 1
+        window.keys.append(key)
+
+        if len(window.keys) > self.__recent_trades:
+            oldest = window.keys.popleft()
+            oldest_counts = window.counts[oldest]
+
+            oldest_counts[0] -= 1
+            if oldest_counts[0] == 0:
+                del window.counts[oldest]
+
+        return True
+
+    def __is_new_price(self, last_price: PriceRecord) -> bool:
+        last = self.__last_prices.get(last_price.figi_id)
+
+        if last and (last_price.time_ns < last[0] or (last_price.time_ns, last_price.price) == last):
+            return False
+
+        self.__last_prices[last_price.figi_id] = (last_price.time_ns, last_price.price)
+
+        return True
@@ -0,0 +1,49 @@
+import logging
+from collections import OrderedDict
+from typing import IO
+
+__all__ = ("FileHandleCache")
+
+logger = logging.getLogger(__name__)
+
+
+class FileHandleCache:
+    """
+    Bounded LRU cache of opened (for append) files.
+    The least recently used file is closed if the cache is full and a new file is required.
+    """
+    def __init__(self, max_open_files: int, mode: str = "a", encoding: str = "UTF8", newline: str = "") -> None:
+        self.__max_open_files = max(1, max_open_files)
+
+        self.__open_kwargs = {"mode": mode}
+        if "b" not in mode:
+            self.__open_kwargs["encoding"] = encoding
+            self.__open_kwargs["newline"] = newline
+
+        self.__files: OrderedDict[str, IO] = OrderedDict()
+
+    def get(self, file_name: str) -> IO:
+        file = self.__files.get(file_name)
+
+        if file:
+            self.__files.move_to_end(file_name)
+            return file
+
+        if len(self.__files) >= self.__max_open_files:
+            old_file_name, old_file = self.__files.popitem(last=False)
+            logger.debug("Close least recently used file: %s", old_file_name)
+            old_file.close()
+
+        file = open(file_name, **self.__open_kwargs)
+        self.__files[file_name] = file
+
+        return file
+
+    def flush(self) -> None:
+        for file in self.__files.values():
+            file.flush()
+
+    def close(self) -> None:
+        while self.__files:
+            _, file = self.__files.popitem(last=False)
+            file.close()
@@ -0,0 +1,83 @@
+import datetime
+import logging
+from typing import Generator
+
+import numpy as np
+
+from data_storage.files_columnar.columnar_format import CANDLE_TYPE_FOLDER, TRADE_TYPE_FOLDER, \
+    LAST_PRICE_TYPE_FOLDER, CANDLE_RECORD, TRADE_RECORD, LAST_PRICE_RECORD, file_path
+
+__all__ = ("ColumnarDataReader", "CANDLE_DTYPE", "TRADE_DTYPE", "LAST_PRICE_DTYPE")
+
+logger = logging.getLogger(__name__)
+
+# NumPy views of records from columnar_format. Prices are int64 fixed point, divide by PRICE_SCALE to get float.
+CANDLE_DTYPE = np.dtype([
+    ("time", "<i8"), ("open", "<i8"), ("close", "<i8"), ("high", "<i8"), ("low", "<i8"), ("volume", "<i8")
+])
+TRADE_DTYPE = np.dtype([
+    ("time", "<i8"), ("direction", "i1"), ("price", "<i8"), ("quantity", "<i8")
+])
+LAST_PRICE_DTYPE = np.dtype([
+    ("time", "<i8"), ("price", "<i8")
+])
+
+assert CANDLE_DTYPE.itemsize == CANDLE_RECORD.size
+assert TRADE_DTYPE.itemsize == TRADE_RECORD.size
+assert LAST_PRICE_DTYPE.itemsize == LAST_PRICE_RECORD.size
+
+
+class ColumnarDataReader:
+    """
+    The class reads files written by ColumnarDataStorage.
+    Files are memory-mapped, records aren't parsed.
+    """
+    __DTYPES = {
+        CANDLE_TYPE_FOLDER: CANDLE_DTYPE,
+        TRADE_TYPE_FOLDER: TRADE_DTYPE,
+        LAST_PRICE_TYPE_FOLDER: LAST_PRICE_DTYPE
+    }
+
+    def __init__(self, root_path: str) -> None:
+        self.__root_path = root_path
+
+    def days(
+            self,
+            figi: str,
+            type_folder: str,
+            from_day: datetime.date,
+            to_day: datetime.date
+    ) -> Generator[tuple[datetime.date, np.memmap], None, None]:
+        """
+        Yields memory-mapped records for every day in [from_day, to_day] which has data.
+        :param type_folder: "candle", "trade" or "last_price"
+        """
+        dtype = self.__DTYPES[type_folder]
+
+        day = from_day
+        while day <= to_day:
+            path = file_path(self.__root_path, figi, type_folder, day)
+
+            if path.exists():
+                # a truncated record at the end of file (e.g. after crash) is skipped
+                count = path.stat().st_size // dtype.itemsize
+
+                if count:
+                    yield day, np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+            day += datetime.timedelta(days=1)
+
+    def load(
+            self,
+            figi: str,
+            type_folder: str,
+            from_day: datetime.date,
+            to_day: datetime.date
+    ) -> np.ndarray:
+        """
+        :return: Records for date range in one array.
+        Note: It is a copy of data, use days() to keep memory-mapped arrays.
+        """
+        arrays = [records for _, records in self.days(figi, type_folder, from_day, to_day)]
+
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=self.__DTYPES[type_folder])
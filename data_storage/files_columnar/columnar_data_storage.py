@@ -0,0 +1,152 @@
+import datetime
+import logging
+import os
+from pathlib import Path
+from typing import IO
+
+from tinkoff.invest import MarketDataResponse
+
+from configuration.settings import StorageSettings
+from data_storage.base_storage import IStorage
+from data_storage.files_columnar.columnar_format import CANDLE_TYPE_FOLDER, TRADE_TYPE_FOLDER, \
+    LAST_PRICE_TYPE_FOLDER, CANDLE_RECORD, TRADE_RECORD, LAST_PRICE_RECORD, RECORDS, file_path
+from data_storage.partitioned_file_writer import PartitionedFileWriter
+from invest_api.market_data_record import MarketDataRecord, CandleRecord, TradeRecord, market_data_record
+
+__all__ = ("ColumnarDataStorage")
+
+logger = logging.getLogger(__name__)
+
+
+class ColumnarDataStorage(IStorage):
+    """
+    Market data is written as fixed-width binary records (see columnar_format) to per-day files.
+    Use ColumnarDataReader to memory-map the files.
+
+    Records are buffered per (figi, data type, day) and written to file if buffer is full (buffer_row_size)
+    or buffer is older than flush_interval_sec (see PartitionedFileWriter).
+    An incomplete record at the end of file (e.g. after crash) is cut before the file is appended first time.
+    """
+    # label of storage metrics
+    __STORAGE_NAME = "FILES_COLUMNAR"
+
+    # Consts to read and parse dict with configuration
+    __ROOT_PATH_NAME = "root_path"
+    __BUFFER_ROW_SIZE_NAME = "buffer_row_size"
+    __FLUSH_INTERVAL_SEC_NAME = "flush_interval_sec"
+    __MAX_OPEN_FILES_NAME = "max_open_files"
+
+    __DEFAULT_BUFFER_ROW_SIZE = 1000
+    __DEFAULT_FLUSH_INTERVAL_SEC = 5
+    __DEFAULT_MAX_OPEN_FILES = 64
+
+    def __init__(self, settings: StorageSettings) -> None:
+        self.__root_path = settings.settings.get(self.__ROOT_PATH_NAME, None)
+
+        if not self.__root_path:
+            logger.error(f"Storage init failed: root path is {self.__root_path}")
+
+            raise Exception(f"ColumnarDataStorage: All settings must be specified, but some of them is empty")
+
+        self.__writer = PartitionedFileWriter(
+            self.__STORAGE_NAME,
+            int(settings.settings.get(self.__BUFFER_ROW_SIZE_NAME, self.__DEFAULT_BUFFER_ROW_SIZE)),
+            float(settings.settings.get(self.__FLUSH_INTERVAL_SEC_NAME, self.__DEFAULT_FLUSH_INTERVAL_SEC)),
+            int(settings.settings.get(self.__MAX_OPEN_FILES_NAME, self.__DEFAULT_MAX_OPEN_FILES)),
+            "ab",
+            self.__calculate_file_path,
+            self.__write_records
+        )
+
+    def save(self, market_data: MarketDataResponse) -> None:
+        try:
+            record = market_data_record(market_data)
+        except Exception as ex:
+            logger.error(f"Error while convert market data: {repr(ex)}")
+            return
+
+        if record:
+            self.save_record(record)
+        else:
+            logger.debug("Nothing to save")
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.save_batch([record])
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        # An error of one record doesn't stop the batch, failed records are counted
+        lost, error = 0, None
+
+        for record in records:
+            try:
+                record_type = type(record)
+
+                if record_type is CandleRecord:
+                    self.__writer.append(
+                        record.figi_id,
+                        CANDLE_TYPE_FOLDER,
+                        record.time_ns,
+                        CANDLE_RECORD.pack(
+                            record.time_ns, record.open, record.close, record.high, record.low, record.volume
+                        )
+                    )
+                elif record_type is TradeRecord:
+                    self.__writer.append(
+                        record.figi_id,
+                        TRADE_TYPE_FOLDER,
+                        record.time_ns,
+                        TRADE_RECORD.pack(record.time_ns, record.direction, record.price, record.quantity)
+                    )
+                else:
+                    self.__writer.append(
+                        record.figi_id,
+                        LAST_PRICE_TYPE_FOLDER,
+                        record.time_ns,
+                        LAST_PRICE_RECORD.pack(record.time_ns, record.price)
+                    )
+
+            except Exception as ex:
+                lost, error = lost + 1, ex
+
+        if lost:
+            logger.error(f"Error while write market data to file: {repr(error)}. "
+                         f"Lost records: {lost} of {len(records)}")
+
+    def flush(self) -> None:
+        self.__writer.flush()
+
+    def close(self) -> None:
+        self.__writer.close()
+
+    def __calculate_file_path(self, figi: str, type_folder: str, day: datetime.date) -> str:
+        """
+        It is called once per (figi, type_folder, day) till day rollover: directories are made
+        and size of existing file is checked once.
+        """
+        path = file_path(self.__root_path, figi, type_folder, day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        removed = self.__repair_tail(path, RECORDS[type_folder].size)
+        if removed:
+            logger.warning(f"Incomplete record has been removed from file: {path}. Bytes: {removed}")
+
+        return str(path)
+
+    @staticmethod
+    def __repair_tail(path: Path, record_size: int) -> int:
+        """
+        Truncates file to whole count of records, so new records are aligned.
+        :return: Count of removed bytes
+        """
+        if not path.exists():
+            return 0
+
+        removed = path.stat().st_size % record_size
+        if removed:
+            os.truncate(path, path.stat().st_size - removed)
+
+        return removed
+
+    @staticmethod
+    def __write_records(file: IO, records: list[bytes]) -> int:
+        return file.write(b"".join(records))
@@ -0,0 +1,48 @@
+import datetime
+import struct
+from pathlib import Path
+
+from invest_api.fixed_point_price import PRICE_SCALE
+from invest_api.market_data_record import datetime_to_ns
+
+__all__ = (
+    "FILE_NAME", "CANDLE_TYPE_FOLDER", "TRADE_TYPE_FOLDER", "LAST_PRICE_TYPE_FOLDER",
+    "CANDLE_RECORD", "TRADE_RECORD", "LAST_PRICE_RECORD", "RECORDS", "PRICE_SCALE",
+    "file_path", "datetime_to_ns"
+)
+
+FILE_NAME = "market_data.bin"
+
+CANDLE_TYPE_FOLDER = "candle"
+TRADE_TYPE_FOLDER = "trade"
+LAST_PRICE_TYPE_FOLDER = "last_price"
+
+# Fixed-width little-endian records without padding.
+# Prices are int64 fixed point (units * PRICE_SCALE + nano), times are int64 ns since epoch (UTC).
+
+# time, open, close, high, low, volume
+CANDLE_RECORD = struct.Struct("<qqqqqq")
+# time, direction (int8), price, quantity
+TRADE_RECORD = struct.Struct("<qbqq")
+# time, price
+LAST_PRICE_RECORD = struct.Struct("<qq")
+
+RECORDS = {
+    CANDLE_TYPE_FOLDER: CANDLE_RECORD,
+    TRADE_TYPE_FOLDER: TRADE_RECORD,
+    LAST_PRICE_TYPE_FOLDER: LAST_PRICE_RECORD
+}
+
+
+def file_path(root_path: str, figi: str, type_folder: str, day: datetime.date) -> Path:
+    """
+    Folder Structure is the same as for csv files:
+    root_path
+        figi
+            type_folder
+                year
+                    month
+                        day
+                            market_data.bin
+    """
+    return Path(root_path, figi, type_folder, str(day.year), str(day.month), str(day.day), FILE_NAME)
@@ -0,0 +1,141 @@
+import bisect
+import csv
+import datetime
+import gzip
+import io
+import os
+import struct
+from pathlib import Path
+from typing import Generator, Iterable, Optional
+
+from invest_api.market_data_record import datetime_to_ns
+
+__all__ = (
+    "COMPACTED_FILE_NAME", "COMPACTED_INDEX_FILE_NAME", "LEGACY_COMPACTED_FILE_NAME",
+    "LEGACY_COMPACTED_INDEX_FILE_NAME", "COMPACTED_FILE_NAMES", "INDEX_HEADER", "INDEX_ENTRY",
+    "row_time_ns", "write_compacted", "read_compacted"
+)
+
+# Compacted file: csv rows (the same as in market_data.csv) sorted by time.
+# Rows are compressed by blocks, every block is a separate gzip member, so the whole file is a valid gzip file.
+COMPACTED_FILE_NAME = "market_data.compacted.csv.gz"
+COMPACTED_INDEX_FILE_NAME = "market_data.compacted.csv.gz.idx"
+
+# Compacted files were named so before compressed csv files, the format is the same.
+# They are read as is and renamed by the next compaction of the partition.
+LEGACY_COMPACTED_FILE_NAME = "market_data.csv.gz"
+LEGACY_COMPACTED_INDEX_FILE_NAME = "market_data.csv.gz.idx"
+
+# Compacted file name -> index file name
+COMPACTED_FILE_NAMES = {
+    COMPACTED_FILE_NAME: COMPACTED_INDEX_FILE_NAME,
+    LEGACY_COMPACTED_FILE_NAME: LEGACY_COMPACTED_INDEX_FILE_NAME
+}
+
+# Index header: size of compacted file (uint64). Index of another file version is ignored.
+INDEX_HEADER = struct.Struct("<Q")
+# Index entry per block: time of the first row in ns since epoch (int64), offset of block (uint64), rows (uint32)
+INDEX_ENTRY = struct.Struct("<qQI")
+
+
+def row_time_ns(row: list[str]) -> int:
+    # time is the last column of every csv file
+    return datetime_to_ns(datetime.datetime.fromisoformat(row[-1]))
+
+
+def write_compacted(file_path: Path, index_path: Path, rows: Iterable[tuple[int, list]], block_rows: int) -> int:
+    """
+    Writes rows (time in ns and csv row) sorted by time.
+    :return: Count of written rows
+    """
+    count = 0
+    index = bytearray()
+
+    with open(file_path, "wb") as file:
+        block: list[list] = []
+        block_start_ns = 0
+
+        for time_ns, row in rows:
+            if not block:
+                block_start_ns = time_ns
+
+            block.append(row)
+
+            if len(block) >= block_rows:
+                index += INDEX_ENTRY.pack(block_start_ns, file.tell(), len(block))
+                _write_block(file, block)
+
+                count += len(block)
+                block = []
+
+        if block:
+            index += INDEX_ENTRY.pack(block_start_ns, file.tell(), len(block))
+            _write_block(file, block)
+
+            count += len(block)
+
+        file_size = file.tell()
+
+    with open(index_path, "wb") as index_file:
+        index_file.write(INDEX_HEADER.pack(file_size) + index)
+
+    return count
+
+
+def _write_block(file, rows: list[list]) -> None:
+    text = io.StringIO()
+    csv.writer(text).writerows(rows)
+
+    # mtime=0 keeps compacted files reproducible
+    file.write(gzip.compress(text.getvalue().encode("UTF8"), mtime=0))
+
+
+def read_compacted(
+        file_path: Path,
+        index_path: Path,
+        from_time_ns: Optional[int] = None,
+        to_time_ns: Optional[int] = None
+) -> Generator[tuple[int, list[str]], None, None]:
+    """
+    Yields rows (time in ns and csv row) with time in [from_time_ns, to_time_ns).
+    The index is used to seek to the first block, the whole file is read if the index is missing or outdated.
+    """
+    with open(file_path, "rb") as file:
+        if from_time_ns is not None:
+            file.seek(_find_offset(index_path, os.fstat(file.fileno()).st_size, from_time_ns))
+
+        with io.TextIOWrapper(gzip.GzipFile(fileobj=file, mode="rb"), encoding="UTF8", newline="") as text:
+            for row in csv.reader(text):
+                if not row:
+                    continue
+
+                time_ns = row_time_ns(row)
+
+                if from_time_ns is not None and time_ns < from_time_ns:
+                    continue
+                if to_time_ns is not None and time_ns >= to_time_ns:
+                    return
+
+                yield time_ns, row
+
+
+def _find_offset(index_path: Path, file_size: int, time_ns: int) -> int:
+    """
+    :return: Offset of the last block started before time_ns (rows of the same time can be in the previous block)
+    """
+    try:
+        with open(index_path, "rb") as index_file:
+            data = index_file.read()
+    except FileNotFoundError:
+        return 0
+
+    if len(data) < INDEX_HEADER.size or INDEX_HEADER.unpack_from(data)[0] != file_size:
+        return 0
+
+    entries = [
+        INDEX_ENTRY.unpack_from(data, offset)
+        for offset in range(INDEX_HEADER.size, len(data) - INDEX_ENTRY.size + 1, INDEX_ENTRY.size)
+    ]
+    position = bisect.bisect_left([entry[0] for entry in entries], time_ns) - 1
+
+    return entries[position][1] if position >= 0 else 0
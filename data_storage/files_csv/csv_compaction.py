@@ -0,0 +1,314 @@
+"""
+Compaction of csv files written by CSVDataStorage: every day (or month) partition of figi and data type
+is merged into one compressed time-sorted file with time index (see csv_compacted_format).
+Originals are removed after row count of the compacted file has been verified.
+
+Run from the project root:
+python -m data_storage.files_csv.csv_compaction --root-path ../../../raw_market_data --partition MONTH \
+    --before 2022-12-01
+"""
+import argparse
+import datetime
+import heapq
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from pathlib import Path
+from typing import Generator, Iterable, Optional
+
+from configuration.settings import CompactionSettings
+from data_storage.files_csv.csv_compacted_format import COMPACTED_FILE_NAME, COMPACTED_INDEX_FILE_NAME, \
+    LEGACY_COMPACTED_FILE_NAME, LEGACY_COMPACTED_INDEX_FILE_NAME, COMPACTED_FILE_NAMES, row_time_ns, \
+    write_compacted, read_compacted
+from data_storage.files_csv.csv_frames import RAW_FILE_NAMES, read_raw_rows
+
+__all__ = ("CSVCompaction")
+
+logger = logging.getLogger(__name__)
+
+_TMP_SUFFIX = ".tmp"
+
+DAY_PARTITION = "DAY"
+MONTH_PARTITION = "MONTH"
+
+
+class CSVCompaction:
+    """
+    Partitions which ended before the given day are compacted, figies are compacted in parallel processes.
+    Compaction is repeatable: an existing compacted file is merged with new csv files of the partition.
+    """
+    def __init__(self, root_path: str, settings: CompactionSettings) -> None:
+        self.__root_path = root_path
+
+        self.__partition = settings.partition.upper()
+        if self.__partition not in (DAY_PARTITION, MONTH_PARTITION):
+            raise Exception(f"CSVCompaction: Unknown partition: {settings.partition}")
+
+        self.__processes = max(1, settings.processes)
+        self.__block_rows = max(1, settings.block_rows)
+
+    def compact(self, before: datetime.date) -> None:
+        """
+        The method doesn't raise exceptions. Partitions with errors are kept as is.
+        """
+        try:
+            root = Path(self.__root_path)
+            figies = sorted(path.name for path in root.iterdir() if path.is_dir()) if root.exists() else []
+
+            logger.info(f"Compaction of {self.__partition} partitions before {before} has been started: "
+                        f"{len(figies)} figies")
+
+            files = rows = errors = 0
+
+            # Processes are spawned: the caller has running threads (logging, storage writer)
+            with ProcessPoolExecutor(self.__processes, multiprocessing.get_context("spawn")) as executor:
+                for results in executor.map(
+                        _compact_figi,
+                        [self.__root_path] * len(figies),
+                        figies,
+                        [self.__partition] * len(figies),
+                        [before] * len(figies),
+                        [self.__block_rows] * len(figies)
+                ):
+                    for partition_path, partition_files, partition_rows, error in results:
+                        if error:
+                            logger.error(f"Compaction of {partition_path} error: {error}")
+                            errors += 1
+                        else:
+                            logger.debug("Compacted: %s. Files: %s. Rows: %s",
+                                         partition_path, partition_files, partition_rows)
+                            files += partition_files
+                            rows += partition_rows
+
+            logger.info(f"Compaction has been finished: {files} files, {rows} rows, {errors} errors")
+
+        except Exception as ex:
+            logger.error(f"Compaction error: {repr(ex)}")
+
+
+def _compact_figi(
+        root_path: str,
+        figi: str,
+        partition: str,
+        before: datetime.date,
+        block_rows: int
+) -> list[tuple[str, int, int, Optional[str]]]:
+    """
+    Is run in a pool process.
+    :return: (partition path, count of compacted files, count of rows, error) for every compacted partition
+    """
+    results = []
+
+    for type_path in sorted(Path(root_path, figi).iterdir()):
+        if not type_path.is_dir():
+            continue
+
+        for partition_path, source_paths in _partitions(type_path, partition, before).items():
+            try:
+                files, rows = _compact_partition(partition_path, source_paths, block_rows)
+                results.append((str(partition_path), files, rows, None))
+            except Exception as ex:
+                results.append((str(partition_path), 0, 0, repr(ex)))
+
+    return results
+
+
+def _partitions(type_path: Path, partition: str, before: datetime.date) -> dict[Path, list[Path]]:
+    """
+    Folder Structure is:
+    type_path
+        year
+            month
+                market_data.compacted.csv.gz (MONTH partition)
+                day
+                    market_data.csv, market_data.csv.gzf, market_data.csv.zstf (written by CSVDataStorage)
+                    market_data.compacted.csv.gz (DAY partition)
+
+    Files of days are compacted into MONTH partition: csv files and compacted files of DAY partitions.
+    A partition with compacted file of legacy name (market_data.csv.gz) is compacted again to rename the file.
+
+    :return: partition path -> files of days, for partitions which ended before the day
+    """
+    partitions: dict[Path, list[Path]] = dict()
+
+    file_names = list(RAW_FILE_NAMES.values())
+    if partition == MONTH_PARTITION:
+        file_names.extend(COMPACTED_FILE_NAMES.keys())
+
+    for file_name in file_names:
+        for file_path in type_path.glob(f"*/*/*/{file_name}"):
+            partition_path = _partition_path(type_path, file_path.parent, partition, before)
+
+            if partition_path:
+                partitions.setdefault(partition_path, []).append(file_path)
+
+    # the legacy file of the partition itself is merged by _compact_partition
+    legacy_pattern = f"*/*/*/{LEGACY_COMPACTED_FILE_NAME}" if partition == DAY_PARTITION \
+        else f"*/*/{LEGACY_COMPACTED_FILE_NAME}"
+
+    for legacy_path in type_path.glob(legacy_pattern):
+        partition_path = _partition_path(type_path, legacy_path.parent, partition, before)
+
+        if partition_path:
+            partitions.setdefault(partition_path, [])
+
+    return partitions
+
+
+def _partition_path(type_path: Path, directory: Path, partition: str, before: datetime.date) -> Optional[Path]:
+    """
+    :param directory: Day or month folder
+    :return: Partition of the folder, None if the partition hasn't ended before the day
+    """
+    try:
+        parts = [int(part) for part in directory.relative_to(type_path).parts]
+        day = datetime.date(parts[0], parts[1], parts[2] if len(parts) > 2 else 1)
+    except (ValueError, IndexError):
+        return None
+
+    if partition == DAY_PARTITION:
+        return directory if len(parts) == 3 and day < before else None
+
+    next_month = (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+    if next_month > before:
+        return None
+
+    return directory.parent if len(parts) == 3 else directory
+
+
+def _compact_partition(partition_path: Path, source_paths: list[Path], block_rows: int) -> tuple[int, int]:
+    """
+    :return: Count of compacted files and count of rows in compacted file
+    """
+    compacted_path = partition_path.joinpath(COMPACTED_FILE_NAME)
+    index_path = partition_path.joinpath(COMPACTED_INDEX_FILE_NAME)
+    tmp_compacted_path = partition_path.joinpath(COMPACTED_FILE_NAME + _TMP_SUFFIX)
+    tmp_index_path = partition_path.joinpath(COMPACTED_INDEX_FILE_NAME + _TMP_SUFFIX)
+
+    legacy_path = partition_path.joinpath(LEGACY_COMPACTED_FILE_NAME)
+    legacy_index_path = partition_path.joinpath(LEGACY_COMPACTED_INDEX_FILE_NAME)
+
+    # by day, compacted rows of a day go before csv rows of the day
+    source_paths = sorted(
+        source_paths, key=lambda path: (int(path.parent.name), path.name not in COMPACTED_FILE_NAMES)
+    )
+
+    source_rows = 0
+
+    def counted(rows: Iterable[tuple[int, list]]) -> Generator[tuple[int, list], None, None]:
+        nonlocal source_rows
+
+        for row in rows:
+            source_rows += 1
+            yield row
+
+    # Existing compacted rows go first for the same time (merge is stable), days are sorted one by one
+    sources = [_sorted_days(source_paths)]
+    if legacy_path.exists():
+        sources.insert(0, read_compacted(legacy_path, legacy_index_path))
+    if compacted_path.exists():
+        sources.insert(0, read_compacted(compacted_path, index_path))
+
+    written_rows = write_compacted(
+        tmp_compacted_path,
+        tmp_index_path,
+        counted(heapq.merge(*sources, key=lambda row: row[0])),
+        block_rows
+    )
+
+    # The compacted file is read back before originals are removed
+    read_rows = _verify(tmp_compacted_path, tmp_index_path)
+
+    if not (source_rows == written_rows == read_rows):
+        tmp_compacted_path.unlink(missing_ok=True)
+        tmp_index_path.unlink(missing_ok=True)
+
+        raise Exception(f"Rows count mismatch: source {source_rows}, written {written_rows}, read {read_rows}")
+
+    os.replace(tmp_compacted_path, compacted_path)
+    os.replace(tmp_index_path, index_path)
+
+    files = len(source_paths)
+
+    # rows of the legacy file are in the compacted file now
+    if legacy_path.exists():
+        legacy_path.unlink()
+        legacy_index_path.unlink(missing_ok=True)
+        files += 1
+
+    for source_path in source_paths:
+        source_path.unlink()
+
+        if source_path.name in COMPACTED_FILE_NAMES:
+            source_path.with_name(COMPACTED_FILE_NAMES[source_path.name]).unlink(missing_ok=True)
+
+        # an empty day folder of MONTH partition is removed
+        if source_path.parent != partition_path and not any(source_path.parent.iterdir()):
+            source_path.parent.rmdir()
+
+    return files, written_rows
+
+
+def _sorted_days(source_paths: list[Path]) -> Generator[tuple[int, list[str]], None, None]:
+    # Days don't overlap, so only one day is kept in memory
+    for _, day_source_paths in groupby(source_paths, key=lambda path: path.parent):
+        rows = []
+
+        for source_path in day_source_paths:
+            if source_path.name in COMPACTED_FILE_NAMES:
+                rows.extend(read_compacted(source_path, source_path.with_name(COMPACTED_FILE_NAMES[source_path.name])))
+            else:
+                rows.extend((row_time_ns(row), row) for row in read_raw_rows(source_path))
+
+        # sort is stable: rows of the same time keep order
+        rows.sort(key=lambda row: row[0])
+
+        yield from rows
+
+
+def _verify(compacted_path: Path, index_path: Path) -> int:
+    """
+    :return: Count of rows, exception is raised if rows aren't sorted by time
+    """
+    count = 0
+    last_time_ns = None
+
+    for time_ns, _ in read_compacted(compacted_path, index_path):
+        if last_time_ns is not None and time_ns < last_time_ns:
+            raise Exception(f"Rows aren't sorted by time: {compacted_path}")
+
+        last_time_ns = time_ns
+        count += 1
+
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact csv files of CSVDataStorage")
+    parser.add_argument("--root-path", required=True, help="ROOT_PATH of FILES_CSV storage")
+    parser.add_argument("--partition", choices=[DAY_PARTITION, MONTH_PARTITION], default=DAY_PARTITION)
+    parser.add_argument("--before", type=datetime.date.fromisoformat,
+                        default=datetime.datetime.utcnow().date(),
+                        help="Partitions ended before the day are compacted: YYYY-MM-DD, today (UTC) by default")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--block-rows", type=int, default=CompactionSettings.block_rows)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    CSVCompaction(
+        args.root_path,
+        CompactionSettings(
+            enabled=True,
+            partition=args.partition,
+            processes=args.processes,
+            block_rows=args.block_rows
+        )
+    ).compact(args.before)
+
+
+if __name__ == "__main__":
+    main()
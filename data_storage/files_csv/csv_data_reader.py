@@ -0,0 +1,155 @@
+import datetime
+import heapq
+import logging
+from pathlib import Path
+from typing import Generator, Iterable
+
+from tinkoff.invest import MarketDataResponse, Candle, Trade, LastPrice, TradeDirection, SubscriptionInterval
+
+from data_storage.files_csv.csv_compacted_format import COMPACTED_FILE_NAMES, read_compacted, row_time_ns
+from data_storage.files_csv.csv_frames import RAW_FILE_NAMES, read_raw_rows
+from invest_api.fixed_point_price import parse_price, nanos_to_quotation
+from invest_api.market_data_record import datetime_to_ns
+from invest_api.market_data_type import MarketDataType
+
+__all__ = ("CSVDataReader")
+
+logger = logging.getLogger(__name__)
+
+
+class CSVDataReader:
+    """
+    The class reads csv files written by CSVDataStorage. Rows are read and parsed lazily.
+    Compressed files (see csv_frames) and compacted files (see csv_compaction) of the day or of the month are read too.
+
+    Rows of a day are yielded in time order. Candles are sorted in memory: backfill appends missed candles
+    after newer ones. Trades and last prices are written in time order, their files are merged lazily.
+    """
+    __FILE_NAME = "market_data.csv"
+
+    def __init__(self, root_path: str) -> None:
+        self.__root_path = root_path
+
+    def file_path(self, figi: str, data_type: MarketDataType, day: datetime.date) -> Path:
+        return Path(
+            self.__root_path, figi, data_type.value, str(day.year), str(day.month), str(day.day), self.__FILE_NAME
+        )
+
+    def market_data(
+            self,
+            figi: str,
+            data_type: MarketDataType,
+            day: datetime.date
+    ) -> Generator[MarketDataResponse, None, None]:
+        """
+        Yields market data in time order. Nothing is yielded if the file doesn't exist.
+        """
+        match data_type:
+            case MarketDataType.CANDLE:
+                for candle in self.candles(figi, day):
+                    yield MarketDataResponse(candle=candle)
+            case MarketDataType.TRADE:
+                for trade in self.trades(figi, day):
+                    yield MarketDataResponse(trade=trade)
+            case MarketDataType.LAST_PRICE:
+                for last_price in self.last_prices(figi, day):
+                    yield MarketDataResponse(last_price=last_price)
+
+    def candles(self, figi: str, day: datetime.date) -> Generator[Candle, None, None]:
+        """
+        Headers in candle csv file:
+        open, close, high, low, volume, time
+        """
+        for row in self.__rows(figi, MarketDataType.CANDLE, day):
+            yield Candle(
+                figi=figi,
+                interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE,
+                open=nanos_to_quotation(parse_price(row[0])),
+                close=nanos_to_quotation(parse_price(row[1])),
+                high=nanos_to_quotation(parse_price(row[2])),
+                low=nanos_to_quotation(parse_price(row[3])),
+                volume=int(row[4]),
+                time=datetime.datetime.fromisoformat(row[5])
+            )
+
+    def trades(self, figi: str, day: datetime.date) -> Generator[Trade, None, None]:
+        """
+        Headers in trade csv file:
+        direction, price, quantity, time
+        """
+        for row in self.__rows(figi, MarketDataType.TRADE, day):
+            yield Trade(
+                figi=figi,
+                direction=TradeDirection(int(row[0])),
+                price=nanos_to_quotation(parse_price(row[1])),
+                quantity=int(row[2]),
+                time=datetime.datetime.fromisoformat(row[3])
+            )
+
+    def last_prices(self, figi: str, day: datetime.date) -> Generator[LastPrice, None, None]:
+        """
+        Headers in last_price csv file:
+        price, time
+        """
+        for row in self.__rows(figi, MarketDataType.LAST_PRICE, day):
+            yield LastPrice(
+                figi=figi,
+                price=nanos_to_quotation(parse_price(row[0])),
+                time=datetime.datetime.fromisoformat(row[1])
+            )
+
+    def __rows(self, figi: str, data_type: MarketDataType, day: datetime.date) -> Generator[list[str], None, None]:
+        sources = self.__sources(figi, data_type, day)
+
+        if len(sources) == 1:
+            yield from sources[0]
+        else:
+            # merge is stable: compacted rows go first for the same time, then rows of files in write order
+            yield from heapq.merge(*sources, key=row_time_ns)
+
+    def __sources(
+            self,
+            figi: str,
+            data_type: MarketDataType,
+            day: datetime.date
+    ) -> list[Iterable[list[str]]]:
+        """
+        :return: Rows of every file of the day, rows of every source are sorted by time
+        """
+        sources: list[Iterable[list[str]]] = []
+        file_path = self.file_path(figi, data_type, day)
+
+        # rows of the day in compacted file of the month (or of the day), then not compacted rows
+        day_start = datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+        from_time_ns = datetime_to_ns(day_start)
+        to_time_ns = datetime_to_ns(day_start + datetime.timedelta(days=1))
+
+        for directory in (file_path.parent.parent, file_path.parent):
+            # files with legacy name aren't renamed yet
+            for file_name, index_file_name in COMPACTED_FILE_NAMES.items():
+                compacted_path = directory.joinpath(file_name)
+
+                if compacted_path.exists():
+                    logger.debug(f"Read compacted file: {compacted_path}")
+
+                    sources.append(row for _, row in read_compacted(
+                        compacted_path,
+                        directory.joinpath(index_file_name),
+                        from_time_ns,
+                        to_time_ns
+                    ))
+
+        # csv files are written without compression or with compression (by storage settings)
+        for file_name in RAW_FILE_NAMES.values():
+            raw_path = file_path.with_name(file_name)
+
+            if raw_path.exists():
+                logger.debug(f"Read file: {raw_path}")
+
+                if data_type == MarketDataType.CANDLE:
+                    # sort is stable: updates of the same candle keep order
+                    sources.append(sorted(read_raw_rows(raw_path), key=row_time_ns))
+                else:
+                    sources.append(read_raw_rows(raw_path))
+
+        return sources
@@ -1,13 +1,21 @@
 import csv
 import datetime
+import io
 import logging
 from pathlib import Path
+from typing import IO
 
-from tinkoff.invest import MarketDataResponse, Candle, Trade, LastPrice
-from tinkoff.invest.utils import quotation_to_decimal
+from tinkoff.invest import MarketDataResponse
 
 from configuration.settings import StorageSettings
 from data_storage.base_storage import IStorage
+from data_storage.files_csv.csv_compacted_format import row_time_ns
+from data_storage.files_csv.csv_frames import NO_COMPRESSION, FRAME_HEADER, RAW_FILE_NAMES, raw_file_name, \
+    compressor, repair_tail, read_tail_rows
+from data_storage.partitioned_file_writer import PartitionedFileWriter
+from invest_api.fixed_point_price import format_price, parse_price
+from invest_api.market_data_record import MarketDataRecord, CandleRecord, TradeRecord, PriceRecord, \
+    market_data_record, figi_id, format_time
 
 
 __all__ = ("CSVDataStorage")
@@ -16,7 +24,16 @@ logger = logging.getLogger(__name__)
 
 
 class CSVDataStorage(IStorage):
-    __FILE_NAME = "market_data.csv"
+    """
+    Rows are buffered per (figi, data type, day) and written to file if buffer is full (buffer_row_size)
+    or buffer is older than flush_interval_sec (see PartitionedFileWriter).
+    Opened files are kept in bounded LRU cache (max_open_files).
+
+    If compression (GZIP or ZSTD) is specified, every buffer flush is written as independently decoded frame
+    (see csv_frames). An incomplete frame (e.g. after crash) is cut before the file is appended first time.
+    """
+    # label of storage metrics
+    __STORAGE_NAME = "FILES_CSV"
 
     __CANDLE_TYPE_FOLDER = "candle"
     __TRADE_TYPE_FOLDER = "trade"
@@ -25,6 +42,14 @@ class CSVDataStorage(IStorage):
     # Consts to read and parse dict with configuration
     __ROOT_PATH_NAME = "root_path"
     __BUFFER_ROW_SIZE_NAME = "buffer_row_size"
+    __FLUSH_INTERVAL_SEC_NAME = "flush_interval_sec"
+    __MAX_OPEN_FILES_NAME = "max_open_files"
+    __COMPRESSION_NAME = "compression"
+    __COMPRESSION_LEVEL_NAME = "compression_level"
+
+    __DEFAULT_FLUSH_INTERVAL_SEC = 5
+    __DEFAULT_MAX_OPEN_FILES = 64
+    __DEFAULT_COMPRESSION_LEVEL = 3
 
     def __init__(self, settings: StorageSettings) -> None:
         self.__root_path = settings.settings.get(self.__ROOT_PATH_NAME, None)
@@ -37,72 +62,167 @@ class CSVDataStorage(IStorage):
 
             raise Exception(f"CSVDataStorage: All settings must be specified, but some of them is empty")
 
+        self.__buffer_row_size = int(self.__buffer_row_size)
+        self.__flush_interval_sec = float(
+            settings.settings.get(self.__FLUSH_INTERVAL_SEC_NAME, self.__DEFAULT_FLUSH_INTERVAL_SEC)
+        )
+
+        self.__compression = settings.settings.get(self.__COMPRESSION_NAME, NO_COMPRESSION).upper()
+        self.__file_name = raw_file_name(self.__compression)
+        self.__compress = compressor(
+            self.__compression,
+            int(settings.settings.get(self.__COMPRESSION_LEVEL_NAME, self.__DEFAULT_COMPRESSION_LEVEL))
+        ) if self.__compression != NO_COMPRESSION else None
+
+        self.__writer = PartitionedFileWriter(
+            self.__STORAGE_NAME,
+            self.__buffer_row_size,
+            self.__flush_interval_sec,
+            int(settings.settings.get(self.__MAX_OPEN_FILES_NAME, self.__DEFAULT_MAX_OPEN_FILES)),
+            "ab" if self.__compress else "a",
+            self.__calculate_file_path,
+            self.__write_data_rows
+        )
+
     def save(self, market_data: MarketDataResponse) -> None:
         try:
-            if market_data.candle:
-                self.__save_candle(market_data.candle)
-            elif market_data.trade:
-                self.__save_trade(market_data.trade)
-            elif market_data.last_price:
-                self.__save_last_price(market_data.last_price)
-            else:
-                logger.debug(f"Nothing to save")
-
+            record = market_data_record(market_data)
         except Exception as ex:
-            logger.error(f"Error while write market data to file: {repr(ex)}")
+            logger.error(f"Error while convert market data: {repr(ex)}")
+            return
+
+        if record:
+            self.save_record(record)
+        else:
+            logger.debug("Nothing to save")
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.save_batch([record])
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        # An error of one record doesn't stop the batch, failed records are counted
+        lost, error = 0, None
+
+        for record in records:
+            try:
+                record_type = type(record)
+
+                if record_type is CandleRecord:
+                    self.__save_candle(record)
+                elif record_type is TradeRecord:
+                    self.__save_trade(record)
+                else:
+                    self.__save_last_price(record)
+
+            except Exception as ex:
+                lost, error = lost + 1, ex
+
+        if lost:
+            logger.error(f"Error while write market data to file: {repr(error)}. "
+                         f"Lost records: {lost} of {len(records)}")
+
+    def tail_records(self, day: datetime.date, max_records: int) -> list[MarketDataRecord]:
+        records: list[MarketDataRecord] = []
+
+        root_path = Path(self.__root_path)
+        if not root_path.exists():
+            return records
+
+        for figi_path in sorted(root_path.iterdir()):
+            if not figi_path.is_dir():
+                continue
+
+            for type_folder, to_record in (
+                    (self.__CANDLE_TYPE_FOLDER, self.__candle_record),
+                    (self.__TRADE_TYPE_FOLDER, self.__trade_record),
+                    (self.__LAST_PRICE_TYPE_FOLDER, self.__last_price_record)
+            ):
+                directory = Path(figi_path, type_folder, str(day.year), str(day.month), str(day.day))
+
+                # files of all compressions: compression could be changed during the day
+                for file_name in RAW_FILE_NAMES.values():
+                    file_path = directory.joinpath(file_name)
+
+                    if not file_path.exists():
+                        continue
+
+                    try:
+                        id_ = figi_id(figi_path.name)
+                        records.extend(to_record(id_, row) for row in read_tail_rows(file_path, max_records))
+                    except Exception as ex:
+                        logger.error(f"Error while read the end of file {file_path}: {repr(ex)}")
 
-    def __save_candle(self, candle: Candle) -> None:
+        return records
+
+    @staticmethod
+    def __candle_record(id_: int, row: list[str]) -> CandleRecord:
+        return CandleRecord(
+            id_,
+            row_time_ns(row),
+            parse_price(row[0]),
+            parse_price(row[1]),
+            parse_price(row[2]),
+            parse_price(row[3]),
+            int(row[4])
+        )
+
+    @staticmethod
+    def __trade_record(id_: int, row: list[str]) -> TradeRecord:
+        return TradeRecord(id_, row_time_ns(row), int(row[0]), parse_price(row[1]), int(row[2]))
+
+    @staticmethod
+    def __last_price_record(id_: int, row: list[str]) -> PriceRecord:
+        return PriceRecord(id_, row_time_ns(row), parse_price(row[0]))
+
+    def flush(self) -> None:
+        self.__writer.flush()
+
+    def close(self) -> None:
+        self.__writer.close()
+
+    def __save_candle(self, candle: CandleRecord) -> None:
         """
         Headers in candle csv file:
         open, close, high, low, volume, time
         """
         row = [
-            quotation_to_decimal(candle.open),
-            quotation_to_decimal(candle.close),
-            quotation_to_decimal(candle.high),
-            quotation_to_decimal(candle.low),
+            format_price(candle.open),
+            format_price(candle.close),
+            format_price(candle.high),
+            format_price(candle.low),
             candle.volume,
-            candle.time
+            format_time(candle.time_ns)
         ]
 
-        CSVDataStorage.__write_data_row(
-            self.__calculate_file_path(candle.figi, self.__CANDLE_TYPE_FOLDER, candle.time),
-            row
-        )
+        self.__writer.append(candle.figi_id, self.__CANDLE_TYPE_FOLDER, candle.time_ns, row)
 
-    def __save_trade(self, trade: Trade) -> None:
+    def __save_trade(self, trade: TradeRecord) -> None:
         """
         Headers in trade csv file:
         direction, price, quantity, time
         """
         row = [
-            int(trade.direction),
-            quotation_to_decimal(trade.price),
+            trade.direction,
+            format_price(trade.price),
             trade.quantity,
-            trade.time
+            format_time(trade.time_ns)
         ]
 
-        CSVDataStorage.__write_data_row(
-            self.__calculate_file_path(trade.figi, self.__TRADE_TYPE_FOLDER, trade.time),
-            row
-        )
+        self.__writer.append(trade.figi_id, self.__TRADE_TYPE_FOLDER, trade.time_ns, row)
 
-    def __save_last_price(self, last_price: LastPrice) -> None:
+    def __save_last_price(self, last_price: PriceRecord) -> None:
         """
         Headers in last_price csv file:
         price, time
         """
         row = [
-            quotation_to_decimal(last_price.price),
-            last_price.time
+            format_price(last_price.price),
+            format_time(last_price.time_ns)
         ]
 
-        CSVDataStorage.__write_data_row(
-            self.__calculate_file_path(last_price.figi, self.__LAST_PRICE_TYPE_FOLDER, last_price.time),
-            row
-        )
+        self.__writer.append(last_price.figi_id, self.__LAST_PRICE_TYPE_FOLDER, last_price.time_ns, row)
 
-    def __calculate_file_path(self, figi: str, type_folder: str, time: datetime) -> str:
+    def __calculate_file_path(self, figi: str, type_folder: str, day: datetime.date) -> str:
         """
         Folder Structure is:
         root_path
@@ -112,43 +232,35 @@ class CSVDataStorage(IStorage):
                         month
                             day
                                 {file_name}
-        """
-        directories = [
-            self.__root_path, figi, type_folder, str(time.year), str(time.month), str(time.day)
-        ]
-
-        current_dir = None
-        for directory in directories:
-            current_dir = CSVDataStorage.__check_or_mk_dir(
-                current_dir.joinpath(Path(directory)) if current_dir else Path(directory)
-            )
 
-        return str(Path(current_dir, self.__FILE_NAME))
+        It is called once per (figi, type_folder, day) till day rollover: directories are made
+        and tail of compressed file is checked once.
+        """
+        directory = Path(self.__root_path, figi, type_folder, str(day.year), str(day.month), str(day.day))
 
-    @staticmethod
-    def __check_or_mk_dir(directory: Path) -> Path:
         if not directory.exists():
             logger.info(f"Directory doesn't exist: {directory}. Making...")
-            directory.mkdir()
+            directory.mkdir(parents=True, exist_ok=True)
 
-        return directory
+        file_path = str(Path(directory, self.__file_name))
 
-    @staticmethod
-    def __write_data_row(file_name: str, row: list) -> None:
-        logger.debug(f"Write to file: {file_name}. Data: {row}")
+        if self.__compress:
+            removed = repair_tail(Path(file_path))
 
-        with open(file_name, 'a', encoding='UTF8', newline="") as file:
-            csv_writer = csv.writer(file)
+            if removed:
+                logger.warning(f"Incomplete frame has been removed from file: {file_path}. Bytes: {removed}")
 
-            # write the data
-            csv_writer.writerow(row)
+        return file_path
 
-    @staticmethod
-    def __write_data_rows(file_name: str, rows: list[list]) -> None:
-        logger.debug(f"Write to file: {file_name}. Data: {rows}")
+    def __write_data_rows(self, file: IO, rows: list[list]) -> int:
+        # rows are formatted in memory, so written size is known
+        text = io.StringIO()
+        csv.writer(text).writerows(rows)
+
+        if self.__compress:
+            frame = self.__compress(text.getvalue().encode("UTF8"))
 
-        with open(file_name, 'a', encoding='UTF8', newline="") as file:
-            csv_writer = csv.writer(file)
+            # one write per frame: a crash can cut the last frame only
+            return file.write(FRAME_HEADER.pack(len(frame)) + frame)
 
-            # write the data
-            csv_writer.writerows(rows)
+        return file.write(text.getvalue())
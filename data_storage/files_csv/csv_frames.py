@@ -0,0 +1,208 @@
+import csv
+import gzip
+import io
+import logging
+import os
+import struct
+from pathlib import Path
+from typing import Callable, Generator
+
+__all__ = (
+    "NO_COMPRESSION", "GZIP_COMPRESSION", "ZSTD_COMPRESSION", "FRAME_HEADER", "RAW_FILE_NAMES",
+    "raw_file_name", "compressor", "repair_tail", "read_raw_rows", "read_tail_rows"
+)
+
+logger = logging.getLogger(__name__)
+
+NO_COMPRESSION = "NONE"
+GZIP_COMPRESSION = "GZIP"
+ZSTD_COMPRESSION = "ZSTD"
+
+# Compressed csv file is a sequence of frames: length of compressed data (uint32) and compressed csv rows.
+# Every frame is decoded independently (one gzip member or one zstd frame), a frame is written per buffer flush.
+FRAME_HEADER = struct.Struct("<I")
+
+# File name by compression
+RAW_FILE_NAMES = {
+    NO_COMPRESSION: "market_data.csv",
+    GZIP_COMPRESSION: "market_data.csv.gzf",
+    ZSTD_COMPRESSION: "market_data.csv.zstf"
+}
+
+_COMPRESSIONS = {file_name: compression for compression, file_name in RAW_FILE_NAMES.items()}
+
+# The first chunk read from the end of not compressed file, the chunk grows till it contains enough rows
+_TAIL_CHUNK_SIZE = 64 * 1024
+
+
+def raw_file_name(compression: str) -> str:
+    file_name = RAW_FILE_NAMES.get(compression)
+
+    if not file_name:
+        raise Exception(f"Unknown csv compression: {compression}")
+
+    return file_name
+
+
+def compressor(compression: str, level: int) -> Callable[[bytes], bytes]:
+    match compression:
+        case "GZIP":
+            # mtime=0 keeps frames reproducible
+            return lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+        case "ZSTD":
+            # zstandard is required for ZSTD compression only
+            import zstandard
+
+            return zstandard.ZstdCompressor(level=level).compress
+        case _:
+            raise Exception(f"Unknown csv compression: {compression}")
+
+
+def _decompressor(compression: str) -> Callable[[bytes], bytes]:
+    match compression:
+        case "GZIP":
+            return gzip.decompress
+        case "ZSTD":
+            import zstandard
+
+            return zstandard.ZstdDecompressor().decompress
+        case _:
+            raise Exception(f"Unknown csv compression: {compression}")
+
+
+def repair_tail(file_path: Path) -> int:
+    """
+    Truncates incomplete frame at the end of file (e.g. after crash), so new frames can be appended.
+    Frame headers are read only, frames aren't decompressed.
+    :return: Count of removed bytes
+    """
+    if not file_path.exists():
+        return 0
+
+    with open(file_path, "r+b") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        offset = 0
+
+        while offset + FRAME_HEADER.size <= file_size:
+            file.seek(offset)
+            length, = FRAME_HEADER.unpack(file.read(FRAME_HEADER.size))
+
+            if offset + FRAME_HEADER.size + length > file_size:
+                break
+
+            offset += FRAME_HEADER.size + length
+
+        if offset < file_size:
+            file.truncate(offset)
+
+    return file_size - offset
+
+
+def read_raw_rows(file_path: Path) -> Generator[list[str], None, None]:
+    """
+    Yields rows of csv file written by CSVDataStorage (compressed or not) in file order.
+    Compressed files are read frame by frame, broken frames are skipped.
+    """
+    compression = _COMPRESSIONS.get(file_path.name)
+
+    if compression == NO_COMPRESSION:
+        with open(file_path, "r", encoding="UTF8", newline="") as file:
+            for row in csv.reader(file):
+                if row:
+                    yield row
+
+        return
+
+    decompress = _decompressor(compression)
+
+    with open(file_path, "rb") as file:
+        while len(header := file.read(FRAME_HEADER.size)) == FRAME_HEADER.size:
+            length, = FRAME_HEADER.unpack(header)
+            frame = file.read(length)
+
+            if len(frame) < length:
+                logger.warning(f"Incomplete frame at the end of file is skipped: {file_path}")
+                return
+
+            try:
+                text = decompress(frame).decode("UTF8")
+            except Exception as ex:
+                logger.warning(f"Broken frame is skipped: {file_path}: {repr(ex)}")
+                continue
+
+            for row in csv.reader(io.StringIO(text, newline="")):
+                if row:
+                    yield row
+
+
+def read_tail_rows(file_path: Path, max_rows: int) -> list[list[str]]:
+    """
+    Returns up to max_rows last rows of csv file written by CSVDataStorage (compressed or not) in file order.
+    Only the end of file is read and decompressed. An incomplete last row or frame is skipped.
+    """
+    if _COMPRESSIONS.get(file_path.name) == NO_COMPRESSION:
+        return _read_csv_tail(file_path, max_rows)
+
+    return _read_frames_tail(file_path, max_rows)
+
+
+def _read_csv_tail(file_path: Path, max_rows: int) -> list[list[str]]:
+    with open(file_path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        chunk_size = _TAIL_CHUNK_SIZE
+
+        while True:
+            offset = max(0, file_size - chunk_size)
+            file.seek(offset)
+            data = file.read(file_size - offset)
+
+            # the first row of the chunk can be cut, the last row can be written partially
+            if offset > 0:
+                data = data[data.find(b"\n") + 1:]
+            data = data[:data.rfind(b"\n") + 1]
+
+            rows = [row for row in csv.reader(io.StringIO(data.decode("UTF8"), newline="")) if row]
+
+            if len(rows) >= max_rows or offset == 0:
+                return rows[-max_rows:] if max_rows > 0 else []
+
+            chunk_size *= 4
+
+
+def _read_frames_tail(file_path: Path, max_rows: int) -> list[list[str]]:
+    decompress = _decompressor(_COMPRESSIONS.get(file_path.name))
+
+    with open(file_path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+
+        # frame headers are read only to find offsets of frames
+        frames: list[tuple[int, int]] = []
+        offset = 0
+
+        while offset + FRAME_HEADER.size <= file_size:
+            file.seek(offset)
+            length, = FRAME_HEADER.unpack(file.read(FRAME_HEADER.size))
+
+            if offset + FRAME_HEADER.size + length > file_size:
+                break
+
+            frames.append((offset + FRAME_HEADER.size, length))
+            offset += FRAME_HEADER.size + length
+
+        rows: list[list[str]] = []
+
+        for frame_offset, length in reversed(frames):
+            if len(rows) >= max_rows:
+                break
+
+            file.seek(frame_offset)
+
+            try:
+                text = decompress(file.read(length)).decode("UTF8")
+            except Exception as ex:
+                logger.warning(f"Broken frame is skipped: {file_path}: {repr(ex)}")
+                continue
+
+            rows[:0] = [row for row in csv.reader(io.StringIO(text, newline="")) if row]
+
+        return rows[-max_rows:] if max_rows > 0 else []
@@ -0,0 +1,228 @@
+import datetime
+import logging
+import time
+from typing import IO, Optional
+
+from google.protobuf.timestamp_pb2 import Timestamp
+from tinkoff.invest import MarketDataResponse
+from tinkoff.invest.grpc import common_pb2, marketdata_pb2
+
+from configuration.settings import StorageSettings
+from data_storage.base_storage import IStorage, STORAGE_WRITE_SECONDS, STORAGE_BYTES_WRITTEN
+from data_storage.journal.journal_format import RECORD_HEADER, INDEX_ENTRY, journal_file_path, index_file_path, \
+    repair_journal
+from invest_api.fixed_point_price import PRICE_SCALE
+from invest_api.market_data_message import serialize_market_data
+from invest_api.market_data_record import MarketDataRecord, CandleRecord, TradeRecord, figi_by_id
+
+__all__ = ("JournalDataStorage")
+
+logger = logging.getLogger(__name__)
+
+
+class JournalDataStorage(IStorage):
+    """
+    Append-only per-day journal of serialized MarketDataResponse protobuf messages.
+    Every record has length prefix and receive time. Sparse time index is written beside the journal.
+    Receive time is taken on the event loop when the message has arrived (MarketDataRecord.receive_time_ns),
+    so the lag of a storage queue isn't added to it. Receive times of the journal never go back.
+    Use JournalReader to read the journal or convert it to another storage after market close.
+    An incomplete record at the end of journal (e.g. after crash) is cut before the journal is appended.
+
+    Original messages of the stream are kept as is (see keeps_messages), they contain all fields of the API
+    (e.g. last_trade_ts of candles). Records without message (e.g. backfilled candles) are serialized
+    to protobuf directly, without SDK dataclasses.
+    """
+    # label of storage metrics
+    __STORAGE_NAME = "JOURNAL"
+
+    # Consts to read and parse dict with configuration
+    __ROOT_PATH_NAME = "root_path"
+    __INDEX_INTERVAL_SEC_NAME = "index_interval_sec"
+
+    __DEFAULT_INDEX_INTERVAL_SEC = 1
+
+    __NS_IN_SECOND = 1_000_000_000
+
+    def __init__(self, settings: StorageSettings) -> None:
+        self.__root_path = settings.settings.get(self.__ROOT_PATH_NAME, None)
+
+        if not self.__root_path:
+            logger.error(f"Storage init failed: root path is {self.__root_path}")
+
+            raise Exception(f"JournalDataStorage: All settings must be specified, but some of them is empty")
+
+        self.__index_interval_ns = int(
+            float(settings.settings.get(self.__INDEX_INTERVAL_SEC_NAME, self.__DEFAULT_INDEX_INTERVAL_SEC)) * 1e9
+        )
+
+        self.__current_day: datetime.date = None
+        self.__journal_file: IO = None
+        self.__index_file: IO = None
+        self.__next_index_ns = 0
+        self.__last_receive_time_ns = 0
+
+    @property
+    def keeps_messages(self) -> bool:
+        return True
+
+    def save(self, market_data: MarketDataResponse) -> None:
+        # Receive time of a message without record is the write time
+        try:
+            self.__append([(self.__receive_time(None), serialize_market_data(market_data))])
+
+        except Exception as ex:
+            logger.error(f"Error while write market data to journal: {repr(ex)}")
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.save_batch([record])
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        try:
+            self.__append([
+                (self.__receive_time(getattr(record, "receive_time_ns", None)), self.__serialize(record))
+                for record in records
+            ])
+
+        except Exception as ex:
+            logger.error(f"Error while write market data to journal: {repr(ex)}")
+
+    def flush(self) -> None:
+        if self.__journal_file:
+            write_start = time.perf_counter()
+
+            self.__journal_file.flush()
+            self.__index_file.flush()
+
+            STORAGE_WRITE_SECONDS.observe(time.perf_counter() - write_start, (self.__STORAGE_NAME,))
+
+    def close(self) -> None:
+        self.__close_files()
+
+    def __receive_time(self, receive_time_ns: Optional[int]) -> int:
+        """
+        Records without receive time (e.g. saved not from the stream) get the write time.
+        Time never goes back: the index is searched by time.
+        """
+        if receive_time_ns is None:
+            receive_time_ns = time.time_ns()
+
+        if receive_time_ns < self.__last_receive_time_ns:
+            receive_time_ns = self.__last_receive_time_ns
+
+        self.__last_receive_time_ns = receive_time_ns
+
+        return receive_time_ns
+
+    def __append(self, records: list[tuple[int, bytes]]) -> None:
+        """
+        :param records: receive time and payload of every record
+        """
+        if not records:
+            return
+
+        # The day and the index entry are checked by the first record of a batch
+        receive_time_ns = records[0][0]
+
+        day = datetime.datetime.fromtimestamp(receive_time_ns / 1e9, tz=datetime.timezone.utc).date() \
+            if receive_time_ns >= self.__next_index_ns else self.__current_day
+
+        if not self.__current_day or self.__current_day < day:
+            self.__open_files(day)
+
+        if receive_time_ns >= self.__next_index_ns:
+            self.__index_file.write(INDEX_ENTRY.pack(receive_time_ns, self.__journal_file.tell()))
+            self.__next_index_ns = receive_time_ns + self.__index_interval_ns
+
+        # one write per batch
+        data = b"".join(
+            RECORD_HEADER.pack(len(payload), receive_time_ns) + payload for receive_time_ns, payload in records
+        )
+
+        self.__journal_file.write(data)
+        STORAGE_BYTES_WRITTEN.inc((self.__STORAGE_NAME,), len(data))
+
+    def __open_files(self, day: datetime.date) -> None:
+        self.__close_files()
+
+        journal_file_name = journal_file_path(self.__root_path, day)
+        logger.info(f"Open journal: {journal_file_name}")
+
+        journal_file_name.parent.mkdir(parents=True, exist_ok=True)
+
+        index_file_name = index_file_path(self.__root_path, day)
+
+        removed = repair_journal(journal_file_name, index_file_name)
+        if removed:
+            logger.warning(f"Incomplete record has been removed from journal: {journal_file_name}. Bytes: {removed}")
+
+        self.__journal_file = open(journal_file_name, "ab")
+        self.__index_file = open(index_file_name, "ab")
+
+        self.__current_day = day
+        self.__next_index_ns = 0
+
+    def __close_files(self) -> None:
+        if self.__journal_file:
+            self.__journal_file.close()
+            self.__index_file.close()
+
+            self.__journal_file = None
+            self.__index_file = None
+            self.__current_day = None
+
+    @staticmethod
+    def __serialize(record: MarketDataRecord) -> bytes:
+        market_data = getattr(record, "market_data", None)
+
+        if market_data is not None:
+            return serialize_market_data(market_data)
+
+        return JournalDataStorage.__to_protobuf(record).SerializeToString()
+
+    @staticmethod
+    def __to_protobuf(record: MarketDataRecord) -> marketdata_pb2.MarketDataResponse:
+        seconds, nanos = divmod(record.time_ns, JournalDataStorage.__NS_IN_SECOND)
+        record_time = Timestamp(seconds=seconds, nanos=nanos)
+        record_type = type(record)
+
+        if record_type is CandleRecord:
+            return marketdata_pb2.MarketDataResponse(
+                candle=marketdata_pb2.Candle(
+                    figi=figi_by_id(record.figi_id),
+                    interval=marketdata_pb2.SUBSCRIPTION_INTERVAL_ONE_MINUTE,
+                    open=JournalDataStorage.__quotation(record.open),
+                    high=JournalDataStorage.__quotation(record.high),
+                    low=JournalDataStorage.__quotation(record.low),
+                    close=JournalDataStorage.__quotation(record.close),
+                    volume=record.volume,
+                    time=record_time
+                )
+            )
+        elif record_type is TradeRecord:
+            return marketdata_pb2.MarketDataResponse(
+                trade=marketdata_pb2.Trade(
+                    figi=figi_by_id(record.figi_id),
+                    direction=record.direction,
+                    price=JournalDataStorage.__quotation(record.price),
+                    quantity=record.quantity,
+                    time=record_time
+                )
+            )
+
+        return marketdata_pb2.MarketDataResponse(
+            last_price=marketdata_pb2.LastPrice(
+                figi=figi_by_id(record.figi_id),
+                price=JournalDataStorage.__quotation(record.price),
+                time=record_time
+            )
+        )
+
+    @staticmethod
+    def __quotation(nanos: int) -> common_pb2.Quotation:
+        units, nano = divmod(abs(nanos), PRICE_SCALE)
+
+        if nanos < 0:
+            return common_pb2.Quotation(units=-units, nano=-nano)
+
+        return common_pb2.Quotation(units=units, nano=nano)
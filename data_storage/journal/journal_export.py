@@ -0,0 +1,48 @@
+"""
+Converts a day journal into another storage, e.g. csv files.
+
+Run from the project root:
+python -m data_storage.journal.journal_export --journal-root ../../../raw_market_data/journal --date 2022-11-02 \
+    --storage-type FILES_CSV --setting root_path=../../../raw_market_data --setting buffer_row_size=1000
+"""
+import argparse
+import datetime
+import logging
+
+from configuration.settings import StorageSettings
+from data_storage.journal.journal_reader import JournalReader
+from data_storage.storage_factory import StorageFactory
+
+logger = logging.getLogger(__name__)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert market data journal to another storage")
+    parser.add_argument("--journal-root", required=True, help="ROOT_PATH of JOURNAL storage")
+    parser.add_argument("--date", required=True, type=datetime.date.fromisoformat, help="Journal day: YYYY-MM-DD")
+    parser.add_argument("--storage-type", required=True, help="Target storage type, e.g. FILES_CSV")
+    parser.add_argument("--setting", action="append", default=[], help="Target storage setting: KEY=VALUE")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    settings = StorageSettings(
+        settings=dict(
+            (key.strip().lower(), value.strip())
+            for key, value in (setting.split("=", 1) for setting in args.setting)
+        )
+    )
+
+    storage = StorageFactory.new_factory(args.storage_type, settings)
+    if not storage:
+        logger.error(f"Storage hasn't been found by type name: {args.storage_type}")
+        return
+
+    try:
+        JournalReader(args.journal_root, args.date).export(storage)
+    finally:
+        storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import datetime
+import os
+import struct
+from pathlib import Path
+
+__all__ = (
+    "RECORD_HEADER", "INDEX_ENTRY", "JOURNAL_FILE_NAME", "INDEX_FILE_NAME", "journal_file_path", "index_file_path",
+    "repair_journal"
+)
+
+# Journal record: payload length (uint32), receive time in ns since epoch (uint64), serialized MarketDataResponse
+RECORD_HEADER = struct.Struct("<IQ")
+
+# Sparse time index entry: receive time in ns since epoch (uint64), offset of record in journal file (uint64)
+INDEX_ENTRY = struct.Struct("<QQ")
+
+JOURNAL_FILE_NAME = "market_data.journal"
+INDEX_FILE_NAME = "market_data.journal.idx"
+
+
+def journal_file_path(root_path: str, day: datetime.date) -> Path:
+    """
+    Folder Structure is:
+    root_path
+        year
+            month
+                day
+                    market_data.journal
+                    market_data.journal.idx
+    """
+    return Path(root_path, str(day.year), str(day.month), str(day.day), JOURNAL_FILE_NAME)
+
+
+def index_file_path(root_path: str, day: datetime.date) -> Path:
+    return Path(root_path, str(day.year), str(day.month), str(day.day), INDEX_FILE_NAME)
+
+
+def repair_journal(journal_path: Path, index_path: Path) -> int:
+    """
+    Truncates incomplete record at the end of journal (e.g. after crash), so new records can be appended.
+    Index entries of removed data and a truncated entry at the end of index are removed as well.
+    Record headers are read from the last indexed record only.
+    :return: Count of removed bytes of journal
+    """
+    if not journal_path.exists():
+        return 0
+
+    with open(journal_path, "r+b") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        offset = _repair_index(index_path, file_size)
+
+        while offset + RECORD_HEADER.size <= file_size:
+            file.seek(offset)
+            length, _ = RECORD_HEADER.unpack(file.read(RECORD_HEADER.size))
+
+            if offset + RECORD_HEADER.size + length > file_size:
+                break
+
+            offset += RECORD_HEADER.size + length
+
+        if offset < file_size:
+            file.truncate(offset)
+
+    return file_size - offset
+
+
+def _repair_index(index_path: Path, journal_size: int) -> int:
+    """
+    Removes index entries beyond the journal.
+    :return: Offset of the last indexed record
+    """
+    if not index_path.exists():
+        return 0
+
+    with open(index_path, "r+b") as file:
+        data = file.read()
+        size = len(data) - len(data) % INDEX_ENTRY.size
+
+        # entries are written in journal order
+        while size and INDEX_ENTRY.unpack_from(data, size - INDEX_ENTRY.size)[1] > journal_size:
+            size -= INDEX_ENTRY.size
+
+        if size < len(data):
+            file.truncate(size)
+
+    return INDEX_ENTRY.unpack_from(data, size - INDEX_ENTRY.size)[1] if size else 0
@@ -0,0 +1,113 @@
+import bisect
+import datetime
+import logging
+from typing import Generator, Optional
+
+from tinkoff.invest import MarketDataResponse
+
+from data_storage.base_storage import IStorage
+from data_storage.journal.journal_format import RECORD_HEADER, INDEX_ENTRY, journal_file_path, index_file_path
+from invest_api.market_data_message import parse_market_data
+
+__all__ = ("JournalRecord", "JournalReader")
+
+logger = logging.getLogger(__name__)
+
+
+class JournalRecord:
+    """
+    Journal record. Payload is decoded on request only.
+    """
+    __slots__ = ("receive_time_ns", "payload")
+
+    def __init__(self, receive_time_ns: int, payload: bytes) -> None:
+        self.receive_time_ns = receive_time_ns
+        self.payload = payload
+
+    def decode(self) -> MarketDataResponse:
+        return parse_market_data(self.payload)
+
+
+class JournalReader:
+    """
+    The class reads one day journal written by JournalDataStorage
+    """
+    def __init__(self, root_path: str, day: datetime.date) -> None:
+        self.__journal_file_name = journal_file_path(root_path, day)
+        self.__index_file_name = index_file_path(root_path, day)
+
+    def records(
+            self,
+            from_time_ns: Optional[int] = None,
+            to_time_ns: Optional[int] = None
+    ) -> Generator[JournalRecord, None, None]:
+        """
+        Yields records with receive time in [from_time_ns, to_time_ns).
+        Sparse time index is used to seek to the first record.
+        A truncated record at the end of journal (e.g. after crash) is skipped.
+        """
+        with open(self.__journal_file_name, "rb") as file:
+            if from_time_ns:
+                file.seek(self.__find_offset(from_time_ns))
+
+            while len(header := file.read(RECORD_HEADER.size)) == RECORD_HEADER.size:
+                length, receive_time_ns = RECORD_HEADER.unpack(header)
+                payload = file.read(length)
+
+                if len(payload) < length:
+                    logger.warning(f"Truncated record has been found in journal: {self.__journal_file_name}")
+                    break
+
+                if from_time_ns and receive_time_ns < from_time_ns:
+                    continue
+
+                if to_time_ns and receive_time_ns >= to_time_ns:
+                    break
+
+                yield JournalRecord(receive_time_ns, payload)
+
+    def market_data(
+            self,
+            from_time_ns: Optional[int] = None,
+            to_time_ns: Optional[int] = None
+    ) -> Generator[MarketDataResponse, None, None]:
+        for record in self.records(from_time_ns, to_time_ns):
+            yield record.decode()
+
+    def export(self, storage: IStorage) -> int:
+        """
+        Saves whole journal into another storage (e.g. csv files) and flushes it.
+        :return: Count of exported records
+        """
+        logger.info(f"Export journal {self.__journal_file_name} to {storage.__class__.__name__}")
+
+        count = 0
+        for market_data in self.market_data():
+            storage.save(market_data)
+            count += 1
+
+        storage.flush()
+
+        logger.info(f"Journal has been exported: {count} records")
+
+        return count
+
+    def __find_offset(self, from_time_ns: int) -> int:
+        if not self.__index_file_name.exists():
+            return 0
+
+        times, offsets = [], []
+
+        with open(self.__index_file_name, "rb") as file:
+            data = file.read()
+
+            # skip a truncated entry at the end of index (e.g. after crash)
+            data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+
+            for receive_time_ns, offset in INDEX_ENTRY.iter_unpack(data):
+                times.append(receive_time_ns)
+                offsets.append(offset)
+
+        position = bisect.bisect_right(times, from_time_ns) - 1
+
+        return offsets[position] if position >= 0 else 0
@@ -0,0 +1,166 @@
+import datetime
+import logging
+import threading
+import time as time_module
+from typing import IO, Callable
+
+from data_storage.base_storage import STORAGE_WRITE_SECONDS, STORAGE_BYTES_WRITTEN
+from data_storage.file_handle_cache import FileHandleCache
+from invest_api.market_data_record import figi_by_id, ns_to_date
+
+__all__ = ("PartitionedFileWriter")
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionedFileWriter:
+    """
+    Buffered writer of per (figi, data type, day) files, it is shared by file storages.
+
+    Rows are buffered per partition and written to file if buffer is full (buffer_row_size)
+    or buffer is older than flush_interval_sec. Age of buffers is checked by background timer thread,
+    so rows are written without new market data as well. Rows are kept in buffer until they have been written.
+    Opened files are kept in bounded LRU cache (max_open_files), they are closed on day rollover.
+
+    The storage specifies:
+    - file_path(figi, type_folder, day): it is called once per partition till day rollover,
+      it makes directories and repairs the end of existing file
+    - write(file, rows): it writes rows into opened file and returns count of written bytes
+    """
+    def __init__(
+            self,
+            storage_name: str,
+            buffer_row_size: int,
+            flush_interval_sec: float,
+            max_open_files: int,
+            file_mode: str,
+            file_path: Callable[[str, str, datetime.date], str],
+            write: Callable[[IO, list], int]
+    ) -> None:
+        # label of storage metrics
+        self.__storage_name = storage_name
+        self.__buffer_row_size = buffer_row_size
+        self.__flush_interval_sec = flush_interval_sec
+        self.__file_path = file_path
+        self.__write = write
+
+        self.__files = FileHandleCache(max_open_files, mode=file_mode)
+
+        # (figi, type_folder, date) -> buffered rows
+        self.__buffers: dict[tuple[str, str, datetime.date], list] = dict()
+        # (figi, type_folder, date) -> monotonic time of the first buffered row
+        self.__buffers_created: dict[tuple[str, str, datetime.date], float] = dict()
+
+        # (figi, type_folder, date) -> file path
+        self.__file_paths: dict[tuple[str, str, datetime.date], str] = dict()
+
+        self.__current_day: datetime.date = None
+
+        # Buffers are used by the storage and by the timer thread
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__flush_timer = threading.Thread(
+            target=self.__flush_timer_worker, name=f"{storage_name.lower()}-flush-timer", daemon=True
+        )
+        self.__flush_timer.start()
+
+    def append(self, figi_id: int, type_folder: str, time_ns: int, row) -> None:
+        with self.__lock:
+            day = ns_to_date(time_ns)
+
+            if not self.__current_day or self.__current_day < day:
+                self.__roll_day(day)
+
+            key = (figi_by_id(figi_id), type_folder, day)
+
+            buffer = self.__buffers.get(key)
+            if buffer is None:
+                buffer = self.__buffers[key] = []
+                self.__buffers_created[key] = time_module.monotonic()
+
+            buffer.append(row)
+
+            if len(buffer) >= self.__buffer_row_size:
+                try:
+                    self.__flush_buffer(key)
+                except Exception as ex:
+                    # The row is kept in buffer
+                    logger.error(f"Error while write market data to file: {repr(ex)}")
+
+    def file_path(self, figi: str, type_folder: str, day: datetime.date) -> str:
+        """
+        :return: Path of partition file, it is calculated once till day rollover
+        """
+        key = (figi, type_folder, day)
+
+        file_name = self.__file_paths.get(key)
+        if not file_name:
+            file_name = self.__file_paths[key] = self.__file_path(figi, type_folder, day)
+
+        return file_name
+
+    def flush(self) -> None:
+        with self.__lock:
+            self.__flush_all()
+
+    def close(self) -> None:
+        self.__stopped.set()
+        self.__flush_timer.join()
+
+        with self.__lock:
+            self.__flush_all()
+            self.__files.close()
+
+    def __flush_all(self) -> None:
+        for key in list(self.__buffers.keys()):
+            try:
+                self.__flush_buffer(key)
+            except Exception as ex:
+                logger.error(f"Error while flush market data to file: {repr(ex)}")
+
+        try:
+            self.__files.flush()
+        except Exception as ex:
+            logger.error(f"Error while flush market data to file: {repr(ex)}")
+
+    def __roll_day(self, day: datetime.date) -> None:
+        if self.__current_day:
+            logger.info(f"Day has been changed from {self.__current_day} to {day}. Flush and close files.")
+
+            self.__flush_all()
+            self.__files.close()
+            self.__file_paths.clear()
+
+        self.__current_day = day
+
+    def __flush_timer_worker(self) -> None:
+        check_interval_sec = min(1.0, self.__flush_interval_sec)
+
+        while not self.__stopped.wait(check_interval_sec):
+            with self.__lock:
+                now = time_module.monotonic()
+
+                for key, created in list(self.__buffers_created.items()):
+                    if now - created >= self.__flush_interval_sec:
+                        try:
+                            self.__flush_buffer(key)
+                        except Exception as ex:
+                            logger.error(f"Error while write market data to file: {repr(ex)}")
+
+    def __flush_buffer(self, key: tuple[str, str, datetime.date]) -> None:
+        rows = self.__buffers.get(key)
+
+        if rows:
+            file_name = self.file_path(*key)
+
+            logger.debug("Write to file: %s. Rows: %s", file_name, len(rows))
+
+            write_start = time_module.perf_counter()
+            written = self.__write(self.__files.get(file_name), rows)
+
+            STORAGE_WRITE_SECONDS.observe(time_module.perf_counter() - write_start, (self.__storage_name,))
+            STORAGE_BYTES_WRITTEN.inc((self.__storage_name,), written)
+
+        # Rows are removed after successful write only, they are written again after an error
+        self.__buffers.pop(key, None)
+        self.__buffers_created.pop(key, None)
@@ -0,0 +1,462 @@
+import asyncio
+import datetime
+import logging
+import os
+import pickle
+import queue
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from tinkoff.invest import MarketDataResponse
+
+from configuration.settings import StorageQueueSettings
+from data_storage.base_storage import IStorage
+from invest_api.market_data_record import MarketDataRecord
+from metrics.metrics_registry import REGISTRY, LATENCY_BUCKETS
+
+__all__ = ("QueuedStorage")
+
+logger = logging.getLogger(__name__)
+
+QUEUE_DEPTH = REGISTRY.gauge("storage_queue_depth", "Items in the storage queue")
+QUEUE_LAG_SECONDS = REGISTRY.gauge("storage_queue_lag_seconds", "Time in the queue of the last written item")
+QUEUE_DROPPED = REGISTRY.counter("storage_queue_dropped_total", "Items dropped by DROP_OLDEST policy")
+QUEUE_SPILLED = REGISTRY.counter("storage_queue_spilled_total", "Items written to spill file by SPILL policy")
+QUEUE_WRITE_SECONDS = REGISTRY.histogram(
+    "storage_queue_write_seconds", "Duration of save into wrapped storage in writer thread", LATENCY_BUCKETS
+)
+
+
+class _StorageQueue(queue.Queue):
+    """
+    Bounded queue, commands for writer thread are put over the bound and are never dropped
+    """
+    def put_over_bound(self, item: tuple) -> None:
+        with self.mutex:
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def wait_not_full(self, timeout: float) -> bool:
+        """
+        :return: False if the queue is still full after timeout
+        """
+        with self.not_full:
+            if self._qsize() >= self.maxsize:
+                self.not_full.wait(timeout)
+
+            return self._qsize() < self.maxsize
+
+    def drop_oldest(self, is_droppable) -> bool:
+        """
+        Removes the oldest item which is droppable.
+        :return: False if there is no droppable item
+        """
+        with self.mutex:
+            for index, item in enumerate(self.queue):
+                if is_droppable(item):
+                    del self.queue[index]
+                    self.unfinished_tasks -= 1
+                    self.not_full.notify()
+                    return True
+
+        return False
+
+
+class QueuedStorage(IStorage):
+    """
+    The class moves storage writes off the asyncio event loop.
+    Market data is put into bounded queue and background writer thread saves it into wrapped storage.
+
+    Overflow policies (if queue is full), the caller never waits in save methods:
+    - BLOCK: items are put over the bound, an async producer awaits wait_writable to stop reading (back-pressure).
+      The event loop isn't blocked: the wait for free space is done in a thread.
+    - DROP_OLDEST: the oldest item in the queue is dropped, flush and stop commands are never dropped
+    - SPILL: items are written to spill file and are replayed by writer thread after the queue has been drained.
+      Flush and stop commands are kept in memory while spilling and are done after the spill file has been replayed.
+      The spill file (and the file being replayed) of the previous run is replayed on startup.
+
+    An item is a single market data message or a batch of records (save_batch).
+    """
+    __BLOCK_POLICY = "BLOCK"
+    __DROP_OLDEST_POLICY = "DROP_OLDEST"
+    __SPILL_POLICY = "SPILL"
+
+    __SPILL_FILE_NAME = "storage_queue.spill"
+    __SPILL_REPLAY_FILE_NAME = "storage_queue.spill.replay"
+    __SPILL_LENGTH = struct.Struct("<I")
+
+    # Commands for writer thread. They are passing via the queue to keep order with market data.
+    __FLUSH_COMMAND = "FLUSH"
+    __STOP_COMMAND = "STOP"
+
+    __IDLE_TIMEOUT_SEC = 0.5
+    __STATS_LOG_INTERVAL_SEC = 60
+
+    def __init__(self, storage: IStorage, settings: StorageQueueSettings) -> None:
+        self.__storage = storage
+
+        self.__overflow_policy = settings.overflow_policy.upper()
+        if self.__overflow_policy not in (self.__BLOCK_POLICY, self.__DROP_OLDEST_POLICY, self.__SPILL_POLICY):
+            raise Exception(f"QueuedStorage: Unknown overflow policy: {settings.overflow_policy}")
+
+        self.__queue = _StorageQueue(maxsize=settings.max_size)
+
+        self.__spill_path = Path(settings.spill_path) if settings.spill_path else None
+        if self.__overflow_policy == self.__SPILL_POLICY:
+            if not self.__spill_path:
+                raise Exception(f"QueuedStorage: Spill path must be specified for {self.__SPILL_POLICY} policy")
+
+            self.__spill_path.mkdir(parents=True, exist_ok=True)
+
+        self.__spill_lock = threading.Lock()
+        self.__spill_file = None
+        # Commands put while spilling, they are done after the spill file has been replayed
+        self.__spill_commands: list[tuple] = []
+        self.__restore_spill()
+        self.__spill_count = self.__count_spill_items()
+        self.__spilling = self.__spill_count > 0
+
+        if self.__spilling:
+            logger.warning(f"Spill file from previous run has been found: {self.__spill_count} items. "
+                           f"They will be saved first")
+
+        self.__dropped_count = 0
+        self.__spilled_total = 0
+        self.__lag_sec = 0.0
+        self.__next_stats_log = time.monotonic() + self.__STATS_LOG_INTERVAL_SEC
+
+        QUEUE_DEPTH.set_function(lambda: self.queue_depth)
+        QUEUE_LAG_SECONDS.set_function(lambda: self.lag_sec)
+
+        self.__writer = threading.Thread(target=self.__writer_worker, name="storage-writer", daemon=True)
+        self.__writer.start()
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Count of items are waiting to be written (in memory and in spill file)
+        """
+        return self.__queue.qsize() + self.__spill_count
+
+    @property
+    def lag_sec(self) -> float:
+        """
+        Time between put and write of the last written item
+        """
+        return self.__lag_sec
+
+    @property
+    def dropped_count(self) -> int:
+        return self.__dropped_count
+
+    @property
+    def spilled_count(self) -> int:
+        return self.__spilled_total
+
+    def save(self, market_data: MarketDataResponse) -> None:
+        self.__put((time.monotonic(), market_data))
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.__put((time.monotonic(), record))
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        # A batch is one item of the queue
+        self.__put((time.monotonic(), records))
+
+    @property
+    def keeps_messages(self) -> bool:
+        return self.__storage.keeps_messages
+
+    def tail_records(self, day: datetime.date, max_records: int) -> list[MarketDataRecord]:
+        # It is called on startup, before market data is put into the queue
+        return self.__storage.tail_records(day, max_records)
+
+    async def wait_writable(self) -> None:
+        if self.__overflow_policy == self.__BLOCK_POLICY and self.__queue.full():
+            await asyncio.to_thread(self.__wait_not_full)
+
+    def __wait_not_full(self) -> None:
+        # The writer can be stopped by close while the queue is full
+        while not self.__queue.wait_not_full(self.__IDLE_TIMEOUT_SEC) and self.__writer.is_alive():
+            pass
+
+    def flush(self) -> None:
+        self.__put((time.monotonic(), self.__FLUSH_COMMAND))
+
+    def close(self) -> None:
+        logger.info(f"Stop storage writer. Queue depth is {self.queue_depth}")
+
+        self.__put((time.monotonic(), self.__STOP_COMMAND))
+        self.__writer.join()
+
+        self.__storage.close()
+
+    def __put(self, item: tuple) -> None:
+        match self.__overflow_policy:
+            case self.__BLOCK_POLICY:
+                # The bound is kept by producers (see wait_writable)
+                self.__queue.put_over_bound(item)
+
+            case self.__DROP_OLDEST_POLICY:
+                if self.__is_command(item):
+                    self.__queue.put_over_bound(item)
+                    return
+
+                while True:
+                    try:
+                        self.__queue.put_nowait(item)
+                        return
+                    except queue.Full:
+                        if not self.__drop_oldest():
+                            # The queue is full of commands
+                            self.__queue.put_over_bound(item)
+                            return
+
+            case self.__SPILL_POLICY:
+                with self.__spill_lock:
+                    if self.__is_command(item):
+                        # Commands are never written to spill file: a stop command of a crashed run
+                        # would stop replay of the next run
+                        if self.__spilling:
+                            self.__spill_commands.append(item)
+                        else:
+                            self.__queue.put_over_bound(item)
+                        return
+
+                    if not self.__spilling:
+                        try:
+                            self.__queue.put_nowait(item)
+                            return
+                        except queue.Full:
+                            logger.warning(f"Storage queue is full. Spill to disk is started")
+                            self.__spilling = True
+
+                    self.__spill(item)
+
+    @staticmethod
+    def __is_command(item: tuple) -> bool:
+        # market data is never a string
+        return type(item[1]) is str
+
+    def __drop_oldest(self) -> bool:
+        """
+        :return: False if there is no market data in the queue
+        """
+        if not self.__queue.drop_oldest(lambda item: not self.__is_command(item)):
+            return False
+
+        self.__dropped_count += 1
+        QUEUE_DROPPED.inc()
+        if self.__dropped_count == 1 or self.__dropped_count % 1000 == 0:
+            logger.warning(f"Storage queue is full. Dropped items: {self.__dropped_count}")
+
+        return True
+
+    def __spill(self, item: tuple) -> None:
+        if not self.__spill_file:
+            self.__spill_file = open(self.__spill_path.joinpath(self.__SPILL_FILE_NAME), "ab")
+
+        data = pickle.dumps(item, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__spill_file.write(self.__SPILL_LENGTH.pack(len(data)))
+        self.__spill_file.write(data)
+        # An item is a batch, it isn't kept in the file buffer to survive a crash of the process
+        self.__spill_file.flush()
+
+        self.__spill_count += 1
+        self.__spilled_total += 1
+        QUEUE_SPILLED.inc()
+
+    def __writer_worker(self) -> None:
+        logger.info(f"Storage writer has been started")
+
+        while True:
+            if self.__spilling and self.__queue.empty():
+                if not self.__replay_spill():
+                    break
+
+                continue
+
+            try:
+                item = self.__queue.get(timeout=self.__IDLE_TIMEOUT_SEC)
+            except queue.Empty:
+                self.__log_stats()
+                continue
+
+            try:
+                if not self.__process(item):
+                    break
+            finally:
+                self.__queue.task_done()
+
+        logger.info(f"Storage writer has been finished")
+
+    def __process(self, item: tuple, is_replayed: bool = False) -> bool:
+        """
+        :param is_replayed: The item is from spill file, its put time can be from the previous run
+        :return: False if writer has to be stopped
+        """
+        put_time, data = item
+
+        try:
+            if data == self.__STOP_COMMAND:
+                self.__storage.flush()
+                return False
+            elif data == self.__FLUSH_COMMAND:
+                self.__storage.flush()
+            else:
+                write_start = time.perf_counter()
+
+                data_type = type(data)
+
+                if data_type is list:
+                    self.__storage.save_batch(data)
+                elif data_type is MarketDataResponse:
+                    self.__storage.save(data)
+                else:
+                    self.__storage.save_record(data)
+
+                QUEUE_WRITE_SECONDS.observe(time.perf_counter() - write_start)
+        except Exception as ex:
+            logger.error(f"Storage writer error: {repr(ex)}")
+
+        if not is_replayed:
+            self.__lag_sec = time.monotonic() - put_time
+        self.__log_stats()
+
+        return True
+
+    def __replay_spill(self) -> bool:
+        """
+        Replays items from spill file into the storage.
+        Commands put while spilling are done after the spill file has been replayed.
+        :return: False if writer has to be stopped
+        """
+        with self.__spill_lock:
+            if self.__spill_count == 0:
+                logger.info(f"Spill file has been replayed. Spill to disk is finished")
+                self.__spilling = False
+                commands, self.__spill_commands = self.__spill_commands, []
+            else:
+                commands = None
+
+                if self.__spill_file:
+                    self.__spill_file.close()
+                    self.__spill_file = None
+
+                replay_file_name = self.__spill_path.joinpath(self.__SPILL_REPLAY_FILE_NAME)
+                os.replace(self.__spill_path.joinpath(self.__SPILL_FILE_NAME), replay_file_name)
+
+                replay_count = self.__spill_count
+                self.__spill_count = 0
+
+        if commands is not None:
+            # Items put after the end of spilling are in the queue, they are newer than the commands
+            is_running = True
+            for command in commands:
+                is_running = self.__process(command) and is_running
+
+            return is_running
+
+        logger.info(f"Replay spill file: {replay_count} items")
+
+        with open(replay_file_name, "rb") as file:
+            while item := self.__read_spill_item(file):
+                # Spill files of older versions can contain commands
+                if self.__is_command(item):
+                    logger.warning(f"Command in spill file is skipped: {item[1]}")
+                    continue
+
+                self.__process(item, is_replayed=True)
+
+        replay_file_name.unlink()
+
+        return True
+
+    def __restore_spill(self) -> None:
+        """
+        Items of the file being replayed by the previous run (it has been stopped or crashed) are older
+        than items of the spill file, they are moved to the start of spill file.
+        Items of the replay file which had been saved before crash are saved again.
+        """
+        if not self.__spill_path:
+            return
+
+        replay_file_name = self.__spill_path.joinpath(self.__SPILL_REPLAY_FILE_NAME)
+        if not replay_file_name.exists():
+            return
+
+        logger.warning(f"Spill replay file from previous run has been found: {replay_file_name}")
+
+        spill_file_name = self.__spill_path.joinpath(self.__SPILL_FILE_NAME)
+        if spill_file_name.exists():
+            self.__repair_spill_tail(replay_file_name)
+
+            with open(replay_file_name, "ab") as replay_file, open(spill_file_name, "rb") as spill_file:
+                while data := spill_file.read(1024 * 1024):
+                    replay_file.write(data)
+
+        os.replace(replay_file_name, spill_file_name)
+
+    def __count_spill_items(self) -> int:
+        spill_file_name = self.__spill_path.joinpath(self.__SPILL_FILE_NAME) if self.__spill_path else None
+        if not spill_file_name or not spill_file_name.exists():
+            return 0
+
+        # An item is written partially if the previous run has crashed while spilling
+        self.__repair_spill_tail(spill_file_name)
+
+        count = 0
+        with open(spill_file_name, "rb") as file:
+            while len(header := file.read(self.__SPILL_LENGTH.size)) == self.__SPILL_LENGTH.size:
+                (length,) = self.__SPILL_LENGTH.unpack(header)
+                file.seek(length, os.SEEK_CUR)
+                count += 1
+
+        return count
+
+    @staticmethod
+    def __repair_spill_tail(file_name: Path) -> None:
+        """
+        Cuts an incomplete item at the end of spill file
+        """
+        file_size = file_name.stat().st_size
+        offset = 0
+
+        with open(file_name, "rb") as file:
+            while len(header := file.read(QueuedStorage.__SPILL_LENGTH.size)) == QueuedStorage.__SPILL_LENGTH.size:
+                (length,) = QueuedStorage.__SPILL_LENGTH.unpack(header)
+
+                if offset + QueuedStorage.__SPILL_LENGTH.size + length > file_size:
+                    break
+
+                offset += QueuedStorage.__SPILL_LENGTH.size + length
+                file.seek(offset)
+
+        if offset < file_size:
+            logger.warning(f"Incomplete item has been removed from spill file: {file_name}. "
+                           f"Bytes: {file_size - offset}")
+
+            os.truncate(file_name, offset)
+
+    @staticmethod
+    def __read_spill_item(file) -> Optional[tuple]:
+        header = file.read(QueuedStorage.__SPILL_LENGTH.size)
+        if len(header) < QueuedStorage.__SPILL_LENGTH.size:
+            return None
+
+        (length,) = QueuedStorage.__SPILL_LENGTH.unpack(header)
+
+        return pickle.loads(file.read(length))
+
+    def __log_stats(self) -> None:
+        now = time.monotonic()
+
+        if now >= self.__next_stats_log:
+            self.__next_stats_log = now + self.__STATS_LOG_INTERVAL_SEC
+
+            logger.info(f"Storage queue stats: depth {self.queue_depth}, lag {self.__lag_sec:.3f} sec, "
+                        f"dropped {self.__dropped_count}, spilled {self.__spilled_total}")
@@ -0,0 +1,327 @@
+import datetime
+import logging
+import sqlite3
+import threading
+import time as time_module
+from pathlib import Path
+
+from tinkoff.invest import MarketDataResponse
+
+from configuration.settings import StorageSettings
+from data_storage.base_storage import IStorage, STORAGE_WRITE_SECONDS
+from invest_api.market_data_record import MarketDataRecord, CandleRecord, TradeRecord, PriceRecord, \
+    market_data_record, figi_by_id, format_time, ns_to_date
+
+__all__ = ("SQLiteDataStorage")
+
+logger = logging.getLogger(__name__)
+
+
+class _PartitionRows:
+    """
+    Rows of one database waiting for commit
+    """
+    __slots__ = ("candles", "trades", "last_prices")
+
+    def __init__(self) -> None:
+        self.candles: list[tuple] = []
+        self.trades: list[tuple] = []
+        self.last_prices: list[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.candles) + len(self.trades) + len(self.last_prices)
+
+
+class SQLiteDataStorage(IStorage):
+    """
+    Market data is written to SQLite database (one per day or per month) in WAL mode.
+    Rows are group-committed: one transaction per batch_size rows or per commit_interval_sec.
+    Age of rows is checked by background timer thread, so rows are committed without new market data as well.
+
+    Every record is written into the database of its own day or month. The database of the latest partition
+    is kept opened, a database of an older partition (e.g. backfilled candles, late rows after midnight)
+    is opened for commit only.
+
+    Tables: candle, trade, last_price. Every table has index on (figi, time).
+    Prices are int64 fixed point (units * 1e9 + nano), times are text as in csv files (UTC).
+    """
+    # label of storage metrics
+    __STORAGE_NAME = "SQLITE"
+
+    __FILE_NAME = "market_data.sqlite"
+
+    __DAY_PARTITION = "DAY"
+    __MONTH_PARTITION = "MONTH"
+
+    # Consts to read and parse dict with configuration
+    __ROOT_PATH_NAME = "root_path"
+    __PARTITION_NAME = "partition"
+    __COMMIT_INTERVAL_SEC_NAME = "commit_interval_sec"
+    __BATCH_SIZE_NAME = "batch_size"
+
+    __DEFAULT_COMMIT_INTERVAL_SEC = 1
+    __DEFAULT_BATCH_SIZE = 1000
+
+    __SCHEMA = """
+        CREATE TABLE IF NOT EXISTS candle (
+            figi TEXT NOT NULL,
+            time TEXT NOT NULL,
+            open INTEGER NOT NULL,
+            close INTEGER NOT NULL,
+            high INTEGER NOT NULL,
+            low INTEGER NOT NULL,
+            volume INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS candle_figi_time ON candle (figi, time);
+
+        CREATE TABLE IF NOT EXISTS trade (
+            figi TEXT NOT NULL,
+            time TEXT NOT NULL,
+            direction INTEGER NOT NULL,
+            price INTEGER NOT NULL,
+            quantity INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS trade_figi_time ON trade (figi, time);
+
+        CREATE TABLE IF NOT EXISTS last_price (
+            figi TEXT NOT NULL,
+            time TEXT NOT NULL,
+            price INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS last_price_figi_time ON last_price (figi, time);
+    """
+
+    __INSERT_CANDLE = "INSERT INTO candle (figi, time, open, close, high, low, volume) VALUES (?, ?, ?, ?, ?, ?, ?)"
+    __INSERT_TRADE = "INSERT INTO trade (figi, time, direction, price, quantity) VALUES (?, ?, ?, ?, ?)"
+    __INSERT_LAST_PRICE = "INSERT INTO last_price (figi, time, price) VALUES (?, ?, ?)"
+
+    def __init__(self, settings: StorageSettings) -> None:
+        self.__root_path = settings.settings.get(self.__ROOT_PATH_NAME, None)
+
+        if not self.__root_path:
+            logger.error(f"Storage init failed: root path is {self.__root_path}")
+
+            raise Exception(f"SQLiteDataStorage: All settings must be specified, but some of them is empty")
+
+        self.__partition = settings.settings.get(self.__PARTITION_NAME, self.__DAY_PARTITION).upper()
+        if self.__partition not in (self.__DAY_PARTITION, self.__MONTH_PARTITION):
+            raise Exception(f"SQLiteDataStorage: Unknown partition: {self.__partition}")
+
+        self.__commit_interval_sec = float(
+            settings.settings.get(self.__COMMIT_INTERVAL_SEC_NAME, self.__DEFAULT_COMMIT_INTERVAL_SEC)
+        )
+        self.__batch_size = int(settings.settings.get(self.__BATCH_SIZE_NAME, self.__DEFAULT_BATCH_SIZE))
+
+        # Connection of the latest partition
+        self.__connection: sqlite3.Connection = None
+        self.__current_partition: datetime.date = None
+
+        # partition -> rows waiting for commit
+        self.__rows: dict[datetime.date, _PartitionRows] = dict()
+        self.__pending_rows = 0
+
+        self.__last_commit = time_module.monotonic()
+
+        # Rows and connections are used by the storage and by the timer thread
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__commit_timer = threading.Thread(
+            target=self.__commit_timer_worker, name="sqlite-commit-timer", daemon=True
+        )
+        self.__commit_timer.start()
+
+    def save(self, market_data: MarketDataResponse) -> None:
+        try:
+            record = market_data_record(market_data)
+        except Exception as ex:
+            logger.error(f"Error while convert market data: {repr(ex)}")
+            return
+
+        if record:
+            self.save_record(record)
+        else:
+            logger.debug("Nothing to save")
+
+    def save_record(self, record: MarketDataRecord) -> None:
+        self.save_batch([record])
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        # An error of one record doesn't stop the batch, failed records are counted
+        lost, error = 0, None
+
+        with self.__lock:
+            for record in records:
+                try:
+                    record_type = type(record)
+                    rows = self.__partition_rows(record.time_ns)
+
+                    if record_type is CandleRecord:
+                        rows.candles.append(self.__candle_row(record))
+                    elif record_type is TradeRecord:
+                        rows.trades.append(self.__trade_row(record))
+                    else:
+                        rows.last_prices.append(self.__last_price_row(record))
+
+                    self.__pending_rows += 1
+
+                except Exception as ex:
+                    lost, error = lost + 1, ex
+
+            if lost:
+                logger.error(f"Error while write market data to database: {repr(error)}. "
+                             f"Lost records: {lost} of {len(records)}")
+
+            if self.__pending_rows >= self.__batch_size \
+                    or time_module.monotonic() - self.__last_commit >= self.__commit_interval_sec:
+                self.__commit_all()
+
+    def flush(self) -> None:
+        with self.__lock:
+            self.__commit_all()
+
+    def close(self) -> None:
+        self.__stopped.set()
+        self.__commit_timer.join()
+
+        with self.__lock:
+            self.__commit_all()
+            self.__close_connection()
+
+    @staticmethod
+    def __candle_row(candle: CandleRecord) -> tuple:
+        return (
+            figi_by_id(candle.figi_id),
+            format_time(candle.time_ns),
+            candle.open,
+            candle.close,
+            candle.high,
+            candle.low,
+            candle.volume
+        )
+
+    @staticmethod
+    def __trade_row(trade: TradeRecord) -> tuple:
+        return (
+            figi_by_id(trade.figi_id),
+            format_time(trade.time_ns),
+            trade.direction,
+            trade.price,
+            trade.quantity
+        )
+
+    @staticmethod
+    def __last_price_row(last_price: PriceRecord) -> tuple:
+        return (
+            figi_by_id(last_price.figi_id),
+            format_time(last_price.time_ns),
+            last_price.price
+        )
+
+    def __partition_rows(self, time_ns: int) -> _PartitionRows:
+        day = ns_to_date(time_ns)
+        partition = day if self.__partition == self.__DAY_PARTITION else day.replace(day=1)
+
+        rows = self.__rows.get(partition)
+        if rows is None:
+            if not self.__current_partition or self.__current_partition < partition:
+                if self.__current_partition:
+                    logger.info(f"Partition has been changed from {self.__current_partition} to {partition}")
+
+                self.__commit_all()
+                self.__close_connection()
+
+                self.__current_partition = partition
+
+            rows = self.__rows[partition] = _PartitionRows()
+
+        return rows
+
+    def __connect(self, partition: datetime.date) -> sqlite3.Connection:
+        """
+        Folder Structure is:
+        root_path
+            year
+                month
+                    day (for DAY partition only)
+                        {file_name}
+        """
+        directory = Path(self.__root_path, str(partition.year), str(partition.month))
+        if self.__partition == self.__DAY_PARTITION:
+            directory = directory.joinpath(str(partition.day))
+
+        directory.mkdir(parents=True, exist_ok=True)
+
+        database_name = directory.joinpath(self.__FILE_NAME)
+        logger.info(f"Open database: {database_name}")
+
+        # Connection is used by one thread at a time (see the lock), but by different threads
+        # (the caller, e.g. QueuedStorage writer, and the timer)
+        connection = sqlite3.connect(database_name, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(self.__SCHEMA)
+
+        return connection
+
+    def __close_connection(self) -> None:
+        if self.__connection:
+            self.__connection.close()
+
+            self.__connection = None
+
+    def __commit_timer_worker(self) -> None:
+        check_interval_sec = min(1.0, self.__commit_interval_sec)
+
+        while not self.__stopped.wait(check_interval_sec):
+            with self.__lock:
+                if self.__pending_rows and time_module.monotonic() - self.__last_commit >= self.__commit_interval_sec:
+                    self.__commit_all()
+
+    def __commit_all(self) -> None:
+        self.__last_commit = time_module.monotonic()
+
+        for partition, rows in self.__rows.items():
+            try:
+                if partition == self.__current_partition:
+                    if not self.__connection:
+                        self.__connection = self.__connect(partition)
+
+                    self.__commit(self.__connection, rows)
+                else:
+                    logger.info(f"Commit to database of older partition {partition}: {len(rows)} rows")
+
+                    connection = self.__connect(partition)
+                    try:
+                        self.__commit(connection, rows)
+                    finally:
+                        connection.close()
+
+            except Exception as ex:
+                logger.error(f"Error while commit market data to database: {repr(ex)}")
+
+        self.__rows.clear()
+        self.__pending_rows = 0
+
+    def __commit(self, connection: sqlite3.Connection, rows: _PartitionRows) -> None:
+        logger.debug("Commit to database: candles %s, trades %s, last prices %s",
+                     len(rows.candles), len(rows.trades), len(rows.last_prices))
+
+        write_start = time_module.perf_counter()
+
+        connection.execute("BEGIN")
+        try:
+            if rows.candles:
+                connection.executemany(self.__INSERT_CANDLE, rows.candles)
+            if rows.trades:
+                connection.executemany(self.__INSERT_TRADE, rows.trades)
+            if rows.last_prices:
+                connection.executemany(self.__INSERT_LAST_PRICE, rows.last_prices)
+
+            connection.execute("COMMIT")
+
+            STORAGE_WRITE_SECONDS.observe(time_module.perf_counter() - write_start, (self.__STORAGE_NAME,))
+        except Exception:
+            connection.execute("ROLLBACK")
+
+            logger.error(f"Transaction has been rolled back. Lost records: {len(rows)}")
+            raise
@@ -1,7 +1,10 @@
 from typing import Optional
 
 from data_storage.base_storage import IStorage
+from data_storage.files_columnar.columnar_data_storage import ColumnarDataStorage
 from data_storage.files_csv.csv_data_storage import CSVDataStorage
+from data_storage.journal.journal_data_storage import JournalDataStorage
+from data_storage.sqlite.sqlite_data_storage import SQLiteDataStorage
 
 __all__ = ("StorageFactory")
 
@@ -15,5 +18,11 @@ class StorageFactory:
         match storage_type:
             case "FILES_CSV":
                 return CSVDataStorage(*args, **kwargs)
+            case "FILES_COLUMNAR":
+                return ColumnarDataStorage(*args, **kwargs)
+            case "JOURNAL":
+                return JournalDataStorage(*args, **kwargs)
+            case "SQLITE":
+                return SQLiteDataStorage(*args, **kwargs)
             case _:
                 return None
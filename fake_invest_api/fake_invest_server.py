@@ -0,0 +1,451 @@
+"""
+Local stand-in of Tinkoff Invest API for soak, load and failover tests outside market hours.
+It serves MarketDataStream (market data stream), GetCandles and TradingSchedules.
+
+The SDK connects via TLS only, so the server needs a certificate, e.g. self-signed for localhost:
+openssl req -x509 -newkey rsa:2048 -nodes -days 365 -subj "/CN=localhost" -addext "subjectAltName=DNS:localhost" \
+    -keyout fake_api.key -out fake_api.crt
+
+Run from the project root:
+python -m fake_invest_api.fake_invest_server --port 8443 --cert-file fake_api.crt --key-file fake_api.key \
+    --rate 10000 --mean-fault-interval-sec 300
+
+The collector is pointed to the server by INVEST_API section: TARGET=localhost:8443, ROOT_CERTIFICATES=fake_api.crt
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import random
+import time
+from typing import AsyncIterator, Optional
+
+import grpc
+from tinkoff.invest.grpc import instruments_pb2, instruments_pb2_grpc, marketdata_pb2, marketdata_pb2_grpc
+
+from fake_invest_api.fake_market_data import FakeMarketData
+from fake_invest_api.fake_stream_scenario import FakeFault, FakeStreamPhase, FakeStreamScenario
+from invest_api.market_data_type import MarketDataType
+
+__all__ = ("FakeInvestServer")
+
+logger = logging.getLogger(__name__)
+
+
+class FakeStreamConnection:
+    """
+    Subscriptions of one market data stream and responses to subscription requests
+    """
+    def __init__(self, connection_id: int) -> None:
+        self.connection_id = connection_id
+
+        # (figi, data type) -> loop time of subscription, dict keeps subscription order
+        self.subscriptions: dict[tuple[str, MarketDataType], float] = dict()
+        self.responses: list[marketdata_pb2.MarketDataResponse] = []
+
+    def update(self, request: marketdata_pb2.MarketDataRequest, now: float) -> None:
+        if request.HasField("subscribe_candles_request"):
+            action = request.subscribe_candles_request.subscription_action
+            figies = self.__update(
+                [instrument.figi for instrument in request.subscribe_candles_request.instruments],
+                MarketDataType.CANDLE, action, now
+            )
+
+            self.responses.append(
+                marketdata_pb2.MarketDataResponse(
+                    subscribe_candles_response=marketdata_pb2.SubscribeCandlesResponse(
+                        tracking_id=self.__tracking_id(),
+                        candles_subscriptions=[
+                            marketdata_pb2.CandleSubscription(
+                                figi=figi,
+                                interval=marketdata_pb2.SUBSCRIPTION_INTERVAL_ONE_MINUTE,
+                                subscription_status=marketdata_pb2.SUBSCRIPTION_STATUS_SUCCESS
+                            )
+                            for figi in figies
+                        ]
+                    )
+                )
+            )
+
+        elif request.HasField("subscribe_trades_request"):
+            action = request.subscribe_trades_request.subscription_action
+            figies = self.__update(
+                [instrument.figi for instrument in request.subscribe_trades_request.instruments],
+                MarketDataType.TRADE, action, now
+            )
+
+            self.responses.append(
+                marketdata_pb2.MarketDataResponse(
+                    subscribe_trades_response=marketdata_pb2.SubscribeTradesResponse(
+                        tracking_id=self.__tracking_id(),
+                        trade_subscriptions=[
+                            marketdata_pb2.TradeSubscription(
+                                figi=figi,
+                                subscription_status=marketdata_pb2.SUBSCRIPTION_STATUS_SUCCESS
+                            )
+                            for figi in figies
+                        ]
+                    )
+                )
+            )
+
+        elif request.HasField("subscribe_last_price_request"):
+            action = request.subscribe_last_price_request.subscription_action
+            figies = self.__update(
+                [instrument.figi for instrument in request.subscribe_last_price_request.instruments],
+                MarketDataType.LAST_PRICE, action, now
+            )
+
+            self.responses.append(
+                marketdata_pb2.MarketDataResponse(
+                    subscribe_last_price_response=marketdata_pb2.SubscribeLastPriceResponse(
+                        tracking_id=self.__tracking_id(),
+                        last_price_subscriptions=[
+                            marketdata_pb2.LastPriceSubscription(
+                                figi=figi,
+                                subscription_status=marketdata_pb2.SUBSCRIPTION_STATUS_SUCCESS
+                            )
+                            for figi in figies
+                        ]
+                    )
+                )
+            )
+
+    def __update(self, figies: list[str], data_type: MarketDataType, action: int, now: float) -> list[str]:
+        for figi in figies:
+            if action == marketdata_pb2.SUBSCRIPTION_ACTION_UNSUBSCRIBE:
+                self.subscriptions.pop((figi, data_type), None)
+            else:
+                self.subscriptions[(figi, data_type)] = now
+
+        logger.info(f"Stream {self.connection_id}: subscription action {action} {data_type.value}: {figies}")
+
+        return figies
+
+    def __tracking_id(self) -> str:
+        return f"fake-{self.connection_id}-{time.monotonic_ns()}"
+
+
+class FakeMarketDataStreamServicer(marketdata_pb2_grpc.MarketDataStreamServiceServicer):
+    # Market data is sent by ticks, the rate is kept on average
+    __TICK_SEC = 0.01
+    __PING_INTERVAL_SEC = 5
+
+    def __init__(
+            self,
+            scenario: FakeStreamScenario,
+            market_data: FakeMarketData,
+            rate_per_sec: float,
+            seed: int
+    ) -> None:
+        self.__scenario = scenario
+        self.__market_data = market_data
+        self.__rate_per_sec = rate_per_sec
+        self.__random = random.Random(seed)
+
+        self.__start_time = time.monotonic()
+        self.__connections_count = 0
+        self.__sent_count = 0
+
+    @property
+    def sent_count(self) -> int:
+        return self.__sent_count
+
+    @property
+    def connections_count(self) -> int:
+        return self.__connections_count
+
+    async def MarketDataStream(
+            self,
+            request_iterator: AsyncIterator[marketdata_pb2.MarketDataRequest],
+            context: grpc.aio.ServicerContext
+    ) -> AsyncIterator[marketdata_pb2.MarketDataResponse]:
+        self.__connections_count += 1
+        connection = FakeStreamConnection(self.__connections_count)
+
+        logger.info(f"Stream {connection.connection_id} has been opened")
+
+        reader = asyncio.create_task(self.__read_requests(request_iterator, connection))
+
+        try:
+            last_tick = last_ping = time.monotonic()
+            budget = 0.0
+
+            while not reader.done():
+                now = time.monotonic()
+                phase, phase_start = self.__scenario.phase_at(now - self.__start_time)
+
+                match phase.fault:
+                    case FakeFault.DISCONNECT:
+                        logger.info(f"Stream {connection.connection_id}: disconnect")
+                        await context.abort(grpc.StatusCode.UNAVAILABLE, "Fake disconnect")
+                    case FakeFault.ERROR:
+                        logger.info(f"Stream {connection.connection_id}: error {phase.error_code}")
+                        await context.abort(grpc.StatusCode[phase.error_code], "Fake error")
+
+                while connection.responses:
+                    yield connection.responses.pop(0)
+
+                if phase.fault == FakeFault.HANG:
+                    # the rate budget isn't accumulated while the stream hangs
+                    last_tick = now
+                else:
+                    if now - last_ping >= self.__PING_INTERVAL_SEC:
+                        last_ping = now
+                        yield self.__market_data.ping(time.time())
+
+                    budget += (now - last_tick) * (phase.rate_per_sec or self.__rate_per_sec)
+                    last_tick = now
+
+                    subscriptions = self.__active_subscriptions(connection, phase, self.__start_time + phase_start)
+
+                    if subscriptions:
+                        wall_time = time.time()
+
+                        for _ in range(int(budget)):
+                            yield self.__next_market_data(self.__random.choice(subscriptions), wall_time)
+
+                        self.__sent_count += int(budget)
+
+                    budget -= int(budget)
+
+                await asyncio.sleep(self.__TICK_SEC)
+
+        finally:
+            reader.cancel()
+            logger.info(f"Stream {connection.connection_id} has been closed")
+
+    def __active_subscriptions(
+            self,
+            connection: FakeStreamConnection,
+            phase: FakeStreamPhase,
+            phase_start: float
+    ) -> list[tuple[str, MarketDataType]]:
+        subscriptions = list(connection.subscriptions.keys())
+
+        if phase.fault != FakeFault.MUTE:
+            return subscriptions
+
+        # muted subscriptions are alive again after resubscription
+        return [
+            subscription for index, subscription in enumerate(subscriptions)
+            if index >= phase.mute_count or connection.subscriptions[subscription] > phase_start
+        ]
+
+    def __next_market_data(
+            self,
+            subscription: tuple[str, MarketDataType],
+            now: float
+    ) -> marketdata_pb2.MarketDataResponse:
+        figi, data_type = subscription
+
+        match data_type:
+            case MarketDataType.CANDLE:
+                return self.__market_data.candle(figi, now)
+            case MarketDataType.TRADE:
+                return self.__market_data.trade(figi, now)
+            case _:
+                return self.__market_data.last_price(figi, now)
+
+    @staticmethod
+    async def __read_requests(
+            request_iterator: AsyncIterator[marketdata_pb2.MarketDataRequest],
+            connection: FakeStreamConnection
+    ) -> None:
+        async for request in request_iterator:
+            connection.update(request, time.monotonic())
+
+
+class FakeMarketDataServicer(marketdata_pb2_grpc.MarketDataServiceServicer):
+    def __init__(self, market_data: FakeMarketData, error_probability: float, seed: int) -> None:
+        self.__market_data = market_data
+        self.__error_probability = error_probability
+        self.__random = random.Random(seed)
+
+    async def GetCandles(
+            self,
+            request: marketdata_pb2.GetCandlesRequest,
+            context: grpc.aio.ServicerContext
+    ) -> marketdata_pb2.GetCandlesResponse:
+        if self.__random.random() < self.__error_probability:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Fake error")
+
+        return marketdata_pb2.GetCandlesResponse(
+            candles=self.__market_data.historic_candles(
+                request.figi,
+                getattr(request, "from").ToDatetime(tzinfo=datetime.timezone.utc),
+                request.to.ToDatetime(tzinfo=datetime.timezone.utc),
+                time.time()
+            )
+        )
+
+
+class FakeInstrumentsServicer(instruments_pb2_grpc.InstrumentsServiceServicer):
+    """
+    Every day is trading day, the trading session is [session_start, session_end] by UTC
+    """
+    def __init__(
+            self,
+            session_start: datetime.time,
+            session_end: datetime.time,
+            error_probability: float,
+            seed: int
+    ) -> None:
+        self.__session_start = session_start
+        self.__session_end = session_end
+        self.__error_probability = error_probability
+        self.__random = random.Random(seed)
+
+    async def TradingSchedules(
+            self,
+            request: instruments_pb2.TradingSchedulesRequest,
+            context: grpc.aio.ServicerContext
+    ) -> instruments_pb2.TradingSchedulesResponse:
+        if self.__random.random() < self.__error_probability:
+            await context.abort(grpc.StatusCode.UNAVAILABLE, "Fake error")
+
+        day = getattr(request, "from").ToDatetime(tzinfo=datetime.timezone.utc).date()
+        to_day = request.to.ToDatetime(tzinfo=datetime.timezone.utc).date()
+
+        days = []
+        while day <= to_day:
+            trading_day = instruments_pb2.TradingDay(is_trading_day=True)
+
+            trading_day.date.FromDatetime(datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc))
+            trading_day.start_time.FromDatetime(
+                datetime.datetime.combine(day, self.__session_start, datetime.timezone.utc)
+            )
+            trading_day.end_time.FromDatetime(
+                datetime.datetime.combine(day, self.__session_end, datetime.timezone.utc)
+            )
+
+            days.append(trading_day)
+            day += datetime.timedelta(days=1)
+
+        return instruments_pb2.TradingSchedulesResponse(
+            exchanges=[instruments_pb2.TradingSchedule(exchange=request.exchange or "MOEX", days=days)]
+        )
+
+
+class FakeInvestServer:
+    """
+    The class starts gRPC server with fake market data stream, market data and instruments services.
+    Use serve() to run the server until cancellation, or start() and stop() (e.g. in tests).
+    """
+    __STATS_INTERVAL_SEC = 10
+
+    def __init__(
+            self,
+            port: int,
+            cert_file: Optional[str],
+            key_file: Optional[str],
+            stream_servicer: FakeMarketDataStreamServicer,
+            market_data_servicer: FakeMarketDataServicer,
+            instruments_servicer: FakeInstrumentsServicer,
+            host: str = "[::]"
+    ) -> None:
+        # port 0 means any free port, start() returns it
+        self.__port = port
+        self.__host = host
+        self.__cert_file = cert_file
+        self.__key_file = key_file
+
+        self.__stream_servicer = stream_servicer
+        self.__market_data_servicer = market_data_servicer
+        self.__instruments_servicer = instruments_servicer
+
+        self.__server: Optional[grpc.aio.Server] = None
+
+    async def start(self) -> int:
+        """
+        :return: Port of the started server
+        """
+        server = grpc.aio.server()
+
+        marketdata_pb2_grpc.add_MarketDataStreamServiceServicer_to_server(self.__stream_servicer, server)
+        marketdata_pb2_grpc.add_MarketDataServiceServicer_to_server(self.__market_data_servicer, server)
+        instruments_pb2_grpc.add_InstrumentsServiceServicer_to_server(self.__instruments_servicer, server)
+
+        address = f"{self.__host}:{self.__port}"
+        if self.__cert_file and self.__key_file:
+            with open(self.__key_file, "rb") as key_file, open(self.__cert_file, "rb") as cert_file:
+                credentials = grpc.ssl_server_credentials([(key_file.read(), cert_file.read())])
+
+            port = server.add_secure_port(address, credentials)
+        else:
+            # It is useful for custom clients only, the SDK connects via TLS
+            logger.warning("Certificate hasn't been set, the server is insecure")
+            port = server.add_insecure_port(address)
+
+        await server.start()
+        self.__server = server
+
+        logger.info(f"Fake Invest API server has been started on port {port}")
+
+        return port
+
+    async def stop(self) -> None:
+        if self.__server:
+            await self.__server.stop(grace=None)
+            self.__server = None
+
+    async def serve(self) -> None:
+        await self.start()
+
+        try:
+            last_count = self.__stream_servicer.sent_count
+            while True:
+                await asyncio.sleep(self.__STATS_INTERVAL_SEC)
+
+                sent_count = self.__stream_servicer.sent_count
+                logger.info(f"Market data rate: {(sent_count - last_count) / self.__STATS_INTERVAL_SEC:.0f} msg/s")
+                last_count = sent_count
+        finally:
+            await self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Tinkoff Invest API server")
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--cert-file", help="PEM certificate, the SDK requires TLS")
+    parser.add_argument("--key-file", help="PEM private key")
+    parser.add_argument("--rate", type=float, default=1000, help="Messages per second of every stream")
+    parser.add_argument("--scenario", help="Json file with scripted stream phases")
+    parser.add_argument("--mean-fault-interval-sec", type=float, default=0,
+                        help="Randomized faults (hang, disconnect, error, mute) if the scenario isn't set")
+    parser.add_argument("--max-fault-sec", type=float, default=60, help="Max duration of random hang or mute")
+    parser.add_argument("--unary-error-probability", type=float, default=0,
+                        help="Probability of UNAVAILABLE error of GetCandles and TradingSchedules")
+    parser.add_argument("--session-start", default="00:00", help="Trading session start time (UTC), HH:MM")
+    parser.add_argument("--session-end", default="23:59", help="Trading session end time (UTC), HH:MM")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.scenario:
+        scenario = FakeStreamScenario.from_file(args.scenario)
+    else:
+        scenario = FakeStreamScenario.randomized(args.mean_fault_interval_sec, args.max_fault_sec, args.seed)
+
+    market_data = FakeMarketData(args.seed)
+
+    server = FakeInvestServer(
+        args.port,
+        args.cert_file,
+        args.key_file,
+        FakeMarketDataStreamServicer(scenario, market_data, args.rate, args.seed),
+        FakeMarketDataServicer(market_data, args.unary_error_probability, args.seed),
+        FakeInstrumentsServicer(
+            datetime.time.fromisoformat(args.session_start),
+            datetime.time.fromisoformat(args.session_end),
+            args.unary_error_probability,
+            args.seed
+        )
+    )
+
+    asyncio.run(server.serve())
+
+
+if __name__ == "__main__":
+    main()
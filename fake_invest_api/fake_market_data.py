@@ -0,0 +1,131 @@
+import datetime
+import random
+
+from google.protobuf.timestamp_pb2 import Timestamp
+from tinkoff.invest.grpc import common_pb2, marketdata_pb2
+
+__all__ = ("FakeMarketData")
+
+
+class FakeMarketData:
+    """
+    Random walk market data for the fake server.
+    Protobuf messages are made directly: conversion of SDK dataclasses is too slow for 10k+ messages per second.
+    """
+    __NANO = 1_000_000_000
+    __PRICE_STEP = 10_000_000
+
+    def __init__(self, seed: int) -> None:
+        self.__random = random.Random(seed)
+
+        # figi -> price in nano
+        self.__prices: dict[str, int] = dict()
+        # figi -> (minute start in sec, open, high, low, volume) of the current candle
+        self.__candles: dict[str, tuple[int, int, int, int, int]] = dict()
+
+    def candle(self, figi: str, now: float) -> marketdata_pb2.MarketDataResponse:
+        price = self.__next_price(figi)
+        minute = int(now) // 60 * 60
+
+        candle_minute, open_price, high, low, volume = self.__candles.get(figi, (0, 0, 0, 0, 0))
+        if candle_minute != minute:
+            open_price, high, low, volume = price, price, price, 0
+
+        high, low, volume = max(high, price), min(low, price), volume + self.__random.randint(1, 100)
+        self.__candles[figi] = (minute, open_price, high, low, volume)
+
+        return marketdata_pb2.MarketDataResponse(
+            candle=marketdata_pb2.Candle(
+                figi=figi,
+                interval=marketdata_pb2.SUBSCRIPTION_INTERVAL_ONE_MINUTE,
+                open=self.__quotation(open_price),
+                high=self.__quotation(high),
+                low=self.__quotation(low),
+                close=self.__quotation(price),
+                volume=volume,
+                time=Timestamp(seconds=minute),
+                last_trade_ts=self.__timestamp(now)
+            )
+        )
+
+    def trade(self, figi: str, now: float) -> marketdata_pb2.MarketDataResponse:
+        return marketdata_pb2.MarketDataResponse(
+            trade=marketdata_pb2.Trade(
+                figi=figi,
+                direction=self.__random.choice(
+                    (marketdata_pb2.TRADE_DIRECTION_BUY, marketdata_pb2.TRADE_DIRECTION_SELL)
+                ),
+                price=self.__quotation(self.__next_price(figi)),
+                quantity=self.__random.randint(1, 100),
+                time=self.__timestamp(now)
+            )
+        )
+
+    def last_price(self, figi: str, now: float) -> marketdata_pb2.MarketDataResponse:
+        return marketdata_pb2.MarketDataResponse(
+            last_price=marketdata_pb2.LastPrice(
+                figi=figi,
+                price=self.__quotation(self.__next_price(figi)),
+                time=self.__timestamp(now)
+            )
+        )
+
+    def ping(self, now: float) -> marketdata_pb2.MarketDataResponse:
+        return marketdata_pb2.MarketDataResponse(ping=marketdata_pb2.Ping(time=self.__timestamp(now)))
+
+    def historic_candles(
+            self,
+            figi: str,
+            _from: datetime.datetime,
+            _to: datetime.datetime,
+            now: float
+    ) -> list[marketdata_pb2.HistoricCandle]:
+        """
+        One minute candles in [_from, _to), the current minute candle is not completed.
+        Prices are deterministic by figi and minute: the same candles are returned by repeated requests.
+        """
+        candles = []
+
+        current_minute = int(now) // 60 * 60
+        minute = (int(_from.timestamp()) + 59) // 60 * 60
+        to_sec = min(int(_to.timestamp()), current_minute + 1)
+
+        while minute < to_sec:
+            minute_random = random.Random(f"{figi}{minute}")
+            open_price = minute_random.randint(1000, 5000) * self.__PRICE_STEP
+            close = open_price + minute_random.randint(-5, 5) * self.__PRICE_STEP
+
+            candles.append(
+                marketdata_pb2.HistoricCandle(
+                    open=self.__quotation(open_price),
+                    high=self.__quotation(max(open_price, close) + self.__PRICE_STEP),
+                    low=self.__quotation(min(open_price, close) - self.__PRICE_STEP),
+                    close=self.__quotation(close),
+                    volume=minute_random.randint(1, 10000),
+                    time=Timestamp(seconds=minute),
+                    is_complete=minute < current_minute
+                )
+            )
+
+            minute += 60
+
+        return candles
+
+    def __next_price(self, figi: str) -> int:
+        price = self.__prices.get(figi)
+        if price is None:
+            price = self.__random.randint(1000, 5000) * self.__PRICE_STEP
+
+        price = self.__prices[figi] = max(self.__PRICE_STEP, price + self.__random.randint(-3, 3) * self.__PRICE_STEP)
+
+        return price
+
+    @staticmethod
+    def __quotation(price: int) -> common_pb2.Quotation:
+        return common_pb2.Quotation(units=price // FakeMarketData.__NANO, nano=price % FakeMarketData.__NANO)
+
+    @staticmethod
+    def __timestamp(now: float) -> Timestamp:
+        seconds = int(now)
+
+        return Timestamp(seconds=seconds, nanos=int((now - seconds) * FakeMarketData.__NANO))
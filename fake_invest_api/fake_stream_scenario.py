@@ -0,0 +1,129 @@
+import json
+import random
+from dataclasses import dataclass
+from enum import Enum
+
+__all__ = ("FakeFault", "FakeStreamPhase", "FakeStreamScenario")
+
+
+class FakeFault(Enum):
+    # Normal market data stream
+    NONE = "none"
+    # Streams are opened, but nothing is sent (no market data and pings)
+    HANG = "hang"
+    # Streams are aborted with UNAVAILABLE, new streams are aborted immediately
+    DISCONNECT = "disconnect"
+    # Streams are aborted with error_code, new streams are aborted immediately
+    ERROR = "error"
+    # First mute_count subscriptions of every stream are silent until they are resubscribed
+    MUTE = "mute"
+
+
+@dataclass(eq=False, repr=True)
+class FakeStreamPhase:
+    duration_sec: float
+    fault: FakeFault = FakeFault.NONE
+    # Messages per second of every stream, 0 means the server default rate
+    rate_per_sec: float = 0
+    # gRPC status code name for ERROR fault
+    error_code: str = "INTERNAL"
+    mute_count: int = 1
+
+
+class FakeStreamScenario:
+    """
+    Timeline of stream phases from the server start. All streams follow the same timeline.
+    The timeline is scripted (optionally looped) or randomized (faults appear by Poisson process).
+    After the end of not looped script, market data is streamed without faults.
+    """
+    __RANDOM_FAULTS = (FakeFault.HANG, FakeFault.DISCONNECT, FakeFault.ERROR, FakeFault.MUTE)
+    __RANDOM_ERROR_CODES = ("UNAVAILABLE", "INTERNAL", "RESOURCE_EXHAUSTED", "UNKNOWN")
+
+    def __init__(
+            self,
+            phases: list[FakeStreamPhase],
+            loop: bool = False,
+            mean_fault_interval_sec: float = 0,
+            max_fault_sec: float = 60,
+            seed: int = 42
+    ) -> None:
+        self.__phases = phases
+        self.__loop = loop and sum(phase.duration_sec for phase in phases) > 0
+
+        self.__mean_fault_interval_sec = mean_fault_interval_sec
+        self.__max_fault_sec = max_fault_sec
+        self.__random = random.Random(seed)
+
+        # (start offset, phase) of the timeline, it is extended lazily by randomized scenario
+        self.__timeline: list[tuple[float, FakeStreamPhase]] = []
+        self.__timeline_end = 0.0
+        for phase in phases:
+            self.__append(phase)
+
+    @staticmethod
+    def from_file(file_name: str) -> "FakeStreamScenario":
+        """
+        Json file: {"loop": true, "phases": [{"duration_sec": 60, "rate_per_sec": 10000},
+        {"duration_sec": 40, "fault": "hang"}, {"duration_sec": 1, "fault": "error", "error_code": "INTERNAL"}]}
+        """
+        with open(file_name, "r", encoding="UTF8") as file:
+            script = json.load(file)
+
+        phases = [
+            FakeStreamPhase(
+                duration_sec=float(phase["duration_sec"]),
+                fault=FakeFault(phase.get("fault", FakeFault.NONE.value)),
+                rate_per_sec=float(phase.get("rate_per_sec", 0)),
+                error_code=phase.get("error_code", "INTERNAL"),
+                mute_count=int(phase.get("mute_count", 1))
+            )
+            for phase in script["phases"]
+        ]
+
+        return FakeStreamScenario(phases, loop=bool(script.get("loop", False)))
+
+    @staticmethod
+    def randomized(mean_fault_interval_sec: float, max_fault_sec: float, seed: int) -> "FakeStreamScenario":
+        return FakeStreamScenario([], False, mean_fault_interval_sec, max_fault_sec, seed)
+
+    def phase_at(self, offset: float) -> tuple[FakeStreamPhase, float]:
+        """
+        :param offset: Seconds from the server start
+        :return: Current phase and its start offset
+        """
+        if self.__loop:
+            cycles, offset = divmod(offset, self.__timeline_end)
+            cycle_start = cycles * self.__timeline_end
+        else:
+            cycle_start = 0.0
+
+        while self.__mean_fault_interval_sec > 0 and offset >= self.__timeline_end:
+            self.__append_random()
+
+        for start, phase in reversed(self.__timeline):
+            if start <= offset < start + phase.duration_sec:
+                return phase, cycle_start + start
+
+        return FakeStreamPhase(duration_sec=0), self.__timeline_end
+
+    def __append(self, phase: FakeStreamPhase) -> None:
+        self.__timeline.append((self.__timeline_end, phase))
+        self.__timeline_end += phase.duration_sec
+
+    def __append_random(self) -> None:
+        self.__append(FakeStreamPhase(duration_sec=self.__random.expovariate(1 / self.__mean_fault_interval_sec)))
+
+        fault = self.__random.choice(self.__RANDOM_FAULTS)
+        self.__append(
+            FakeStreamPhase(
+                # disconnects and errors are short: streams are reconnected after them
+                duration_sec=self.__random.uniform(1, self.__max_fault_sec)
+                if fault in (FakeFault.HANG, FakeFault.MUTE) else 1,
+                fault=fault,
+                error_code=self.__random.choice(self.__RANDOM_ERROR_CODES)
+            )
+        )
+
+        # the timeline is kept short, old phases are never requested again
+        if len(self.__timeline) > 1000:
+            self.__timeline = self.__timeline[-100:]
@@ -0,0 +1,111 @@
+import logging
+from decimal import Decimal
+from typing import Callable
+
+from tinkoff.invest import Quotation
+from tinkoff.invest.utils import quotation_to_decimal
+
+__all__ = (
+    "PRICE_SCALE", "quotation_to_nanos", "nanos_to_quotation", "nanos_to_decimal",
+    "format_price", "format_quotation", "parse_price"
+)
+
+logger = logging.getLogger(__name__)
+
+# Prices are kept as int fixed point: units * PRICE_SCALE + nano (int64 nanos)
+PRICE_SCALE = 1_000_000_000
+
+# str(quotation_to_decimal) has 8 fraction digits if nano is multiple of 10, otherwise 9 digits.
+# Absolute values below the limit are written in scientific notation by Decimal (e.g. 1E-9, 0E-8).
+_SCIENTIFIC_LIMIT = 1000
+
+# Text of fraction part by nano. Prices have a few distinct fractions (by price step), the cache is bounded anyway.
+_FRACTIONS: dict[int, str] = dict()
+_FRACTIONS_MAX_SIZE = 100_000
+
+
+def quotation_to_nanos(quotation: Quotation) -> int:
+    return quotation.units * PRICE_SCALE + quotation.nano
+
+
+def nanos_to_quotation(nanos: int) -> Quotation:
+    units, nano = divmod(abs(nanos), PRICE_SCALE)
+
+    return Quotation(units=-units, nano=-nano) if nanos < 0 else Quotation(units=units, nano=nano)
+
+
+def nanos_to_decimal(nanos: int) -> Decimal:
+    """
+    Decimal is built on request only (readers, analysis), it is never used on the hot path
+    """
+    return quotation_to_decimal(nanos_to_quotation(nanos))
+
+
+def _format_price(nanos: int) -> str:
+    if nanos >= _SCIENTIFIC_LIMIT:
+        units, fraction = divmod(nanos, PRICE_SCALE)
+
+        text = _FRACTIONS.get(fraction)
+        if text is None:
+            # leading "1" keeps zeros of the fraction
+            text = str(PRICE_SCALE + fraction)[1:] if fraction % 10 else str(PRICE_SCALE + fraction)[1:9]
+
+            if len(_FRACTIONS) < _FRACTIONS_MAX_SIZE:
+                _FRACTIONS[fraction] = text
+
+        return f"{units}.{text}"
+
+    if nanos <= -_SCIENTIFIC_LIMIT:
+        return "-" + _format_price(-nanos)
+
+    return str(quotation_to_decimal(nanos_to_quotation(nanos)))
+
+
+def _format_quotation(quotation: Quotation) -> str:
+    return _format_price(quotation.units * PRICE_SCALE + quotation.nano)
+
+
+def _format_price_by_decimal(nanos: int) -> str:
+    return str(quotation_to_decimal(nanos_to_quotation(nanos)))
+
+
+def _format_quotation_by_decimal(quotation: Quotation) -> str:
+    return str(quotation_to_decimal(quotation))
+
+
+def _select_format_price() -> tuple[Callable[[int], str], Callable[[Quotation], str]]:
+    """
+    The fast formatting has to be byte-identical with str(quotation_to_decimal) of the installed SDK.
+    It is checked once, Decimal formatting is used if the SDK formats prices another way.
+    """
+    samples = (
+        (0, 0), (0, 1), (0, 10), (0, 999), (0, 1000), (0, 5000), (0, 500000000), (0, 123456789), (1, 0), (12, 10000000),
+        (3, 1), (123, 450000000), (250, 999999999), (-5, 0), (-1, -500000000), (0, -5000), (0, -1)
+    )
+
+    for units, nano in samples:
+        nanos = units * PRICE_SCALE + nano
+        if _format_price(nanos) != str(quotation_to_decimal(Quotation(units=units, nano=nano))):
+            logger.warning("Fixed point price formatting doesn't match the SDK, Decimal formatting is used")
+            return _format_price_by_decimal, _format_quotation_by_decimal
+
+    return _format_price, _format_quotation
+
+
+# format_price(nanos) and format_quotation(quotation) return the same text as str(quotation_to_decimal(quotation))
+format_price, format_quotation = _select_format_price()
+
+
+def parse_price(text: str) -> int:
+    """
+    :return: Nanos of price written by format_price (or str of any Decimal)
+    """
+    if "E" in text or "e" in text:
+        return int(Decimal(text).scaleb(9))
+
+    if text.startswith("-"):
+        return -parse_price(text[1:])
+
+    units, _, fraction = text.partition(".")
+
+    return int(units) * PRICE_SCALE + (int(fraction[:9].ljust(9, "0")) if fraction else 0)
@@ -1,49 +1,206 @@
+import asyncio
+import contextlib
+import functools
+import inspect
 import logging
+import random
+import time
+from typing import Optional
 
+from grpc import StatusCode
 from grpc.aio import AioRpcError
 from tinkoff.invest import InvestError, RequestError, AioRequestError
 
 logger = logging.getLogger(__name__)
 
+# Errors of API requests and of the transport: gRPC errors, connection errors and timeouts
+TRANSPORT_ERRORS = (RequestError, AioRpcError, AioRequestError, OSError)
 
-# Decorator extends logging for Tinkoff api request if it has been failed
+# Transient failures: the same request (or stream with the same subscriptions) can succeed after reconnect.
+# Other codes (e.g. UNAUTHENTICATED, PERMISSION_DENIED, INVALID_ARGUMENT) are fatal and aren't retried.
+RETRYABLE_STATUS_CODES = frozenset({
+    StatusCode.UNAVAILABLE,
+    StatusCode.DEADLINE_EXCEEDED,
+    StatusCode.RESOURCE_EXHAUSTED,
+    StatusCode.ABORTED,
+    StatusCode.INTERNAL,
+    StatusCode.UNKNOWN,
+    StatusCode.CANCELLED
+})
+
+
+def is_retryable(ex: Exception) -> bool:
+    if isinstance(ex, AioRpcError):
+        code = ex.code()
+    elif isinstance(ex, (RequestError, AioRequestError)):
+        code = ex.code
+    else:
+        # connection errors and timeouts (OSError) are transient, other errors are bugs
+        return isinstance(ex, OSError)
+
+    return code in RETRYABLE_STATUS_CODES
+
+
+def backoff_delay(attempt: int, first_delay_sec: float, base_delay_sec: float, max_delay_sec: float) -> float:
+    """
+    Delay before retry by number of failed attempt (from 1): the first retry is fast, next delays are doubled.
+    Jitter spreads retries of many requests (streams) after a common failure.
+    """
+    if attempt <= 1:
+        return random.uniform(0, min(first_delay_sec, max_delay_sec))
+
+    delay = min(max_delay_sec, base_delay_sec * 2 ** (attempt - 2))
+
+    return random.uniform(delay / 2, delay)
+
+
+def _log_invest_error(ex: Exception) -> None:
+    if isinstance(ex, RequestError):
+        tracking_id = ex.metadata.tracking_id if ex.metadata else ""
+        logger.error("RequestError tracking_id=%s code=%s repr=%s details=%s",
+                     tracking_id, str(ex.code), repr(ex), ex.details)
+    elif isinstance(ex, AioRequestError):
+        # tracking_id = ex.metadata.tracking_id if ex.metadata else ""
+        logger.error("AioRequestError code=%s repr=%s details=%s",
+                     str(ex.code), repr(ex), ex.details)
+    elif isinstance(ex, AioRpcError):
+        logger.error("AioRpcError code=%s details=%s", str(ex.code()), ex.details())
+    else:
+        logger.error("InvestError repr=%s", repr(ex))
+
+
+# Decorator extends logging for Tinkoff api request if it has been failed.
+# Functions, coroutines and async generators (errors while iteration) are supported.
 def invest_error_logging(func):
+    errors = (RequestError, AioRequestError, AioRpcError, InvestError)
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        async def log_async_gen_wrapper(*args, **kwargs):
+            try:
+                async with contextlib.aclosing(func(*args, **kwargs)) as generator:
+                    async for item in generator:
+                        yield item
+            except errors as ex:
+                _log_invest_error(ex)
+                raise
+
+        return log_async_gen_wrapper
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def log_async_wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except errors as ex:
+                _log_invest_error(ex)
+                raise
+
+        return log_async_wrapper
+
+    @functools.wraps(func)
     def log_wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except RequestError as ex:
-            tracking_id = ex.metadata.tracking_id if ex.metadata else ""
-            logger.error("RequestError tracking_id=%s code=%s repr=%s details=%s",
-                         tracking_id, str(ex.code), repr(ex), ex.details)
-            raise
-        except AioRequestError as ex:
-            # tracking_id = ex.metadata.tracking_id if ex.metadata else ""
-            logger.error("AioRequestError code=%s repr=%s details=%s",
-                         str(ex.code), repr(ex), ex.details)
-            raise
-        except InvestError as ex:
-            logger.error("InvestError repr=%s", repr(ex))
+        except errors as ex:
+            _log_invest_error(ex)
             raise
 
     return log_wrapper
 
 
-# Decorator retries api requests for some kind of exceptions
-def invest_api_retry(retry_count: int = 3, exceptions: tuple = (RequestError, AioRpcError, AioRequestError)):
+# Decorator retries api requests for some kind of exceptions with exponential backoff.
+# Functions, coroutines and async generators are supported. An async generator is called again with the same
+# arguments after error (e.g. the stream is opened again with the same subscriptions), count of attempts is reset
+# if the generator has been yielding items longer than max_delay_sec before the error.
+# retry_count: max count of calls in a row, None - retry while errors are retryable
+def invest_api_retry(
+        retry_count: Optional[int] = 3,
+        exceptions: tuple = TRANSPORT_ERRORS,
+        first_delay_sec: float = 0.1,
+        base_delay_sec: float = 0.5,
+        max_delay_sec: float = 10.0
+):
+    def retry_delay(ex: Exception, failures: int) -> Optional[float]:
+        """
+        :return: Delay before retry, None if the error mustn't be retried
+        """
+        if not is_retryable(ex) or (retry_count is not None and failures >= retry_count):
+            return None
+
+        delay = backoff_delay(failures, first_delay_sec, base_delay_sec, max_delay_sec)
+        logger.error(f"Retry exception attempt: {failures}, delay: {delay:.3f} sec, error: {repr(ex)}")
+
+        return delay
+
     def errors_retry(func):
 
-        def errors_wrapper(*args, **kwargs):
-            attempts = 0
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_gen_errors_wrapper(*args, **kwargs):
+                failures = 0
+
+                while True:
+                    # monotonic time of the first item of the current call
+                    first_item_time = None
+
+                    try:
+                        async with contextlib.aclosing(func(*args, **kwargs)) as generator:
+                            async for item in generator:
+                                if first_item_time is None:
+                                    first_item_time = time.monotonic()
+
+                                yield item
+
+                        return
+                    except exceptions as ex:
+                        if first_item_time is not None and time.monotonic() - first_item_time > max_delay_sec:
+                            failures = 0
+
+                        failures += 1
+
+                        delay = retry_delay(ex, failures)
+                        if delay is None:
+                            raise
+
+                    await asyncio.sleep(delay)
 
-            while attempts < retry_count - 1:
-                attempts += 1
+            return async_gen_errors_wrapper
 
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_errors_wrapper(*args, **kwargs):
+                failures = 0
+
+                while True:
+                    try:
+                        return await func(*args, **kwargs)
+                    except exceptions as ex:
+                        failures += 1
+
+                        delay = retry_delay(ex, failures)
+                        if delay is None:
+                            raise
+
+                    await asyncio.sleep(delay)
+
+            return async_errors_wrapper
+
+        @functools.wraps(func)
+        def errors_wrapper(*args, **kwargs):
+            failures = 0
+
+            while True:
                 try:
                     return func(*args, **kwargs)
-                except exceptions:
-                    logger.error(f"Retry exception attempt: {attempts}")
+                except exceptions as ex:
+                    failures += 1
 
-            return func(*args, **kwargs)
+                    delay = retry_delay(ex, failures)
+                    if delay is None:
+                        raise
+
+                time.sleep(delay)
 
         return errors_wrapper
 
@@ -0,0 +1,56 @@
+import datetime
+
+from tinkoff.invest import MarketDataResponse, Quotation, Trade, TradeDirection
+from tinkoff.invest.grpc import marketdata_pb2
+
+try:
+    # The SDK has no public API to convert its dataclasses to protobuf messages and back
+    from tinkoff.invest._grpc_helpers import dataclass_to_protobuf, protobuf_to_dataclass
+except ImportError as import_error:
+    raise ImportError(
+        f"Installed tinkoff-investments doesn't provide protobuf conversion of dataclasses: {import_error}"
+    ) from import_error
+
+__all__ = ("serialize_market_data", "parse_market_data")
+
+
+def serialize_market_data(market_data: MarketDataResponse) -> bytes:
+    """
+    :return: Serialized protobuf MarketDataResponse (the wire format of the API), it doesn't depend on the SDK
+    """
+    return dataclass_to_protobuf(market_data, marketdata_pb2.MarketDataResponse()).SerializeToString()
+
+
+def parse_market_data(payload: bytes) -> MarketDataResponse:
+    message = marketdata_pb2.MarketDataResponse()
+    message.ParseFromString(payload)
+
+    return protobuf_to_dataclass(message, MarketDataResponse)
+
+
+def _check_compatibility() -> None:
+    """
+    The helpers are private in the SDK: they are checked by a round trip of a sample message once on import,
+    so an incompatible SDK version fails on start instead of writing broken data
+    """
+    sample = MarketDataResponse(
+        trade=Trade(
+            figi="BBG004730N88",
+            direction=TradeDirection.TRADE_DIRECTION_BUY,
+            price=Quotation(units=100, nano=500_000_000),
+            quantity=10,
+            time=datetime.datetime(2022, 11, 2, 10, 0, 1, 123456, tzinfo=datetime.timezone.utc)
+        )
+    )
+
+    try:
+        restored = parse_market_data(serialize_market_data(sample))
+    except Exception as ex:
+        raise ImportError(f"Installed tinkoff-investments is incompatible with journal format: {repr(ex)}") from ex
+
+    if restored.trade != sample.trade:
+        raise ImportError(f"Installed tinkoff-investments is incompatible with journal format: "
+                          f"{sample.trade} is restored as {restored.trade}")
+
+
+_check_compatibility()
@@ -0,0 +1,243 @@
+import datetime
+import functools
+import threading
+from typing import Optional, Union
+
+from tinkoff.invest import MarketDataResponse, Candle, Trade, LastPrice, SubscriptionInterval, TradeDirection
+
+from invest_api.fixed_point_price import quotation_to_nanos, nanos_to_quotation
+from invest_api.market_data_type import MarketDataType
+
+__all__ = (
+    "CandleRecord", "TradeRecord", "PriceRecord", "MarketDataRecord",
+    "figi_id", "figi_by_id", "market_data_record", "record_to_market_data",
+    "datetime_to_ns", "ns_to_datetime", "format_time", "ns_to_date"
+)
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+_NS_IN_SECOND = 1_000_000_000
+
+# Figi intern table: figi -> id and id -> figi. Ids are valid for the process lifetime only, they are never persisted.
+_FIGI_IDS: dict[str, int] = dict()
+_FIGIES: list[str] = []
+_FIGI_IDS_LOCK = threading.Lock()
+
+# Count of cached formatted seconds. Market data times are close to each other, so a few seconds are formatted
+# per message burst. Least recently used seconds are evicted (e.g. a long replay).
+_SECONDS_CACHE_SIZE = 4096
+
+
+def figi_id(figi: str) -> int:
+    id_ = _FIGI_IDS.get(figi)
+
+    if id_ is None:
+        # storages may convert messages in own writer thread (QueuedStorage)
+        with _FIGI_IDS_LOCK:
+            id_ = _FIGI_IDS.get(figi)
+
+            if id_ is None:
+                _FIGIES.append(figi)
+                id_ = _FIGI_IDS[figi] = len(_FIGIES) - 1
+
+    return id_
+
+
+def figi_by_id(id_: int) -> str:
+    return _FIGIES[id_]
+
+
+class _Record:
+    """
+    Records are slotted: figi_id is the first slot of every record type.
+    Optional slots are set for records of the stream only:
+    - market_data is the original message of the stream, it is set only if the storage keeps messages as is
+      (see IStorage.keeps_messages)
+    - receive_time_ns is the time (ns since epoch) when the message has been received on the event loop,
+      storages behind a queue write it instead of their write time
+    """
+    __slots__ = ("market_data", "receive_time_ns")
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)}" for name in self.__slots__[1:])
+
+        return f"{type(self).__name__}(figi={figi_by_id(self.figi_id)}, {values})"
+
+    def __reduce__(self) -> tuple:
+        # Figi ids are valid in the process only, so figi is pickled (e.g. spill file of QueuedStorage)
+        values = tuple(getattr(self, name) for name in self.__slots__[1:])
+        optional = {
+            name: value for name in _Record.__slots__ if (value := getattr(self, name, None)) is not None
+        }
+
+        if not optional:
+            return _unpickle_record, (type(self), figi_by_id(self.figi_id), *values)
+
+        return _unpickle_record, (type(self), figi_by_id(self.figi_id), *values), (None, optional)
+
+
+def _unpickle_record(record_type: type, figi: str, *values: int) -> "MarketDataRecord":
+    return record_type(figi_id(figi), *values)
+
+
+class CandleRecord(_Record):
+    """
+    One minute candle. Prices are int fixed point nanos (see fixed_point_price), time is int ns since epoch (UTC).
+    """
+    __slots__ = ("figi_id", "time_ns", "open", "close", "high", "low", "volume")
+
+    DATA_TYPE = MarketDataType.CANDLE
+
+    def __init__(self, figi_id: int, time_ns: int, open: int, close: int, high: int, low: int, volume: int) -> None:
+        self.figi_id = figi_id
+        self.time_ns = time_ns
+        self.open = open
+        self.close = close
+        self.high = high
+        self.low = low
+        self.volume = volume
+
+
+class TradeRecord(_Record):
+    """
+    Trade. Direction is int value of TradeDirection.
+    """
+    __slots__ = ("figi_id", "time_ns", "direction", "price", "quantity")
+
+    DATA_TYPE = MarketDataType.TRADE
+
+    def __init__(self, figi_id: int, time_ns: int, direction: int, price: int, quantity: int) -> None:
+        self.figi_id = figi_id
+        self.time_ns = time_ns
+        self.direction = direction
+        self.price = price
+        self.quantity = quantity
+
+
+class PriceRecord(_Record):
+    """
+    Last price.
+    """
+    __slots__ = ("figi_id", "time_ns", "price")
+
+    DATA_TYPE = MarketDataType.LAST_PRICE
+
+    def __init__(self, figi_id: int, time_ns: int, price: int) -> None:
+        self.figi_id = figi_id
+        self.time_ns = time_ns
+        self.price = price
+
+
+MarketDataRecord = Union[CandleRecord, TradeRecord, PriceRecord]
+
+
+def market_data_record(market_data: MarketDataResponse) -> Optional[MarketDataRecord]:
+    """
+    Converts market data once at the stream boundary, storages and trackers use records only.
+    :return: None for another kinds of responses (pings, subscriptions etc.)
+    """
+    if market_data.candle:
+        candle = market_data.candle
+
+        return CandleRecord(
+            figi_id(candle.figi),
+            datetime_to_ns(candle.time),
+            quotation_to_nanos(candle.open),
+            quotation_to_nanos(candle.close),
+            quotation_to_nanos(candle.high),
+            quotation_to_nanos(candle.low),
+            candle.volume
+        )
+    elif market_data.trade:
+        trade = market_data.trade
+
+        return TradeRecord(
+            figi_id(trade.figi),
+            datetime_to_ns(trade.time),
+            int(trade.direction),
+            quotation_to_nanos(trade.price),
+            trade.quantity
+        )
+    elif market_data.last_price:
+        last_price = market_data.last_price
+
+        return PriceRecord(
+            figi_id(last_price.figi),
+            datetime_to_ns(last_price.time),
+            quotation_to_nanos(last_price.price)
+        )
+
+    return None
+
+
+def record_to_market_data(record: MarketDataRecord) -> MarketDataResponse:
+    """
+    Builds SDK dataclasses back (for storages without own record support)
+    """
+    record_type = type(record)
+
+    if record_type is CandleRecord:
+        return MarketDataResponse(
+            candle=Candle(
+                figi=figi_by_id(record.figi_id),
+                interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE,
+                open=nanos_to_quotation(record.open),
+                high=nanos_to_quotation(record.high),
+                low=nanos_to_quotation(record.low),
+                close=nanos_to_quotation(record.close),
+                volume=record.volume,
+                time=ns_to_datetime(record.time_ns)
+            )
+        )
+    elif record_type is TradeRecord:
+        return MarketDataResponse(
+            trade=Trade(
+                figi=figi_by_id(record.figi_id),
+                direction=TradeDirection(record.direction),
+                price=nanos_to_quotation(record.price),
+                quantity=record.quantity,
+                time=ns_to_datetime(record.time_ns)
+            )
+        )
+
+    return MarketDataResponse(
+        last_price=LastPrice(
+            figi=figi_by_id(record.figi_id),
+            price=nanos_to_quotation(record.price),
+            time=ns_to_datetime(record.time_ns)
+        )
+    )
+
+
+def datetime_to_ns(time: datetime.datetime) -> int:
+    return (time - _EPOCH) // _ONE_MICROSECOND * 1000
+
+
+def ns_to_datetime(time_ns: int) -> datetime.datetime:
+    return _EPOCH + datetime.timedelta(microseconds=time_ns // 1000)
+
+
+@functools.lru_cache(maxsize=_SECONDS_CACHE_SIZE)
+def _second(seconds: int) -> tuple[str, datetime.date]:
+    """
+    :return: Time text without fraction and timezone, date
+    """
+    time = _EPOCH + datetime.timedelta(seconds=seconds)
+
+    return time.replace(tzinfo=None).isoformat(" "), time.date()
+
+
+def format_time(time_ns: int) -> str:
+    """
+    :return: The same text as str(ns_to_datetime(time_ns)): "YYYY-MM-DD HH:MM:SS[.ffffff]+00:00"
+    """
+    seconds, nanos = divmod(time_ns, _NS_IN_SECOND)
+    text = _second(seconds)[0]
+    microseconds = nanos // 1000
+
+    # leading "1" keeps zeros of microseconds
+    return f"{text}.{str(1_000_000 + microseconds)[1:]}+00:00" if microseconds else text + "+00:00"
+
+
+def ns_to_date(time_ns: int) -> datetime.date:
+    return _second(time_ns // _NS_IN_SECOND)[1]
@@ -0,0 +1,26 @@
+from enum import Enum
+from typing import Optional
+
+from tinkoff.invest import MarketDataResponse
+
+__all__ = ("MarketDataType", "market_data_type")
+
+
+class MarketDataType(Enum):
+    CANDLE = "candle"
+    TRADE = "trade"
+    LAST_PRICE = "last_price"
+
+
+def market_data_type(market_data: MarketDataResponse) -> Optional[tuple[str, MarketDataType]]:
+    """
+    :return: figi and data type of market data, None for another kinds of responses (pings, subscriptions etc.)
+    """
+    if market_data.candle:
+        return market_data.candle.figi, MarketDataType.CANDLE
+    elif market_data.trade:
+        return market_data.trade.figi, MarketDataType.TRADE
+    elif market_data.last_price:
+        return market_data.last_price.figi, MarketDataType.LAST_PRICE
+
+    return None
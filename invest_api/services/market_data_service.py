@@ -0,0 +1,45 @@
+import datetime
+import logging
+from typing import Optional
+
+from tinkoff.invest import AsyncClient, CandleInterval, HistoricCandle
+
+from invest_api.invest_error_decorators import invest_error_logging, invest_api_retry
+
+__all__ = ("MarketDataService")
+
+logger = logging.getLogger(__name__)
+
+
+class MarketDataService:
+    """
+    The class encapsulate tinkoff market data (historical) api
+    """
+    def __init__(self, token: str, app_name: str, target: Optional[str] = None) -> None:
+        self.__token = token
+        self.__app_name = app_name
+        # None means the default API endpoint
+        self.__target = target
+
+    @invest_api_retry()
+    @invest_error_logging
+    async def get_one_minute_candles(
+            self,
+            figi: str,
+            _from: datetime,
+            _to: datetime
+    ) -> list[HistoricCandle]:
+        """
+        Note: Range of one minute candles is limited by one day in API
+        """
+        logger.debug(f"Get candles for figi: {figi}, from: {_from}, to: {_to}")
+
+        async with AsyncClient(self.__token, target=self.__target, app_name=self.__app_name) as client:
+            response = await client.market_data.get_candles(
+                figi=figi,
+                from_=_from,
+                to=_to,
+                interval=CandleInterval.CANDLE_INTERVAL_1_MIN
+            )
+
+            return response.candles
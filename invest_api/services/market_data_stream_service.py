@@ -1,88 +1,278 @@
+import asyncio
+import collections
 import logging
-from typing import Generator
+import time
+from typing import AsyncGenerator, Callable, Optional
 
-from tinkoff.invest import AsyncClient, CandleInstrument, SubscriptionInterval, TradeInstrument, \
-    MarketDataResponse, LastPriceInstrument
-from tinkoff.invest.market_data_stream.async_market_data_stream_manager import AsyncMarketDataStreamManager
+from tinkoff.invest import MarketDataResponse
 
-from invest_api.invest_error_decorators import invest_error_logging, invest_api_retry
-from configuration.settings import DataCollectionSettings
+from configuration.settings import DataCollectionSettings, MarketDataStreamSettings
+from invest_api.market_data_type import MarketDataType
+from invest_api.services.market_data_stream_shard import MarketDataStreamShard
+from metrics.metrics_registry import REGISTRY
 
 
 __all__ = ("MarketDataStreamService")
 
 logger = logging.getLogger(__name__)
 
+MERGE_QUEUE_DEPTH = REGISTRY.gauge("stream_merge_queue_depth", "Received but not processed market data of all shards")
+STREAM_DUPLICATES = REGISTRY.counter(
+    "stream_redundant_duplicates_total", "Market data dropped as already received by the redundant stream"
+)
+STREAM_SILENT_RESTARTS = REGISTRY.counter(
+    "stream_redundant_silent_restarts_total",
+    "Streams restarted as silent while the same stream of the other copy receives market data",
+    ("shard",)
+)
+
+
+def _market_data_key(market_data: MarketDataResponse) -> Optional[tuple]:
+    """
+    :return: Key of the event (figi, data type, time and payload), None for service messages.
+    Updates of a candle have the same key (figi, data type and time).
+    """
+    if candle := market_data.candle:
+        return candle.figi, MarketDataType.CANDLE, candle.time
+    if trade := market_data.trade:
+        return (
+            trade.figi, MarketDataType.TRADE, trade.time,
+            trade.direction, trade.price.units, trade.price.nano, trade.quantity
+        )
+    if last_price := market_data.last_price:
+        return (
+            last_price.figi, MarketDataType.LAST_PRICE, last_price.time,
+            last_price.price.units, last_price.price.nano
+        )
+
+    return None
+
 
 class MarketDataStreamService:
     """
-    The class encapsulate tinkoff market data stream (gRPC) service api
+    The class encapsulate tinkoff market data stream (gRPC) service api.
+    Subscriptions are split between several concurrent streams (shards), their market data is merged.
+
+    In redundant mode every subscription is received by two independent sets of shards (primary and standby).
+    An event is returned from the stream which has delivered it first, its copy from the other stream is dropped
+    (events are compared by figi, data type, time and payload within the window of recent events).
+    If a stream has been failed, the other one keeps delivering market data while the failed one reconnects.
     """
-    def __init__(self, token: str, app_name: str) -> None:
+    # Max count of received but not processed market data
+    __MERGE_QUEUE_SIZE = 10000
+    __SILENCE_CHECK_INTERVAL_SEC = 1.0
+
+    def __init__(
+            self,
+            token: str,
+            app_name: str,
+            settings: MarketDataStreamSettings,
+            target: Optional[str] = None
+    ) -> None:
         self.__token = token
         self.__app_name = app_name
+        self.__settings = settings
+        # None means the default API endpoint
+        self.__target = target
 
-        self.__stream: AsyncMarketDataStreamManager = None
+        self.__shards: list[MarketDataStreamShard] = []
+        # Shards per copy of subscriptions: one copy or primary and standby in redundant mode
+        self.__copies: list[list[MarketDataStreamShard]] = []
+        # Copy to resubscribe next time: the same subscription isn't resubscribed in both copies at once
+        self.__resubscribe_copy = 0
 
-    @invest_api_retry()
-    @invest_error_logging
     async def start_async_candles_stream(
             self,
             figies: list[str],
-            settings: DataCollectionSettings
-    ) -> Generator[MarketDataResponse, None, None]:
+            settings: DataCollectionSettings,
+            on_reconnect: Optional[Callable[[list[str]], None]] = None
+    ) -> AsyncGenerator[MarketDataResponse, None]:
         """
-        The method starts async gRPC stream and return required responses
+        The method starts async gRPC streams and return required responses from all of them.
+        Every shard reconnects by self, the method is finished after stop_candles_stream only.
+        :param on_reconnect: It is called with candles figies of a shard after the shard has been reconnected
         """
-        logger.debug(f"Starting market data async stream")
-
-        async with AsyncClient(self.__token, app_name=self.__app_name) as client:
-            self.__stream = client.create_market_data_stream()
-
-            if settings.candles:
-                logger.info(f"Subscribe candles: {figies}")
-                self.__stream.candles.subscribe(
-                    [
-                        CandleInstrument(
-                            figi=figi,
-                            interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE
-                        )
-                        for figi in figies
-                    ]
-                )
+        logger.debug(f"Starting market data async streams")
 
-            if settings.trades:
-                logger.info(f"Subscribe trades: {figies}")
-                self.__stream.trades.subscribe(
-                    [
-                        TradeInstrument(
-                            figi=figi
-                        )
-                        for figi in figies
-                    ]
-                )
+        self.__copies = self.__make_shards(figies, settings, on_reconnect)
+        self.__shards = [shard for copy in self.__copies for shard in copy]
+        output = asyncio.Queue(maxsize=self.__MERGE_QUEUE_SIZE)
+        MERGE_QUEUE_DEPTH.set_function(output.qsize)
 
-            if settings.last_price:
-                logger.info(f"Subscribe last_price: {figies}")
-                self.__stream.last_price.subscribe(
-                    [
-                        LastPriceInstrument(
-                            figi=figi
-                        )
-                        for figi in figies
-                    ]
-                )
+        tasks = [asyncio.create_task(shard.run(output)) for shard in self.__shards]
+        ready_task = asyncio.create_task(self.__log_ready(self.__shards, time.monotonic()))
+
+        # Keys of recent events in arrival order -> count of the event received by every copy
+        # (max forwarded volume for candles)
+        window: Optional[collections.OrderedDict] = collections.OrderedDict() if len(self.__copies) > 1 else None
+        window_size = max(1, self.__settings.redundant_window)
+        shards_count = len(self.__copies[0])
+
+        # monotonic time of the last market data of every shard (by shard id), it is used in redundant mode
+        last_events = [time.monotonic()] * len(self.__shards)
+        next_silence_check = 0.0
+
+        try:
+            running_shards = len(tasks)
 
-            async for market_data in self.__stream:
-                logger.debug(f"market_data: {market_data}")
+            while running_shards:
+                shard_id, market_data = await output.get()
 
-                if (settings.candles and market_data.candle) \
-                        or (settings.trades and market_data.trade) \
-                        or (settings.last_price and market_data.last_price):
-                    yield market_data
+                if market_data is None:
+                    running_shards -= 1
+                    continue
+
+                if window is not None:
+                    now = last_events[shard_id] = time.monotonic()
+
+                    if now >= next_silence_check:
+                        next_silence_check = now + self.__SILENCE_CHECK_INTERVAL_SEC
+                        self.__restart_silent_shards(last_events, shards_count, now)
+
+                    if not self.__is_first(window, window_size, shard_id // shards_count, market_data):
+                        STREAM_DUPLICATES.inc()
+                        continue
+
+                yield market_data
+        finally:
+            for shard in self.__shards:
+                shard.stop()
+
+            ready_task.cancel()
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(ready_task, *tasks, return_exceptions=True)
+
+            self.__shards = []
+            self.__copies = []
+            MERGE_QUEUE_DEPTH.set_function(None)
+
+    def is_ready(self) -> bool:
+        """
+        All streams (of primary or standby copy in redundant mode) are connected and their subscriptions are confirmed
+        """
+        return any(all(shard.is_ready for shard in copy) for copy in self.__copies)
 
     def stop_candles_stream(self) -> None:
-        if self.__stream:
+        if self.__shards:
             logger.info(f"Stopping candles stream")
 
-            self.__stream.stop()
+            for shard in self.__shards:
+                shard.stop()
+
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        if not self.__copies:
+            return
+
+        # In redundant mode copies are resubscribed in turn, the other copy keeps the subscription meanwhile
+        self.__resubscribe_copy = (self.__resubscribe_copy + 1) % len(self.__copies)
+
+        for shard in self.__copies[self.__resubscribe_copy]:
+            if shard.has_subscription(figi, data_type):
+                shard.resubscribe(figi, data_type)
+
+    @staticmethod
+    def __is_first(
+            window: collections.OrderedDict,
+            window_size: int,
+            copy: int,
+            market_data: MarketDataResponse
+    ) -> bool:
+        """
+        The event is the first if the other copy has received fewer events with the same key.
+        Equal events of one stream (e.g. trades of the same time, price and quantity) aren't dropped.
+        An update of a candle is the first if its volume is greater than volume of forwarded updates,
+        so a late update of one copy doesn't overwrite a newer update of the other copy.
+        """
+        key = _market_data_key(market_data)
+
+        if key is None:
+            return True
+
+        if candle := market_data.candle:
+            volume = window.get(key)
+
+            if volume is not None and candle.volume <= volume:
+                return False
+
+            window[key] = candle.volume
+            window.move_to_end(key)
+
+            if len(window) > window_size:
+                window.popitem(last=False)
+
+            return True
+
+        counts = window.get(key)
+
+        if counts is None:
+            counts = window[key] = [0, 0]
+
+            if len(window) > window_size:
+                window.popitem(last=False)
+
+        counts[copy] += 1
+
+        return counts[copy] > counts[1 - copy]
+
+    def __restart_silent_shards(self, last_events: list[float], shards_count: int, now: float) -> None:
+        """
+        A shard is restarted if it hasn't received market data for redundant_silence_sec, but the shard
+        of the other copy with the same subscriptions has (e.g. the stream hangs without errors)
+        """
+        silence_sec = self.__settings.redundant_silence_sec
+
+        for shard in self.__shards:
+            other_id = (shard.shard_id + shards_count) % len(self.__shards)
+
+            if now - last_events[shard.shard_id] > silence_sec >= now - last_events[other_id]:
+                logger.warning(f"Shard {shard.shard_id}: no market data for {silence_sec} sec, "
+                               f"shard {other_id} receives it. Restarting...")
+
+                STREAM_SILENT_RESTARTS.inc((str(shard.shard_id),))
+                # the restarted shard has the same time to reconnect
+                last_events[shard.shard_id] = now
+                shard.restart()
+
+    @staticmethod
+    async def __log_ready(shards: list[MarketDataStreamShard], start: float) -> None:
+        await asyncio.gather(*[shard.wait_ready() for shard in shards])
+
+        logger.info(f"Market data streams are ready in {time.monotonic() - start:.3f} sec")
+
+    def __make_shards(
+            self,
+            figies: list[str],
+            settings: DataCollectionSettings,
+            on_reconnect: Optional[Callable[[list[str]], None]]
+    ) -> list[list[MarketDataStreamShard]]:
+        subscriptions: list[tuple[str, MarketDataType]] = []
+
+        if settings.candles:
+            subscriptions.extend((figi, MarketDataType.CANDLE) for figi in figies)
+        if settings.trades:
+            subscriptions.extend((figi, MarketDataType.TRADE) for figi in figies)
+        if settings.last_price:
+            subscriptions.extend((figi, MarketDataType.LAST_PRICE) for figi in figies)
+
+        shards_count = max(1, min(self.__settings.shards_count, len(subscriptions)))
+        copies_count = 2 if self.__settings.redundant else 1
+        logger.info(f"Subscriptions: {len(subscriptions)}, shards: {shards_count}, copies: {copies_count}")
+
+        # Shard ids of the standby copy follow ids of the primary one
+        return [
+            [
+                MarketDataStreamShard(
+                    copy * shards_count + index,
+                    self.__token,
+                    self.__app_name,
+                    subscriptions[index::shards_count],
+                    self.__settings.reconnect_delay_sec,
+                    on_reconnect,
+                    self.__target
+                )
+                for index in range(shards_count)
+            ]
+            for copy in range(copies_count)
+        ]
@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import time
+from typing import AsyncGenerator, Callable, Optional
+
+from tinkoff.invest import AsyncClient, CandleInstrument, SubscriptionInterval, TradeInstrument, \
+    LastPriceInstrument, MarketDataResponse, SubscriptionStatus
+from tinkoff.invest.market_data_stream.async_market_data_stream_manager import AsyncMarketDataStreamManager
+
+from invest_api.invest_error_decorators import invest_api_retry, invest_error_logging, TRANSPORT_ERRORS
+from invest_api.market_data_type import MarketDataType
+from log_tools.log_sampler import LogSampler
+from metrics.metrics_registry import REGISTRY
+
+__all__ = ("MarketDataStreamShard", "StreamFinishedError")
+
+logger = logging.getLogger(__name__)
+
+STREAM_ERRORS = REGISTRY.counter("stream_errors_total", "Failed market data streams", ("shard",))
+STREAM_RECONNECTS = REGISTRY.counter("stream_reconnects_total", "Reconnects of market data streams", ("shard",))
+STREAM_RECONNECT_SECONDS = REGISTRY.histogram(
+    "stream_reconnect_seconds",
+    "Time from stream failure (or finish) to subscription of the new stream",
+    (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0),
+    ("shard",)
+)
+STREAM_READY_SECONDS = REGISTRY.histogram(
+    "stream_ready_seconds",
+    "Time from connection start to confirmation of all subscriptions of the stream",
+    (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+    ("shard",)
+)
+
+
+class StreamFinishedError(ConnectionError):
+    """
+    The stream has been finished by the server, it is reconnected with the same backoff as after transport errors
+    """
+    pass
+
+
+class MarketDataStreamShard:
+    """
+    The class encapsulate one tinkoff market data stream (gRPC) with part of subscriptions.
+    The shard reconnects by self if the stream has been failed or finished: transient errors and finish of the stream
+    by the server are retried at once with exponential backoff (up to reconnect_delay_sec),
+    fatal errors and other exceptions are retried after reconnect_delay_sec.
+    The stream is ready after all subscriptions have been confirmed by the API.
+    """
+    def __init__(
+            self,
+            shard_id: int,
+            token: str,
+            app_name: str,
+            subscriptions: list[tuple[str, MarketDataType]],
+            reconnect_delay_sec: int,
+            on_reconnect: Optional[Callable[[list[str]], None]] = None,
+            target: Optional[str] = None
+    ) -> None:
+        self.__shard_id = shard_id
+
+        self.__token = token
+        self.__app_name = app_name
+        # None means the default API endpoint
+        self.__target = target
+
+        self.__candles = [figi for figi, data_type in subscriptions if data_type == MarketDataType.CANDLE]
+        self.__trades = [figi for figi, data_type in subscriptions if data_type == MarketDataType.TRADE]
+        self.__last_prices = [figi for figi, data_type in subscriptions if data_type == MarketDataType.LAST_PRICE]
+
+        self.__reconnect_delay_sec = reconnect_delay_sec
+
+        # It is called with candles figies of the shard after every reconnect (not after the first connect)
+        self.__on_reconnect = on_reconnect
+
+        self.__stream: AsyncMarketDataStreamManager = None
+        self.__log_sampler = LogSampler()
+        self.__is_stopped = False
+        self.__connections_count = 0
+        # monotonic time of the last stream failure or finish
+        self.__disconnected_at = 0.0
+
+        # Every retry opens the stream again with the same subscriptions.
+        # Other errors (e.g. bugs) aren't retried here, run() reconnects after reconnect_delay_sec.
+        self.__market_data = invest_api_retry(
+            retry_count=None,
+            exceptions=TRANSPORT_ERRORS,
+            max_delay_sec=reconnect_delay_sec
+        )(invest_error_logging(self.__stream_market_data))
+
+        # data types of the current stream which subscriptions aren't confirmed yet
+        self.__unconfirmed: set[MarketDataType] = set()
+        self.__ready = asyncio.Event()
+
+    @property
+    def shard_id(self) -> int:
+        return self.__shard_id
+
+    @property
+    def is_ready(self) -> bool:
+        return self.__ready.is_set()
+
+    async def wait_ready(self) -> None:
+        await self.__ready.wait()
+
+    def has_subscription(self, figi: str, data_type: MarketDataType) -> bool:
+        match data_type:
+            case MarketDataType.CANDLE:
+                return figi in self.__candles
+            case MarketDataType.TRADE:
+                return figi in self.__trades
+            case MarketDataType.LAST_PRICE:
+                return figi in self.__last_prices
+
+        return False
+
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        """
+        Unsubscribes and subscribes again one instrument in the current stream
+        """
+        if not self.__stream:
+            return
+
+        logger.info(f"Shard {self.__shard_id}: resubscribe {data_type.value}: {figi}")
+
+        match data_type:
+            case MarketDataType.CANDLE:
+                instruments = [
+                    CandleInstrument(figi=figi, interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE)
+                ]
+                self.__stream.candles.unsubscribe(instruments)
+                self.__stream.candles.subscribe(instruments)
+            case MarketDataType.TRADE:
+                instruments = [TradeInstrument(figi=figi)]
+                self.__stream.trades.unsubscribe(instruments)
+                self.__stream.trades.subscribe(instruments)
+            case MarketDataType.LAST_PRICE:
+                instruments = [LastPriceInstrument(figi=figi)]
+                self.__stream.last_price.unsubscribe(instruments)
+                self.__stream.last_price.subscribe(instruments)
+
+    async def run(self, output: asyncio.Queue) -> None:
+        """
+        Puts shard id and market data into output queue until the shard is stopped.
+        Shard id and None are put at the end.
+        """
+        try:
+            while not self.__is_stopped:
+                try:
+                    # It is finished after stop only, finish of the stream by the server is retried
+                    async for market_data in self.__market_data():
+                        await output.put((self.__shard_id, market_data))
+
+                except Exception as ex:
+                    logger.error(f"Shard {self.__shard_id}: stream error isn't retryable: {repr(ex)}")
+
+                    if not self.__is_stopped:
+                        logger.info(f"Shard {self.__shard_id}: reconnect after {self.__reconnect_delay_sec} seconds")
+                        await asyncio.sleep(self.__reconnect_delay_sec)
+        finally:
+            self.__stream = None
+            self.__ready.clear()
+            await output.put((self.__shard_id, None))
+
+    def stop(self) -> None:
+        """
+        Stops the stream without reconnection
+        """
+        self.__is_stopped = True
+        self.restart()
+
+    def restart(self) -> None:
+        """
+        Stops current stream, the shard will reconnect
+        """
+        if self.__stream:
+            logger.info(f"Shard {self.__shard_id}: stopping stream")
+
+            self.__stream.stop()
+
+    async def __stream_market_data(self) -> AsyncGenerator[MarketDataResponse, None]:
+        """
+        Yields market data of subscriptions of the shard from a new stream
+        """
+        if self.__is_stopped:
+            return
+
+        logger.debug(f"Shard {self.__shard_id}: starting market data async stream")
+
+        connect_start = time.monotonic()
+        self.__ready.clear()
+
+        try:
+            async with AsyncClient(self.__token, target=self.__target, app_name=self.__app_name) as client:
+                self.__stream = client.create_market_data_stream()
+
+                if self.__is_stopped:
+                    return
+
+                self.__unconfirmed = {
+                    data_type
+                    for data_type, figies in (
+                        (MarketDataType.CANDLE, self.__candles),
+                        (MarketDataType.TRADE, self.__trades),
+                        (MarketDataType.LAST_PRICE, self.__last_prices)
+                    )
+                    if figies
+                }
+
+                self.__subscribe()
+
+                self.__connections_count += 1
+                if self.__connections_count > 1:
+                    STREAM_RECONNECTS.inc((str(self.__shard_id),))
+                    STREAM_RECONNECT_SECONDS.observe(
+                        time.monotonic() - self.__disconnected_at, (str(self.__shard_id),)
+                    )
+
+                    if self.__on_reconnect:
+                        self.__on_reconnect(self.__candles)
+
+                # The level is checked once per connection, market data is formatted for sampled logs only
+                debug_enabled = logger.isEnabledFor(logging.DEBUG)
+
+                async for market_data in self.__stream:
+                    if debug_enabled and self.__log_sampler.sample():
+                        logger.debug("Shard %s: market_data: %s", self.__shard_id, market_data)
+
+                    if (self.__candles and market_data.candle) \
+                            or (self.__trades and market_data.trade) \
+                            or (self.__last_prices and market_data.last_price):
+                        yield market_data
+                    elif self.__unconfirmed:
+                        self.__confirm_subscriptions(market_data, connect_start)
+        except Exception:
+            self.__disconnected_at = time.monotonic()
+            STREAM_ERRORS.inc((str(self.__shard_id),))
+            raise
+
+        if not self.__is_stopped:
+            self.__disconnected_at = time.monotonic()
+            logger.warning(f"Shard {self.__shard_id}: stream has been finished. Reconnecting...")
+
+            raise StreamFinishedError(f"Shard {self.__shard_id}: stream has been finished by the server")
+
+    def __confirm_subscriptions(self, market_data: MarketDataResponse, connect_start: float) -> None:
+        if market_data.subscribe_candles_response:
+            data_type = MarketDataType.CANDLE
+            subscriptions = market_data.subscribe_candles_response.candles_subscriptions
+        elif market_data.subscribe_trades_response:
+            data_type = MarketDataType.TRADE
+            subscriptions = market_data.subscribe_trades_response.trade_subscriptions
+        elif market_data.subscribe_last_price_response:
+            data_type = MarketDataType.LAST_PRICE
+            subscriptions = market_data.subscribe_last_price_response.last_price_subscriptions
+        else:
+            return
+
+        failed = [
+            subscription.figi
+            for subscription in subscriptions
+            if subscription.subscription_status != SubscriptionStatus.SUBSCRIPTION_STATUS_SUCCESS
+        ]
+        if failed:
+            logger.error(f"Shard {self.__shard_id}: {data_type.value} subscription failed: {failed}")
+
+        self.__unconfirmed.discard(data_type)
+
+        if not self.__unconfirmed:
+            ready_sec = time.monotonic() - connect_start
+            STREAM_READY_SECONDS.observe(ready_sec, (str(self.__shard_id),))
+
+            logger.info(f"Shard {self.__shard_id}: stream is ready in {ready_sec:.3f} sec "
+                        f"(connected, subscriptions are confirmed)")
+
+            self.__ready.set()
+
+    def __subscribe(self) -> None:
+        if self.__candles:
+            logger.info(f"Shard {self.__shard_id}: subscribe candles: {self.__candles}")
+            self.__stream.candles.subscribe(
+                [
+                    CandleInstrument(
+                        figi=figi,
+                        interval=SubscriptionInterval.SUBSCRIPTION_INTERVAL_ONE_MINUTE
+                    )
+                    for figi in self.__candles
+                ]
+            )
+
+        if self.__trades:
+            logger.info(f"Shard {self.__shard_id}: subscribe trades: {self.__trades}")
+            self.__stream.trades.subscribe(
+                [
+                    TradeInstrument(
+                        figi=figi
+                    )
+                    for figi in self.__trades
+                ]
+            )
+
+        if self.__last_prices:
+            logger.info(f"Shard {self.__shard_id}: subscribe last_price: {self.__last_prices}")
+            self.__stream.last_price.subscribe(
+                [
+                    LastPriceInstrument(
+                        figi=figi
+                    )
+                    for figi in self.__last_prices
+                ]
+            )
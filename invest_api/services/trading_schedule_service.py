@@ -0,0 +1,160 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from configuration.settings import TradingScheduleSettings
+from invest_api.services.instrument_service import InstrumentService
+
+__all__ = ("TradingScheduleService")
+
+logger = logging.getLogger(__name__)
+
+
+class TradingScheduleService:
+    """
+    The class serves MOEX trading schedule without waiting for API.
+    Schedule of several weeks is requested by one call and is cached in memory and in file (it survives restarts).
+    Expired schedule is served as is and is refreshed in background. If API is unavailable, the cached schedule is used.
+    """
+    __MOEX_EXCHANGE_NAME = "MOEX"
+
+    def __init__(self, instrument_service: InstrumentService, settings: TradingScheduleSettings) -> None:
+        self.__instrument_service = instrument_service
+
+        self.__window = datetime.timedelta(days=max(1, settings.window_days))
+        self.__ttl = datetime.timedelta(hours=settings.cache_ttl_hours)
+        self.__cache_path = Path(settings.cache_path) if settings.cache_path else None
+
+        # date (UTC) -> (is trading day, start time, end time)
+        self.__days: dict[datetime.date, tuple[bool, datetime.datetime, datetime.datetime]] = dict()
+        self.__fetched_at: Optional[datetime.datetime] = None
+
+        self.__is_loaded = False
+        self.__refresh_task: Optional[asyncio.Task] = None
+
+    async def moex_today_trading_schedule(self) -> (bool, datetime, datetime):
+        """
+        :return: Information about trading day status, datetime trading day start, datetime trading day end
+        (both on today)
+        """
+        now = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+
+        if not self.__is_loaded:
+            self.__is_loaded = True
+
+            if self.__cache_path:
+                await asyncio.to_thread(self.__load)
+
+        if now.date() not in self.__days:
+            # Nothing to serve: the request is waited for
+            if not await self.__refresh():
+                raise Exception(f"Trading schedule on {now.date()} isn't available: API error and no cached schedule")
+        elif not self.__fetched_at or now - self.__fetched_at >= self.__ttl:
+            self.__start_refresh()
+
+        day = self.__days.get(now.date())
+
+        if not day:
+            return False, now, now
+
+        logger.info(f"MOEX today schedule: is trading day: {day[0]}, start: {day[1]}, end: {day[2]}")
+
+        return day
+
+    def __start_refresh(self) -> None:
+        if self.__refresh_task and not self.__refresh_task.done():
+            return
+
+        logger.info(f"Trading schedule has been expired (fetched at {self.__fetched_at}). Refresh in background")
+
+        self.__refresh_task = asyncio.create_task(self.__refresh())
+
+    async def __refresh(self) -> bool:
+        """
+        :return: False if API is unavailable, the cached schedule is kept
+        """
+        now = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+        _from = now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+        try:
+            # Transient errors are retried by InstrumentService
+            schedules = await self.__instrument_service.trading_schedules(
+                exchange=self.__MOEX_EXCHANGE_NAME,
+                _from=_from,
+                _to=_from + self.__window
+            )
+        except Exception as ex:
+            logger.error(f"Trading schedule request error: {repr(ex)}")
+            return False
+
+        self.__days = {
+            day.date.date(): (day.is_trading_day, day.start_time, day.end_time)
+            for schedule in schedules
+            for day in schedule.days
+        }
+        self.__fetched_at = now
+
+        logger.info(f"Trading schedule has been refreshed: {len(self.__days)} days from {_from.date()}")
+
+        if self.__cache_path:
+            try:
+                await asyncio.to_thread(self.__save, dict(self.__days), now)
+            except Exception as ex:
+                logger.error(f"Trading schedule cache write error: {repr(ex)}")
+
+        return True
+
+    def __load(self) -> None:
+        if not self.__cache_path.exists():
+            return
+
+        try:
+            with open(self.__cache_path, "r", encoding="UTF8") as file:
+                cache = json.load(file)
+
+            self.__days = {
+                datetime.date.fromisoformat(day["date"]): (
+                    day["is_trading_day"],
+                    datetime.datetime.fromisoformat(day["start_time"]),
+                    datetime.datetime.fromisoformat(day["end_time"])
+                )
+                for day in cache["days"]
+            }
+            self.__fetched_at = datetime.datetime.fromisoformat(cache["fetched_at"])
+
+            logger.info(f"Trading schedule has been loaded from {self.__cache_path}: {len(self.__days)} days, "
+                        f"fetched at {self.__fetched_at}")
+
+        except Exception as ex:
+            logger.error(f"Trading schedule cache read error: {repr(ex)}")
+
+    def __save(
+            self,
+            days: dict[datetime.date, tuple[bool, datetime.datetime, datetime.datetime]],
+            fetched_at: datetime.datetime
+    ) -> None:
+        cache = {
+            "fetched_at": fetched_at.isoformat(),
+            "days": [
+                {
+                    "date": date.isoformat(),
+                    "is_trading_day": is_trading_day,
+                    "start_time": start_time.isoformat(),
+                    "end_time": end_time.isoformat()
+                }
+                for date, (is_trading_day, start_time, end_time) in sorted(days.items())
+            ]
+        }
+
+        self.__cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # The cache is replaced at once: a crash can't leave a partial file
+        tmp_path = self.__cache_path.with_name(self.__cache_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="UTF8") as file:
+            json.dump(cache, file, indent=2)
+
+        os.replace(tmp_path, self.__cache_path)
@@ -0,0 +1,31 @@
+__all__ = ("LogSampler", "set_debug_sample_rate")
+
+# Every N-th per-message debug log is written, it is set once by logging configuration
+_sample_interval = 1.0
+
+
+def set_debug_sample_rate(sample_rate: float) -> None:
+    """
+    :param sample_rate: Share of per-message debug logs to write: 1 - all, 0.01 - every hundredth, 0 - nothing
+    """
+    global _sample_interval
+
+    _sample_interval = round(1 / sample_rate) if sample_rate > 0 else float("inf")
+
+
+class LogSampler:
+    """
+    Sampling of per-message (hot path) debug logs. Every call site has own sampler.
+    Usage: if debug_enabled and sampler.sample(): logger.debug("...: %s", message)
+    """
+    def __init__(self) -> None:
+        self.__counter = 0
+
+    def sample(self) -> bool:
+        self.__counter += 1
+
+        if self.__counter >= _sample_interval:
+            self.__counter = 0
+            return True
+
+        return False
@@ -1,13 +1,24 @@
 import asyncio
 import logging
 import os
+import queue
 import sys
 
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from configuration.configuration import ProgramConfiguration
+from configuration.settings import LoggingSettings
+from data_collector.candles_backfill import CandlesBackfill
 from data_collector.tinkoff_collector import TinkoffCollector
+from data_storage.dedup_storage import DedupStorage
+from data_storage.files_csv.csv_compaction import CSVCompaction
+from data_storage.queued_storage import QueuedStorage
 from data_storage.storage_factory import StorageFactory
+from invest_api.services.market_data_service import MarketDataService
 from invest_api.services.market_data_stream_service import MarketDataStreamService
+from log_tools.log_sampler import set_debug_sample_rate
+from metrics.metrics_registry import REGISTRY
+from metrics.metrics_server import MetricsServer
+from observation.instrument_activity_tracker import InstrumentActivityTracker
 from observation.observer import Observer
 
 # the configuration file name
@@ -16,16 +27,35 @@ CONFIG_FILE = "settings.ini"
 logger = logging.getLogger(__name__)
 
 
-def prepare_logs():
+def prepare_logs(settings: LoggingSettings) -> QueueListener:
+    """
+    Records are put into unbounded queue, file is written by listener thread (the event loop never waits for disk).
+    :return: Started listener, stop it on exit to write remaining records
+    """
     if not os.path.exists("logs/"):
         os.makedirs("logs/")
 
+    file_handler = RotatingFileHandler('logs/collector.log', maxBytes=100000000, backupCount=10, encoding='utf-8')
+    file_handler.setFormatter(
+        logging.Formatter("%(asctime)s - %(module)s - %(levelname)s - %(funcName)s: %(lineno)d - %(message)s")
+    )
+
+    log_queue = queue.SimpleQueue()
+
+    # The queue handler merges message and arguments only, the record is formatted by the file handler
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+
     logging.basicConfig(
-        level=logging.DEBUG,
-        format="%(asctime)s - %(module)s - %(levelname)s - %(funcName)s: %(lineno)d - %(message)s",
-        handlers=[RotatingFileHandler('logs/collector.log', maxBytes=100000000, backupCount=10, encoding='utf-8')],
-        encoding="utf-8"
+        level=settings.level,
+        handlers=[queue_handler]
     )
+    set_debug_sample_rate(settings.debug_sample_rate)
+
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+
+    return listener
 
 
 async def start_asyncio_trading(observer_worker: Observer, market_data_collector_worker: TinkoffCollector) -> None:
@@ -43,20 +73,58 @@ async def start_asyncio_trading(observer_worker: Observer, market_data_collector
 
 
 if __name__ == '__main__':
-    prepare_logs()
+    # Logging settings are in the configuration, so its errors are written to stderr only
+    config = ProgramConfiguration(CONFIG_FILE)
+
+    log_listener = prepare_logs(config.logging_settings)
 
     logger.info("Data collector has been started")
 
     try:
-        config = ProgramConfiguration(CONFIG_FILE)
         logger.info("Configuration has been loaded")
 
+        if config.tinkoff_target:
+            logger.info(f"Invest API target: {config.tinkoff_target}")
+
+        if config.tinkoff_root_certificates:
+            # The SDK always uses default ssl credentials, gRPC reads root certificates by this variable
+            os.environ["GRPC_DEFAULT_SSL_ROOTS_FILE_PATH"] = config.tinkoff_root_certificates
+
+        if config.metrics_settings.enabled:
+            # The server works in a daemon thread till the process end
+            MetricsServer(REGISTRY, config.metrics_settings).start()
+
         logger.info("Load data storage by configuration")
         data_storage = StorageFactory.new_factory(config.storage_type_name, config.storage_settings)
 
         if data_storage:
+            if config.storage_queue_settings.enabled:
+                logger.info(f"Data storage writes via queue: {config.storage_queue_settings}")
+                data_storage = QueuedStorage(data_storage, config.storage_queue_settings)
+
+            if config.dedup_settings.enabled:
+                # Duplicates are dropped on the event loop, before the queue
+                logger.info(f"Data storage drops duplicates: {config.dedup_settings}")
+                data_storage = DedupStorage(data_storage, config.dedup_settings)
+
             logger.debug("Create data collector")
-            market_data_service = MarketDataStreamService(config.tinkoff_token, config.tinkoff_app_name)
+            market_data_service = MarketDataStreamService(
+                config.tinkoff_token,
+                config.tinkoff_app_name,
+                config.market_data_stream_settings,
+                config.tinkoff_target
+            )
+
+            candles_backfill = CandlesBackfill(
+                MarketDataService(config.tinkoff_token, config.tinkoff_app_name, config.tinkoff_target),
+                data_storage,
+                config.backfill_settings.max_concurrency
+            ) if config.backfill_settings.enabled else None
+
+            csv_compaction = CSVCompaction(
+                config.storage_settings.settings["root_path"],
+                config.compaction_settings
+            ) if config.compaction_settings.enabled and config.storage_type_name == "FILES_CSV" else None
 
             market_data_collector = TinkoffCollector(
                 config.tinkoff_token,
@@ -65,12 +133,27 @@ if __name__ == '__main__':
                 market_data_service,
                 config.download_figi,
                 config.data_collection_settings,
-                config.watcher_settings.delay_between_api_errors_sec
+                config.storage_batch_settings,
+                config.prewarm_settings,
+                config.trading_schedule_settings,
+                config.watcher_settings.delay_between_api_errors_sec,
+                InstrumentActivityTracker(
+                    config.watcher_settings.instrument_silence_min_sec,
+                    config.watcher_settings.instrument_silence_max_sec,
+                    config.watcher_settings.instrument_silence_rate_factor
+                ),
+                candles_backfill,
+                csv_compaction,
+                config.tinkoff_target
             )
 
             observer = Observer(config.watcher_settings, market_data_collector)
 
-            asyncio.run(start_asyncio_trading(observer, market_data_collector))
+            try:
+                asyncio.run(start_asyncio_trading(observer, market_data_collector))
+            finally:
+                logger.info("Close data storage")
+                data_storage.close()
 
         else:
             logger.info(f"Storage hasn't been found by type name: {config.storage_type_name}")
@@ -79,3 +162,5 @@ if __name__ == '__main__':
         logger.error(f"Error has been occurred: {repr(ex)}")
 
     logger.info("Data collector has been finished.")
+
+    log_listener.stop()
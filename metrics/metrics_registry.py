@@ -0,0 +1,177 @@
+import bisect
+import math
+from typing import Callable, Optional
+
+__all__ = ("Counter", "Gauge", "Histogram", "MetricsRegistry", "REGISTRY", "LATENCY_BUCKETS")
+
+# Seconds, from 1 microsecond (hot path) to 1 second (disk writes)
+LATENCY_BUCKETS = (
+    0.000001, 0.000005, 0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+
+    return repr(value)
+
+
+def _format_labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+
+    labels = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+    return f"{{{labels}}}"
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """
+    Monotonic counter. Label values are passed as a tuple in label names order.
+    Recording is a dict update only: the metric is cheap enough for the hot path.
+    """
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+        self.__values: dict[tuple, float] = dict()
+
+    def inc(self, labels: tuple = (), value: float = 1) -> None:
+        self.__values[labels] = self.__values.get(labels, 0) + value
+
+    def value(self, labels: tuple = ()) -> float:
+        return self.__values.get(labels, 0)
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            for labels, value in list(self.__values.items())
+        ]
+
+
+class Gauge:
+    """
+    Current value. It is set by owner or read from a function on every scrape.
+    """
+    def __init__(self, name: str, documentation: str, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+        self.__values: dict[tuple, float] = dict()
+        self.__functions: dict[tuple, Callable[[], float]] = dict()
+
+    def set(self, value: float, labels: tuple = ()) -> None:
+        self.__values[labels] = value
+
+    def set_function(self, function: Optional[Callable[[], float]], labels: tuple = ()) -> None:
+        """
+        :param function: It is called by scrape (from the metrics server thread), None removes the function
+        """
+        if function:
+            self.__functions[labels] = function
+        else:
+            self.__functions.pop(labels, None)
+
+    def samples(self) -> list[str]:
+        values = dict(self.__values)
+
+        for labels, function in list(self.__functions.items()):
+            values[labels] = function()
+
+        return [
+            f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+            for labels, value in values.items()
+        ]
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets (upper bounds). Recording is bisect and two increments.
+    """
+    def __init__(self, name: str, documentation: str, buckets: tuple, labels: tuple = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+
+        self.__bounds = sorted(buckets)
+
+        # labels -> count per bucket, the last one is +Inf
+        self.__counts: dict[tuple, list[int]] = dict()
+        self.__sums: dict[tuple, float] = dict()
+
+    def observe(self, value: float, labels: tuple = ()) -> None:
+        counts = self.__counts.get(labels)
+        if counts is None:
+            counts = self.__counts[labels] = [0] * (len(self.__bounds) + 1)
+            self.__sums[labels] = 0.0
+
+        counts[bisect.bisect_left(self.__bounds, value)] += 1
+        self.__sums[labels] += value
+
+    def count(self, labels: tuple = ()) -> int:
+        return sum(self.__counts.get(labels, ()))
+
+    def samples(self) -> list[str]:
+        samples = []
+        label_names = self.labels + ("le",)
+
+        for labels, counts in list(self.__counts.items()):
+            cumulative = 0
+            for bound, count in zip(self.__bounds + [math.inf], list(counts)):
+                cumulative += count
+                samples.append(
+                    f"{self.name}_bucket{_format_labels(label_names, labels + (_format_value(bound),))} {cumulative}"
+                )
+
+            samples.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(self.__sums[labels])}")
+            samples.append(f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}")
+
+        return samples
+
+
+class MetricsRegistry:
+    """
+    The class keeps all metrics of the process and renders them in Prometheus text format.
+    Metrics are declared on module level like loggers, the same name returns the same metric.
+    """
+    __PREFIX = "market_data_collector_"
+
+    def __init__(self) -> None:
+        self.__metrics: dict[str, Counter | Gauge | Histogram] = dict()
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self.__register(Counter(self.__PREFIX + name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()) -> Gauge:
+        return self.__register(Gauge(self.__PREFIX + name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, buckets: tuple, labels: tuple = ()) -> Histogram:
+        return self.__register(Histogram(self.__PREFIX + name, documentation, buckets, labels))
+
+    def render(self) -> str:
+        lines = []
+
+        for metric in list(self.__metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {type(metric).__name__.lower()}")
+            lines.extend(metric.samples())
+
+        lines.append("")
+
+        return "\n".join(lines)
+
+    def __register(self, metric: Counter | Gauge | Histogram) -> Counter | Gauge | Histogram:
+        return self.__metrics.setdefault(metric.name, metric)
+
+
+# The process registry
+REGISTRY = MetricsRegistry()
@@ -0,0 +1,63 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from configuration.settings import MetricsSettings
+from metrics.metrics_registry import MetricsRegistry
+
+__all__ = ("MetricsServer")
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    """
+    The class exposes metrics registry on local HTTP endpoint (GET /metrics) in Prometheus text format.
+    The server works in a background thread, metrics are rendered by scrape only.
+    """
+    __CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self, registry: MetricsRegistry, settings: MetricsSettings) -> None:
+        self.__registry = registry
+        self.__settings = settings
+
+        self.__server: ThreadingHTTPServer = None
+        self.__thread: threading.Thread = None
+
+    def start(self) -> None:
+        registry = self.__registry
+        content_type = self.__CONTENT_TYPE
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = registry.render().encode("utf-8")
+
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                # Scrapes aren't logged
+                pass
+
+        self.__server = ThreadingHTTPServer((self.__settings.host, self.__settings.port), MetricsHandler)
+        self.__server.daemon_threads = True
+
+        self.__thread = threading.Thread(target=self.__server.serve_forever, name="metrics-server", daemon=True)
+        self.__thread.start()
+
+        logger.info(f"Metrics are available on http://{self.__settings.host}:{self.__settings.port}/metrics")
+
+    def stop(self) -> None:
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join()
+
+            self.__server = None
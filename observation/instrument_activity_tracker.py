@@ -0,0 +1,101 @@
+import logging
+
+from invest_api.market_data_type import MarketDataType
+
+__all__ = ("InstrumentActivityTracker")
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentActivity:
+    __slots__ = ("last_event", "avg_interval", "has_events", "initial_silence")
+
+    def __init__(self, last_event: float, initial_silence: float) -> None:
+        # monotonic time of the last event
+        self.last_event = last_event
+        # exponential moving average of interval between events, None if there are less than two events
+        self.avg_interval: float = None
+        self.has_events = False
+        # allowed silence before the first event after subscription
+        self.initial_silence = initial_silence
+
+
+class InstrumentActivityTracker:
+    """
+    The class tracks last event time and message rate for every subscription (figi and data type).
+    A subscription is stale if it is silent longer than expected by its recent message rate:
+    rate_factor * average interval between events, limited by [min_silence_sec, max_silence_sec].
+    A subscription without events is stale after min_silence_sec (a stream can hang right after connect),
+    the limit is doubled after every resubscription without events up to max_silence_sec (an illiquid instrument).
+    """
+    # Weight of the last interval in moving average
+    __AVG_INTERVAL_WEIGHT = 0.1
+
+    def __init__(self, min_silence_sec: float, max_silence_sec: float, rate_factor: float) -> None:
+        self.__min_silence_sec = min_silence_sec
+        self.__max_silence_sec = max_silence_sec
+        self.__rate_factor = rate_factor
+
+        self.__activities: dict[tuple[str, MarketDataType], InstrumentActivity] = dict()
+
+    def start(self, subscriptions: list[tuple[str, MarketDataType]], now: float) -> None:
+        self.__activities = {
+            subscription: InstrumentActivity(now, self.__min_silence_sec) for subscription in subscriptions
+        }
+
+    def stop(self) -> None:
+        self.__activities = dict()
+
+    def update(self, figi: str, data_type: MarketDataType, now: float) -> None:
+        activity = self.__activities.get((figi, data_type))
+
+        if activity:
+            interval = now - activity.last_event
+
+            # The first interval is counted from the first event: the time to it includes connection
+            if not activity.has_events:
+                activity.has_events = True
+            elif activity.avg_interval is None:
+                activity.avg_interval = interval
+            else:
+                activity.avg_interval += self.__AVG_INTERVAL_WEIGHT * (interval - activity.avg_interval)
+
+            activity.last_event = now
+
+    def reset(self, figi: str, data_type: MarketDataType, now: float) -> None:
+        """
+        Starts silence calculation again (e.g. after resubscription)
+        """
+        activity = self.__activities.get((figi, data_type))
+
+        if activity:
+            activity.last_event = now
+
+            if not activity.has_events:
+                activity.initial_silence = min(self.__max_silence_sec, 2 * activity.initial_silence)
+
+    def stale(self, now: float) -> list[tuple[str, MarketDataType]]:
+        return [
+            subscription
+            for subscription, activity in self.__activities.items()
+            if now - activity.last_event >= self.__threshold(activity)
+        ]
+
+    def next_deadline(self) -> float:
+        """
+        :return: Monotonic time when the next subscription becomes stale if there are no events.
+        inf if there is nothing to track.
+        """
+        return min(
+            (activity.last_event + self.__threshold(activity) for activity in self.__activities.values()),
+            default=float("inf")
+        )
+
+    def __threshold(self, activity: InstrumentActivity) -> float:
+        if not activity.has_events:
+            return activity.initial_silence
+
+        if activity.avg_interval is None:
+            return self.__max_silence_sec
+
+        return min(self.__max_silence_sec, max(self.__min_silence_sec, self.__rate_factor * activity.avg_interval))
@@ -1,19 +1,58 @@
 import abc
-import datetime
+
+from invest_api.market_data_type import MarketDataType
 
 __all__ = ("IObservableDataCollector")
 
 
 class IObservableDataCollector(abc.ABC):
     @abc.abstractmethod
-    def last_event_time(self) -> datetime:
+    def last_event_time(self) -> float:
+        """
+        :return: Monotonic (time.monotonic) time of the last received event or collection start
+        """
+        pass
+
+    @abc.abstractmethod
+    def has_events(self) -> bool:
+        """
+        :return: True if any event has been received since collection start
+        """
         pass
 
     @abc.abstractmethod
     def is_collection_in_progress(self) -> bool:
         pass
 
+    @abc.abstractmethod
+    async def wait_collection_in_progress(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def wait_collection_stopped(self) -> None:
+        """
+        Returns when the current collection has been stopped (even if the next one has been already started)
+        """
+        pass
+
     @abc.abstractmethod
     def restart(self) -> None:
         pass
-    
\ No newline at end of file
+
+    @abc.abstractmethod
+    def stale_subscriptions(self) -> list[tuple[str, MarketDataType]]:
+        """
+        :return: Subscriptions (figi and data type) which are silent longer than expected by their activity
+        """
+        pass
+
+    @abc.abstractmethod
+    def next_stale_deadline(self) -> float:
+        """
+        :return: Monotonic time when the next subscription becomes stale if there are no events
+        """
+        pass
+
+    @abc.abstractmethod
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        pass
@@ -1,18 +1,27 @@
 import asyncio
-import datetime
 import logging
+import time
 
 from configuration.settings import WatcherSettings
+from metrics.metrics_registry import REGISTRY
 from observation.observable import IObservableDataCollector
 
 __all__ = ("Observer")
 
 logger = logging.getLogger(__name__)
 
+OBSERVER_RESTARTS = REGISTRY.counter("observer_restarts_total", "Restarts of market data stream by watcher")
+OBSERVER_RESUBSCRIPTIONS = REGISTRY.counter(
+    "observer_resubscriptions_total", "Resubscriptions of stale subscriptions by watcher", ("type",)
+)
+
 
 class Observer:
     """
-    The class handles data collection status to struggle with API hangs
+    The class handles data collection status to struggle with API hangs.
+
+    Deadline-based watchdog: the collector re-arms deadlines by storing time of every event,
+    the watchdog sleeps exactly till the nearest deadline and checks the status again.
     """
     def __init__(self, settings: WatcherSettings, data_collector: IObservableDataCollector) -> None:
         self.__settings = settings
@@ -20,16 +29,48 @@ class Observer:
 
     async def worker(self) -> None:
         while True:
-            # logger.debug("Check current data collection status")
+            if not self.__data_collector.is_collection_in_progress():
+                await self.__data_collector.wait_collection_in_progress()
+                continue
+
+            now = time.monotonic()
+
+            silence_deadline = self.__data_collector.last_event_time() + self.__settings.max_sec_api_silence
+            stale_deadline = self.__data_collector.next_stale_deadline()
+
+            if now >= stale_deadline or (now >= silence_deadline and not self.__data_collector.has_events()):
+                self.__check_status(now)
+                continue
+
+            # The silence deadline matters only together with stale subscriptions or if nothing has been received
+            # since the stream start (see __check_status), it is skipped if it has been already passed
+            # (e.g. a quiet market)
+            next_deadline = min(stale_deadline, silence_deadline) if now < silence_deadline else stale_deadline
 
-            if self.__data_collector.is_collection_in_progress() and self.__data_collector.last_event_time():
-                now = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+            # A new collection (e.g. the stream has reconnected by self) has new deadlines
+            try:
+                await asyncio.wait_for(
+                    self.__data_collector.wait_collection_stopped(),
+                    min(next_deadline - now, self.__settings.instrument_silence_max_sec)
+                )
+            except asyncio.TimeoutError:
+                pass
 
-                last_event_total_seconds_delay = (now - self.__data_collector.last_event_time()).total_seconds()
+    def __check_status(self, now: float) -> None:
+        last_event_total_seconds_delay = now - self.__data_collector.last_event_time()
 
-                logger.debug(f"Status check! Current delay is {last_event_total_seconds_delay}")
+        logger.debug(f"Status check! Current delay is {last_event_total_seconds_delay}")
 
-                if last_event_total_seconds_delay > self.__settings.max_sec_api_silence:
-                    self.__data_collector.restart()
+        # Subscriptions which are silent longer than expected by their own activity.
+        # A quiet market doesn't restart the stream, only dead subscriptions are handled.
+        # A stream without any event since its start is restarted by the silence limit: it can hang right after connect.
+        stale_subscriptions = self.__data_collector.stale_subscriptions()
 
-            await asyncio.sleep(self.__settings.max_sec_api_silence)
+        if last_event_total_seconds_delay >= self.__settings.max_sec_api_silence \
+                and (stale_subscriptions or not self.__data_collector.has_events()):
+            OBSERVER_RESTARTS.inc()
+            self.__data_collector.restart()
+        else:
+            for figi, data_type in stale_subscriptions:
+                OBSERVER_RESUBSCRIPTIONS.inc((data_type.value,))
+                self.__data_collector.resubscribe(figi, data_type)
@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import heapq
+import logging
+import time
+from typing import AsyncGenerator, Callable, Optional
+
+from tinkoff.invest import MarketDataResponse
+
+from configuration.settings import DataCollectionSettings
+from data_storage.files_csv.csv_data_reader import CSVDataReader
+from invest_api.market_data_type import MarketDataType
+
+__all__ = ("MarketDataReplayService")
+
+logger = logging.getLogger(__name__)
+
+
+class MarketDataReplayService:
+    """
+    The class replays market data stored in csv files as MarketDataResponse stream.
+    It has the same interface as MarketDataStreamService and can be used instead of it (e.g. in TinkoffCollector).
+
+    Files of all figies and data types are merged by time lazily, a whole day is never kept in memory.
+    Speed: 1 - real time, N - N times faster, 0 - as fast as possible.
+    """
+    # Control is given back to event loop every N market data if speed is unlimited
+    __YIELD_EVERY = 1000
+
+    def __init__(self, reader: CSVDataReader, from_day: datetime.date, to_day: datetime.date, speed: float) -> None:
+        self.__reader = reader
+        self.__from_day = from_day
+        self.__to_day = to_day
+        self.__speed = speed
+
+        self.__is_stopped = False
+
+    async def start_async_candles_stream(
+            self,
+            figies: list[str],
+            settings: DataCollectionSettings,
+            on_reconnect: Optional[Callable[[list[str]], None]] = None
+    ) -> AsyncGenerator[MarketDataResponse, None]:
+        self.__is_stopped = False
+
+        data_types = MarketDataReplayService.__data_types(settings)
+
+        day = self.__from_day
+        while day <= self.__to_day and not self.__is_stopped:
+            logger.info(f"Replay market data for {day}")
+
+            merged = heapq.merge(
+                *[self.__reader.market_data(figi, data_type, day) for figi in figies for data_type in data_types],
+                key=MarketDataReplayService.__event_time
+            )
+
+            async for market_data in self.__paced(merged):
+                yield market_data
+
+            day += datetime.timedelta(days=1)
+
+        logger.info(f"Replay has been finished")
+
+    def is_ready(self) -> bool:
+        return True
+
+    def stop_candles_stream(self) -> None:
+        logger.info(f"Stopping replay")
+
+        self.__is_stopped = True
+
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        pass
+
+    async def __paced(self, merged) -> AsyncGenerator[MarketDataResponse, None]:
+        # Pacing starts again every day, nights aren't replayed
+        first_event_time: datetime = None
+        start = time.monotonic()
+        count = 0
+
+        for market_data in merged:
+            if self.__is_stopped:
+                return
+
+            if self.__speed > 0:
+                event_time = MarketDataReplayService.__event_time(market_data)
+
+                if not first_event_time:
+                    first_event_time = event_time
+
+                delay = start + (event_time - first_event_time).total_seconds() / self.__speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                count += 1
+                if count % self.__YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+
+            yield market_data
+
+    @staticmethod
+    def __data_types(settings: DataCollectionSettings) -> list[MarketDataType]:
+        data_types = []
+
+        if settings.candles:
+            data_types.append(MarketDataType.CANDLE)
+        if settings.trades:
+            data_types.append(MarketDataType.TRADE)
+        if settings.last_price:
+            data_types.append(MarketDataType.LAST_PRICE)
+
+        return data_types
+
+    @staticmethod
+    def __event_time(market_data: MarketDataResponse) -> datetime:
+        if market_data.candle:
+            return market_data.candle.time
+        elif market_data.trade:
+            return market_data.trade.time
+
+        return market_data.last_price.time
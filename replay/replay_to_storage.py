@@ -0,0 +1,75 @@
+"""
+Replays stored csv market data into a storage. It is useful to check storages with real load profile.
+
+Run from the project root:
+python -m replay.replay_to_storage --csv-root ../../../raw_market_data --figi BBG004731032 \
+    --from-date 2022-11-01 --to-date 2022-11-02 --speed 0 \
+    --storage-type FILES_COLUMNAR --setting root_path=../../../columnar_market_data
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import time
+
+from configuration.settings import StorageSettings, DataCollectionSettings
+from data_storage.base_storage import IStorage
+from data_storage.files_csv.csv_data_reader import CSVDataReader
+from data_storage.storage_factory import StorageFactory
+from replay.market_data_replay_service import MarketDataReplayService
+
+logger = logging.getLogger(__name__)
+
+
+async def replay(replay_service: MarketDataReplayService, figies: list[str], storage: IStorage) -> int:
+    count = 0
+
+    async for market_data in replay_service.start_async_candles_stream(
+            figies,
+            DataCollectionSettings(candles=True, trades=True, last_price=True)
+    ):
+        storage.save(market_data)
+        count += 1
+
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay stored csv market data into a storage")
+    parser.add_argument("--csv-root", required=True, help="ROOT_PATH of FILES_CSV storage")
+    parser.add_argument("--figi", action="append", required=True, help="Figi to replay (can be repeated)")
+    parser.add_argument("--from-date", required=True, type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--to-date", required=True, type=datetime.date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--speed", type=float, default=0, help="1 - real time, N - N times faster, 0 - unlimited")
+    parser.add_argument("--storage-type", required=True, help="Target storage type, e.g. FILES_COLUMNAR")
+    parser.add_argument("--setting", action="append", default=[], help="Target storage setting: KEY=VALUE")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    settings = StorageSettings(
+        settings=dict(
+            (key.strip().lower(), value.strip())
+            for key, value in (setting.split("=", 1) for setting in args.setting)
+        )
+    )
+
+    storage = StorageFactory.new_factory(args.storage_type, settings)
+    if not storage:
+        logger.error(f"Storage hasn't been found by type name: {args.storage_type}")
+        return
+
+    replay_service = MarketDataReplayService(CSVDataReader(args.csv_root), args.from_date, args.to_date, args.speed)
+
+    start = time.perf_counter()
+    try:
+        count = asyncio.run(replay(replay_service, args.figi, storage))
+    finally:
+        storage.close()
+
+    duration = time.perf_counter() - start
+    logger.info(f"Replayed {count} market data in {duration:.3f} sec: {count / duration:.0f} per sec")
+
+
+if __name__ == "__main__":
+    main()
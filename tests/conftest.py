@@ -0,0 +1,33 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def fake_api_certificate(tmp_path_factory) -> tuple[str, str]:
+    """
+    Self-signed certificate of the fake server: the SDK connects via TLS only.
+    gRPC trusts the certificate by env variable, it is read when the first secure channel is made.
+    :return: Certificate and key files
+    """
+    if not shutil.which("openssl"):
+        pytest.skip("openssl is required to make certificate of the fake server")
+
+    path = tmp_path_factory.mktemp("fake_api")
+    cert_file, key_file = str(path.joinpath("fake_api.crt")), str(path.joinpath("fake_api.key"))
+
+    subprocess.run(
+        [
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=localhost", "-addext", "subjectAltName=DNS:localhost",
+            "-keyout", key_file, "-out", cert_file
+        ],
+        check=True,
+        capture_output=True
+    )
+
+    os.environ["GRPC_DEFAULT_SSL_ROOTS_FILE_PATH"] = cert_file
+
+    return cert_file, key_file
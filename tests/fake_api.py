@@ -0,0 +1,44 @@
+import contextlib
+import datetime
+from typing import AsyncIterator, Optional
+
+from fake_invest_api.fake_invest_server import FakeInvestServer, FakeMarketDataStreamServicer, \
+    FakeMarketDataServicer, FakeInstrumentsServicer
+from fake_invest_api.fake_market_data import FakeMarketData
+from fake_invest_api.fake_stream_scenario import FakeStreamPhase, FakeStreamScenario
+
+__all__ = ("fake_invest_api")
+
+
+@contextlib.asynccontextmanager
+async def fake_invest_api(
+        certificate: tuple[str, str],
+        phases: Optional[list[FakeStreamPhase]] = None,
+        rate_per_sec: float = 200,
+        unary_error_probability: float = 0,
+        seed: int = 42
+) -> AsyncIterator[tuple[str, FakeMarketDataStreamServicer]]:
+    """
+    Runs the fake server on a free port of localhost in the current event loop.
+    :return: Target for the SDK and stream servicer (to check count of connections)
+    """
+    cert_file, key_file = certificate
+    market_data = FakeMarketData(seed)
+
+    stream_servicer = FakeMarketDataStreamServicer(FakeStreamScenario(phases or []), market_data, rate_per_sec, seed)
+    server = FakeInvestServer(
+        0,
+        cert_file,
+        key_file,
+        stream_servicer,
+        FakeMarketDataServicer(market_data, unary_error_probability, seed),
+        FakeInstrumentsServicer(datetime.time(0, 0), datetime.time(23, 59), unary_error_probability, seed),
+        host="localhost"
+    )
+
+    port = await server.start()
+
+    try:
+        yield f"localhost:{port}", stream_servicer
+    finally:
+        await server.stop()
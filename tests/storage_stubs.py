@@ -0,0 +1,28 @@
+import datetime
+
+from data_storage.base_storage import IStorage
+from invest_api.market_data_record import MarketDataRecord, market_data_record
+
+__all__ = ("MemoryStorage")
+
+
+class MemoryStorage(IStorage):
+    """
+    Keeps saved records in memory, tail_records returns the given records
+    """
+    def __init__(self, tail: list[MarketDataRecord] = None) -> None:
+        self.__tail = tail or []
+
+        self.records: list[MarketDataRecord] = []
+
+    def save(self, market_data) -> None:
+        record = market_data_record(market_data)
+
+        if record:
+            self.records.append(record)
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        self.records.extend(records)
+
+    def tail_records(self, day: datetime.date, max_records: int) -> list[MarketDataRecord]:
+        return list(self.__tail)
@@ -0,0 +1,53 @@
+import asyncio
+import datetime
+
+import pytest
+
+pytest.importorskip("tinkoff.invest.grpc.marketdata_pb2_grpc")
+
+from configuration.settings import StorageSettings
+from data_collector.candles_backfill import CandlesBackfill
+from data_storage.files_csv.csv_data_reader import CSVDataReader
+from data_storage.files_csv.csv_data_storage import CSVDataStorage
+from invest_api.market_data_record import CandleRecord, figi_id, datetime_to_ns
+from invest_api.services.market_data_service import MarketDataService
+from tests.fake_api import fake_invest_api
+
+FIGI = "BBG004730N88"
+ONE_MINUTE_NS = 60 * 1_000_000_000
+
+
+def test_backfilled_candles_are_replayed_in_time_order(fake_api_certificate, tmp_path):
+    now = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc, second=0, microsecond=0)
+    if now.hour == 0 and now.minute < 6:
+        pytest.skip("Backfilled minutes would be in the previous day")
+
+    current_minute = datetime_to_ns(now)
+    last_stream_minute = current_minute - 5 * ONE_MINUTE_NS
+
+    storage = CSVDataStorage(StorageSettings({"root_path": str(tmp_path), "buffer_row_size": "1000"}))
+
+    async def scenario():
+        # the first candles request fails and is retried
+        async with fake_invest_api(fake_api_certificate, unary_error_probability=0.5, seed=1) as (target, _):
+            backfill = CandlesBackfill(MarketDataService("token", "tests", target), storage, max_concurrency=1)
+
+            last_candle = CandleRecord(figi_id(FIGI), last_stream_minute, 10, 10, 10, 10, 1)
+            storage.save_record(last_candle)
+            backfill.update(last_candle)
+
+            # after reconnect the stream saves the current minute before the gap is filled
+            storage.save_record(CandleRecord(figi_id(FIGI), current_minute, 10, 10, 10, 10, 1))
+
+            await backfill.backfill([FIGI])
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        storage.close()
+
+    times = [datetime_to_ns(candle.time) for candle in CSVDataReader(str(tmp_path)).candles(FIGI, now.date())]
+
+    # the last stream minute gets its final update, minutes between the stream candles are backfilled once,
+    # the file is read in time order
+    assert times == [last_stream_minute] + [last_stream_minute + minute * ONE_MINUTE_NS for minute in range(6)]
@@ -0,0 +1,39 @@
+from configuration.configuration import ProgramConfiguration
+from configuration.settings import WatcherSettings
+
+FIRST_VERSION_CONFIG = """
+[INVEST_API]
+TOKEN=token
+APP_NAME=tests
+
+[DATA_COLLECTION]
+CANDLES=1
+TRADES=1
+LAST_PRICE=0
+
+[WATCHER]
+MAX_SEC_API_SILENCE=20
+DELAY_BETWEEN_API_ERRORS_SEC=5
+
+[STOCK_FIGI]
+SBER=BBG004730N88
+
+[STORAGE]
+TYPE=FILES_CSV
+
+[STORAGE_SETTINGS]
+ROOT_PATH=market_data
+BUFFER_ROW_SIZE=100
+"""
+
+
+def test_config_without_new_sections_is_loaded_with_defaults(tmp_path):
+    file_name = tmp_path.joinpath("settings.ini")
+    file_name.write_text(FIRST_VERSION_CONFIG)
+
+    configuration = ProgramConfiguration(str(file_name))
+
+    assert configuration.tinkoff_target is None
+    assert configuration.watcher_settings.instrument_silence_max_sec == WatcherSettings.instrument_silence_max_sec
+    assert not configuration.storage_queue_settings.enabled
+    assert not configuration.backfill_settings.enabled
@@ -0,0 +1,130 @@
+import time
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from configuration.settings import DedupSettings
+from data_storage.dedup_storage import DedupStorage
+from invest_api.market_data_record import CandleRecord, TradeRecord, PriceRecord, figi_id
+from tests.storage_stubs import MemoryStorage
+
+ONE_MINUTE_NS = 60 * 1_000_000_000
+FIGI_ID = figi_id("BBG004730N88")
+
+
+def _current_minute() -> int:
+    return time.time_ns() // ONE_MINUTE_NS * ONE_MINUTE_NS
+
+
+def _candle(time_ns: int, volume: int, close: int = 100) -> CandleRecord:
+    return CandleRecord(FIGI_ID, time_ns, 100, close, 110, 90, volume)
+
+
+def _candles(storage: MemoryStorage) -> list[tuple[int, int]]:
+    return [(record.time_ns, record.volume) for record in storage.records if type(record) is CandleRecord]
+
+
+def test_candle_updates_are_collapsed_by_minute():
+    minute = _current_minute()
+    storage = MemoryStorage()
+    dedup = DedupStorage(storage, DedupSettings(enabled=True))
+
+    dedup.save_batch([_candle(minute - ONE_MINUTE_NS, 1), _candle(minute - ONE_MINUTE_NS, 5), _candle(minute, 2)])
+
+    assert _candles(storage) == [(minute - ONE_MINUTE_NS, 5)]
+
+    dedup.close()
+
+    assert _candles(storage) == [(minute - ONE_MINUTE_NS, 5), (minute, 2)]
+
+
+def test_backfilled_candles_are_saved_once():
+    minute = _current_minute()
+    storage = MemoryStorage()
+    dedup = DedupStorage(storage, DedupSettings(enabled=True))
+
+    dedup.save_batch([_candle(minute - 10 * ONE_MINUTE_NS, 1), _candle(minute, 1)])
+    dedup.save_batch([_candle(minute - 10 * ONE_MINUTE_NS, 1)])
+
+    # the gap is filled after the stream has sent the current minute
+    backfill = [_candle(minute - offset * ONE_MINUTE_NS, offset) for offset in range(9, 0, -1)]
+    dedup.save_batch(backfill)
+    dedup.save_batch(backfill)
+
+    assert _candles(storage) == [(minute - 10 * ONE_MINUTE_NS, 1)] + [(candle.time_ns, candle.volume)
+                                                                   for candle in backfill]
+
+
+def test_restored_minute_is_open_again():
+    minute = _current_minute()
+    # the candle of the current minute has been saved on shutdown
+    storage = MemoryStorage(tail=[_candle(minute - ONE_MINUTE_NS, 3), _candle(minute, 4)])
+    dedup = DedupStorage(storage, DedupSettings(enabled=True))
+
+    # the stream re-sends the minute after restart, then updates it
+    dedup.save_batch([_candle(minute, 4), _candle(minute, 7), _candle(minute - ONE_MINUTE_NS, 3)])
+    dedup.close()
+
+    assert _candles(storage) == [(minute, 7)]
+
+
+def test_restored_minute_isnt_saved_again():
+    minute = _current_minute()
+    storage = MemoryStorage(tail=[_candle(minute, 4)])
+    dedup = DedupStorage(storage, DedupSettings(enabled=True))
+
+    dedup.save_batch([_candle(minute, 4)])
+    dedup.close()
+
+    assert _candles(storage) == []
+
+
+def test_recent_trades_are_dropped():
+    now = time.time_ns()
+    storage = MemoryStorage(tail=[TradeRecord(FIGI_ID, now, 1, 100, 1)])
+    dedup = DedupStorage(storage, DedupSettings(enabled=True, recent_trades=10))
+
+    dedup.save_batch([
+        TradeRecord(FIGI_ID, now, 1, 100, 1),
+        TradeRecord(FIGI_ID, now, 1, 100, 2),
+        TradeRecord(FIGI_ID, now - 1, 1, 100, 3),
+        TradeRecord(FIGI_ID, now + 1, 2, 100, 1)
+    ])
+
+    assert [(record.time_ns, record.quantity) for record in storage.records] == [(now, 2), (now + 1, 1)]
+
+
+def test_equal_trades_are_kept_and_resent_trades_are_dropped():
+    now = time.time_ns()
+    storage = MemoryStorage(tail=[TradeRecord(FIGI_ID, now, 1, 100, 1)])
+    dedup = DedupStorage(storage, DedupSettings(enabled=True, recent_trades=10))
+
+    # two equal real trades of the same time: the first one has been saved before restart
+    dedup.save_batch([TradeRecord(FIGI_ID, now, 1, 100, 1), TradeRecord(FIGI_ID, now, 1, 100, 1)])
+    dedup.save_batch([TradeRecord(FIGI_ID, now + 1, 1, 100, 1)])
+
+    # the stream re-sends recent trades after resubscribe, the last trade is a new equal trade
+    dedup.save_batch([
+        TradeRecord(FIGI_ID, now, 1, 100, 1),
+        TradeRecord(FIGI_ID, now, 1, 100, 1),
+        TradeRecord(FIGI_ID, now + 1, 1, 100, 1),
+        TradeRecord(FIGI_ID, now + 1, 1, 100, 1)
+    ])
+
+    assert [record.time_ns for record in storage.records] == [now, now + 1, now + 1]
+
+
+def test_old_and_equal_prices_are_dropped():
+    now = time.time_ns()
+    storage = MemoryStorage()
+    dedup = DedupStorage(storage, DedupSettings(enabled=True))
+
+    dedup.save_batch([
+        PriceRecord(FIGI_ID, now, 100),
+        PriceRecord(FIGI_ID, now, 100),
+        PriceRecord(FIGI_ID, now - 1, 99),
+        PriceRecord(FIGI_ID, now, 101)
+    ])
+
+    assert [(record.time_ns, record.price) for record in storage.records] == [(now, 100), (now, 101)]
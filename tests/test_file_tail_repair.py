@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from configuration.settings import StorageSettings
+from data_storage.files_columnar.columnar_data_storage import ColumnarDataStorage
+from data_storage.files_columnar.columnar_format import TRADE_RECORD, TRADE_TYPE_FOLDER, file_path
+from data_storage.files_csv.csv_data_reader import CSVDataReader
+from data_storage.files_csv.csv_data_storage import CSVDataStorage
+from data_storage.files_csv.csv_frames import RAW_FILE_NAMES, GZIP_COMPRESSION
+from invest_api.market_data_record import TradeRecord, figi_id, datetime_to_ns
+from invest_api.market_data_type import MarketDataType
+
+FIGI = "BBG004730N88"
+DAY = datetime.date(2022, 11, 2)
+DAY_START_NS = datetime_to_ns(datetime.datetime(2022, 11, 2, 10, tzinfo=datetime.timezone.utc))
+
+
+def _trades(first: int, count: int) -> list[TradeRecord]:
+    return [
+        TradeRecord(figi_id(FIGI), DAY_START_NS + second * 1_000_000_000, 1, 100_000_000_000, second)
+        for second in range(first, first + count)
+    ]
+
+
+def _save(storage, records: list[TradeRecord]) -> None:
+    storage.save_batch(records)
+    storage.close()
+
+
+def test_columnar_file_is_aligned_after_torn_record(tmp_path):
+    settings = StorageSettings({"root_path": str(tmp_path), "buffer_row_size": "100"})
+    _save(ColumnarDataStorage(settings), _trades(0, 3))
+
+    path = file_path(str(tmp_path), FIGI, TRADE_TYPE_FOLDER, DAY)
+    with open(path, "ab") as file:
+        file.write(b"torn")
+
+    _save(ColumnarDataStorage(settings), _trades(3, 2))
+
+    data = path.read_bytes()
+    assert len(data) == 5 * TRADE_RECORD.size
+    assert [TRADE_RECORD.unpack_from(data, offset)[3] for offset in range(0, len(data), TRADE_RECORD.size)] \
+        == list(range(5))
+
+
+def test_compressed_csv_is_cut_to_the_last_frame(tmp_path):
+    settings = StorageSettings({"root_path": str(tmp_path), "buffer_row_size": "100", "compression": GZIP_COMPRESSION})
+    _save(CSVDataStorage(settings), _trades(0, 3))
+
+    reader = CSVDataReader(str(tmp_path))
+    path = reader.file_path(FIGI, MarketDataType.TRADE, DAY).with_name(RAW_FILE_NAMES[GZIP_COMPRESSION])
+    with open(path, "ab") as file:
+        file.write(b"\x10\x00\x00\x00torn")
+
+    _save(CSVDataStorage(settings), _trades(3, 2))
+
+    assert [trade.quantity for trade in reader.trades(FIGI, DAY)] == list(range(5))
@@ -0,0 +1,40 @@
+import asyncio
+import datetime
+import random
+
+import pytest
+
+pytest.importorskip("tinkoff.invest.grpc.instruments_pb2_grpc")
+
+from tinkoff.invest import AioRequestError
+
+from invest_api.services.instrument_service import InstrumentService
+from tests.fake_api import fake_invest_api
+
+
+def _schedules(certificate: tuple[str, str], error_probability: float, seed: int) -> list:
+    async def scenario():
+        async with fake_invest_api(certificate, unary_error_probability=error_probability, seed=seed) as (target, _):
+            _from = datetime.datetime.utcnow().replace(tzinfo=datetime.timezone.utc)
+
+            return await InstrumentService("token", "tests", target).trading_schedules(
+                "MOEX", _from, _from + datetime.timedelta(days=2)
+            )
+
+    return asyncio.run(scenario())
+
+
+def test_request_is_retried_after_transient_error(fake_api_certificate):
+    seed = 1
+    # the first request of the server fails, the second one succeeds
+    errors = random.Random(seed)
+    assert errors.random() < 0.5 <= errors.random()
+
+    schedules = _schedules(fake_api_certificate, 0.5, seed)
+
+    assert schedules and schedules[0].days
+
+
+def test_request_fails_after_retry_count(fake_api_certificate):
+    with pytest.raises(AioRequestError):
+        _schedules(fake_api_certificate, 1.0, 42)
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from invest_api import invest_error_decorators
+from invest_api.invest_error_decorators import invest_api_retry, is_retryable, TRANSPORT_ERRORS
+
+
+@pytest.fixture
+def attempts(monkeypatch) -> list[int]:
+    """
+    Numbers of failed attempts passed to backoff, retries are made without delay
+    """
+    attempts = []
+
+    def backoff_delay(attempt: int, *_) -> float:
+        attempts.append(attempt)
+        return 0
+
+    monkeypatch.setattr(invest_error_decorators, "backoff_delay", backoff_delay)
+
+    return attempts
+
+
+def _flaky_stream(failures: int, items: int, item_delay_sec: float = 0):
+    """
+    A stream which yields items and fails with ConnectionError first failures times
+    """
+    calls = 0
+
+    async def stream():
+        nonlocal calls
+        calls += 1
+
+        for item in range(items):
+            await asyncio.sleep(item_delay_sec)
+            yield item
+
+        if calls <= failures:
+            raise ConnectionError("Stream has been broken")
+
+    return stream
+
+
+async def _collect(stream) -> list:
+    return [item async for item in stream()]
+
+
+def test_only_transport_errors_are_retryable():
+    assert is_retryable(ConnectionError())
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(TypeError())
+    assert not is_retryable(KeyError())
+
+
+def test_backoff_isnt_reset_by_short_streams(attempts):
+    stream = invest_api_retry(retry_count=None, exceptions=TRANSPORT_ERRORS, max_delay_sec=10)(_flaky_stream(4, 1))
+
+    assert asyncio.run(_collect(stream)) == [0] * 5
+    assert attempts == [1, 2, 3, 4]
+
+
+def test_backoff_is_reset_by_healthy_stream(attempts):
+    stream = invest_api_retry(retry_count=None, exceptions=TRANSPORT_ERRORS, max_delay_sec=0.01)(
+        _flaky_stream(3, 3, item_delay_sec=0.01)
+    )
+
+    assert asyncio.run(_collect(stream)) == [0, 1, 2] * 4
+    assert attempts == [1, 1, 1]
+
+
+def test_programming_errors_arent_retried(attempts):
+    calls = 0
+
+    @invest_api_retry(retry_count=None, exceptions=(Exception,))
+    async def request():
+        nonlocal calls
+        calls += 1
+        raise TypeError("Bug")
+
+    with pytest.raises(TypeError):
+        asyncio.run(request())
+
+    assert calls == 1
+    assert attempts == []
+
+
+def test_request_is_retried_up_to_retry_count(attempts):
+    calls = 0
+
+    @invest_api_retry(retry_count=3)
+    async def request():
+        nonlocal calls
+        calls += 1
+        raise ConnectionError("Connection refused")
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(request())
+
+    assert calls == 3
+    assert attempts == [1, 2]
@@ -0,0 +1,34 @@
+import datetime
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from configuration.settings import StorageSettings
+from data_storage.journal.journal_data_storage import JournalDataStorage
+from data_storage.journal.journal_reader import JournalReader
+from invest_api.market_data_record import TradeRecord, figi_id, datetime_to_ns
+
+FIGI = "BBG004730N88"
+RECEIVE_TIME_NS = datetime_to_ns(datetime.datetime(2022, 11, 2, 10, tzinfo=datetime.timezone.utc))
+
+
+def _trade(receive_time_ns: int) -> TradeRecord:
+    trade = TradeRecord(figi_id(FIGI), RECEIVE_TIME_NS - 1_000_000, 1, 100_000_000_000, 1)
+    trade.receive_time_ns = receive_time_ns
+
+    return trade
+
+
+def test_receive_time_of_event_loop_is_written(tmp_path):
+    storage = JournalDataStorage(StorageSettings({"root_path": str(tmp_path)}))
+
+    # the batch has been written later than received, e.g. behind the storage queue
+    storage.save_batch([_trade(RECEIVE_TIME_NS), _trade(RECEIVE_TIME_NS + 5)])
+    # receive time never goes back
+    storage.save_batch([_trade(RECEIVE_TIME_NS + 3), _trade(RECEIVE_TIME_NS + 7)])
+    storage.close()
+
+    records = JournalReader(str(tmp_path), datetime.date(2022, 11, 2)).records()
+
+    assert [record.receive_time_ns - RECEIVE_TIME_NS for record in records] == [0, 5, 5, 7]
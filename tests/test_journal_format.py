@@ -0,0 +1,22 @@
+from data_storage.journal.journal_format import RECORD_HEADER, INDEX_ENTRY, repair_journal
+
+
+def test_journal_is_cut_to_the_last_complete_record(tmp_path):
+    journal_path, index_path = tmp_path.joinpath("market_data.journal"), tmp_path.joinpath("market_data.journal.idx")
+
+    journal, index = b"", b""
+    for number in range(5):
+        if number % 2 == 0:
+            index += INDEX_ENTRY.pack(number, len(journal))
+        journal += RECORD_HEADER.pack(3, number) + b"abc"
+
+    # the last record and the last index entry are written partially
+    journal_path.write_bytes(journal + RECORD_HEADER.pack(10, 9) + b"ab")
+    index_path.write_bytes(index + INDEX_ENTRY.pack(9, len(journal) + 100) + b"12")
+
+    assert repair_journal(journal_path, index_path) == RECORD_HEADER.size + 2
+    assert journal_path.read_bytes() == journal
+    assert index_path.read_bytes() == index
+
+    # nothing to repair
+    assert repair_journal(journal_path, index_path) == 0
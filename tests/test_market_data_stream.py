@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("tinkoff.invest.grpc.marketdata_pb2_grpc")
+
+from configuration.settings import DataCollectionSettings, MarketDataStreamSettings
+from fake_invest_api.fake_stream_scenario import FakeFault, FakeStreamPhase
+from invest_api.market_data_type import MarketDataType, market_data_type
+from invest_api.services.market_data_stream_service import MarketDataStreamService
+from tests.fake_api import fake_invest_api
+
+FIGIES = ["BBG004730N88", "BBG004730ZJ9", "BBG004731032"]
+ALL_DATA = DataCollectionSettings(candles=True, trades=True, last_price=True)
+
+
+async def _collect(service: MarketDataStreamService, settings: DataCollectionSettings, until) -> list:
+    """
+    Collects market data until the condition is true for collected list, then stops the service
+    """
+    received = []
+
+    async for market_data in service.start_async_candles_stream(FIGIES, settings):
+        received.append(market_data)
+
+        if until(received):
+            service.stop_candles_stream()
+
+    return received
+
+
+def test_stream_receives_all_subscriptions(fake_api_certificate):
+    async def scenario():
+        async with fake_invest_api(fake_api_certificate) as (target, _):
+            service = MarketDataStreamService(
+                "token", "tests", MarketDataStreamSettings(shards_count=2, reconnect_delay_sec=1), target
+            )
+
+            received = await asyncio.wait_for(
+                _collect(service, ALL_DATA, lambda received: len(received) >= 300 and service.is_ready()),
+                timeout=30
+            )
+
+            assert {market_data_type(market_data) for market_data in received} - {None} \
+                == {(figi, data_type) for data_type in MarketDataType for figi in FIGIES}
+
+    asyncio.run(scenario())
+
+
+def test_stream_reconnects_after_disconnect(fake_api_certificate):
+    # streams are aborted with UNAVAILABLE for 1 second, then market data is streamed again
+    phases = [FakeStreamPhase(duration_sec=1), FakeStreamPhase(duration_sec=1, fault=FakeFault.DISCONNECT)]
+
+    async def scenario():
+        async with fake_invest_api(fake_api_certificate, phases) as (target, stream_servicer):
+            service = MarketDataStreamService(
+                "token", "tests", MarketDataStreamSettings(shards_count=1, reconnect_delay_sec=1), target
+            )
+            loop = asyncio.get_running_loop()
+            recovery_time = loop.time() + 2.5
+
+            received = await asyncio.wait_for(
+                _collect(service, ALL_DATA, lambda _: loop.time() >= recovery_time and service.is_ready()),
+                timeout=30
+            )
+
+            assert received
+            # the first stream and at least one retry after the disconnect
+            assert stream_servicer.connections_count >= 2
+
+    asyncio.run(scenario())
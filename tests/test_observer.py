@@ -0,0 +1,148 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from configuration.settings import WatcherSettings
+from invest_api.market_data_type import MarketDataType
+from observation.instrument_activity_tracker import InstrumentActivityTracker
+from observation.observable import IObservableDataCollector
+from observation.observer import Observer
+
+FIGI = "BBG004730N88"
+
+
+class _Collector(IObservableDataCollector):
+    """
+    Collection is in progress from the start, events are sent by the test
+    """
+    def __init__(self, tracker: InstrumentActivityTracker) -> None:
+        self.tracker = tracker
+        self.restarts: list[float] = []
+        self.resubscriptions: list[tuple[str, MarketDataType]] = []
+        self.__in_progress = asyncio.Event()
+        self.__stopped = asyncio.Event()
+        self.__last_event = 0.0
+        self.__has_events = False
+        self.start()
+
+    def start(self) -> None:
+        self.__last_event = time.monotonic()
+        self.__has_events = False
+        self.tracker.start([(FIGI, MarketDataType.TRADE), (FIGI, MarketDataType.CANDLE)], self.__last_event)
+        self.__stopped.clear()
+        self.__in_progress.set()
+
+    def stop(self) -> None:
+        self.tracker.stop()
+        self.__in_progress.clear()
+        self.__stopped.set()
+
+    def event(self, data_type: MarketDataType) -> None:
+        self.__last_event = time.monotonic()
+        self.__has_events = True
+        self.tracker.update(FIGI, data_type, self.__last_event)
+
+    def last_event_time(self) -> float:
+        return self.__last_event
+
+    def has_events(self) -> bool:
+        return self.__has_events
+
+    def is_collection_in_progress(self) -> bool:
+        return self.__in_progress.is_set()
+
+    async def wait_collection_in_progress(self) -> None:
+        await self.__in_progress.wait()
+
+    async def wait_collection_stopped(self) -> None:
+        await self.__stopped.wait()
+
+    def restart(self) -> None:
+        self.restarts.append(time.monotonic())
+        self.stop()
+
+    def stale_subscriptions(self) -> list[tuple[str, MarketDataType]]:
+        return self.tracker.stale(time.monotonic())
+
+    def next_stale_deadline(self) -> float:
+        return self.tracker.next_deadline()
+
+    def resubscribe(self, figi: str, data_type: MarketDataType) -> None:
+        self.resubscriptions.append((figi, data_type))
+        self.tracker.reset(figi, data_type, time.monotonic())
+
+
+def _observer(min_silence_sec: float) -> tuple[Observer, _Collector]:
+    settings = WatcherSettings(
+        max_sec_api_silence=0.2, delay_between_api_errors_sec=0,
+        instrument_silence_min_sec=min_silence_sec, instrument_silence_max_sec=900, instrument_silence_rate_factor=20
+    )
+    collector = _Collector(InstrumentActivityTracker(min_silence_sec, 900, 20))
+
+    return Observer(settings, collector), collector
+
+
+async def _watch(observer: Observer, seconds: float) -> None:
+    task = asyncio.create_task(observer.worker())
+    await asyncio.sleep(seconds)
+    task.cancel()
+
+
+def test_stream_hung_right_after_connect_is_restarted():
+    async def run() -> None:
+        # the per subscription limit is longer than the stream silence limit
+        observer, collector = _observer(min_silence_sec=5)
+        started = time.monotonic()
+
+        await _watch(observer, 0.5)
+
+        assert len(collector.restarts) == 1
+        assert 0.2 <= collector.restarts[0] - started < 0.4
+
+    asyncio.run(run())
+
+
+def test_stream_hung_right_after_reconnect_is_restarted():
+    async def run() -> None:
+        observer, collector = _observer(min_silence_sec=5)
+        task = asyncio.create_task(observer.worker())
+
+        for _ in range(3):
+            collector.event(MarketDataType.TRADE)
+            await asyncio.sleep(0.05)
+
+        await asyncio.sleep(0.5)
+        # a quiet market: nothing is restarted while the trade subscription has history
+        assert collector.restarts == []
+
+        # the stream has reconnected by self and hangs
+        collector.stop()
+        collector.start()
+        await asyncio.sleep(0.4)
+        task.cancel()
+
+        assert len(collector.restarts) == 1
+
+    asyncio.run(run())
+
+
+def test_subscription_without_events_is_resubscribed_with_growing_limit():
+    async def run() -> None:
+        observer, collector = _observer(min_silence_sec=0.1)
+        task = asyncio.create_task(observer.worker())
+
+        # trades keep the stream alive, candles never come
+        for _ in range(12):
+            collector.event(MarketDataType.TRADE)
+            await asyncio.sleep(0.05)
+
+        task.cancel()
+
+        # 0.1 and 0.3 sec after subscription, the next one is 0.7 sec after subscription
+        assert collector.resubscriptions == [(FIGI, MarketDataType.CANDLE)] * 2
+        assert collector.restarts == []
+
+    asyncio.run(run())
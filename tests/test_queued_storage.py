@@ -0,0 +1,181 @@
+import asyncio
+import pickle
+import struct
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from configuration.settings import StorageQueueSettings
+from data_storage.queued_storage import QueuedStorage
+from invest_api.market_data_record import MarketDataRecord
+from tests.storage_stubs import MemoryStorage
+
+SPILL_LENGTH = struct.Struct("<I")
+
+
+class GatedStorage(MemoryStorage):
+    """
+    Writes wait until the gate is opened, so the queue is filled
+    """
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.gate = threading.Event()
+        # count of saved records at every flush
+        self.flushes: list[int] = []
+
+    def save_batch(self, records: list[MarketDataRecord]) -> None:
+        self.gate.wait()
+        super().save_batch(records)
+
+    def flush(self) -> None:
+        self.flushes.append(len(self.records))
+
+
+def _write_spill(file_name, batches: list, torn: bool = False) -> None:
+    with open(file_name, "wb") as file:
+        for batch in batches:
+            data = pickle.dumps((time.monotonic(), batch))
+            file.write(SPILL_LENGTH.pack(len(data)) + data)
+
+        if torn:
+            file.write(SPILL_LENGTH.pack(100) + b"torn")
+
+
+def test_drop_oldest_keeps_commands():
+    storage = GatedStorage()
+    queued = QueuedStorage(storage, StorageQueueSettings(enabled=True, max_size=3, overflow_policy="DROP_OLDEST"))
+
+    queued.save_batch([0])
+    # the writer waits on the first batch
+    time.sleep(0.1)
+    queued.flush()
+
+    put_start = time.monotonic()
+    for item in range(1, 10):
+        queued.save_batch([item])
+
+    # the caller doesn't wait for the writer
+    assert time.monotonic() - put_start < 0.5
+    assert queued.dropped_count == 7
+
+    storage.gate.set()
+    queued.close()
+
+    assert storage.records == [0, 8, 9]
+    # the flush and the stop commands
+    assert storage.flushes == [1, 3]
+
+
+def test_spilled_items_are_saved_in_order(tmp_path):
+    storage = GatedStorage()
+    queued = QueuedStorage(
+        storage, StorageQueueSettings(enabled=True, max_size=2, overflow_policy="SPILL", spill_path=str(tmp_path))
+    )
+
+    for item in range(10):
+        queued.save_batch([item])
+
+    assert queued.spilled_count > 0
+
+    storage.gate.set()
+    queued.close()
+
+    assert storage.records == list(range(10))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spill_of_previous_run_is_saved_first(tmp_path):
+    # the previous run has crashed while replaying and spilling
+    _write_spill(tmp_path.joinpath("storage_queue.spill.replay"), [["replay-1"], ["replay-2"]], torn=True)
+    _write_spill(tmp_path.joinpath("storage_queue.spill"), [["spill-1"]], torn=True)
+
+    storage = GatedStorage()
+    storage.gate.set()
+    queued = QueuedStorage(
+        storage, StorageQueueSettings(enabled=True, max_size=10, overflow_policy="SPILL", spill_path=str(tmp_path))
+    )
+
+    queued.save_batch(["new"])
+    queued.close()
+
+    assert storage.records == ["replay-1", "replay-2", "spill-1", "new"]
+    # put time of the previous run isn't a lag
+    assert queued.lag_sec < 1
+
+
+def test_block_waits_for_free_space_without_blocking_event_loop():
+    async def run() -> None:
+        storage = GatedStorage()
+        queued = QueuedStorage(storage, StorageQueueSettings(enabled=True, max_size=2, overflow_policy="BLOCK"))
+
+        for item in range(4):
+            queued.save_batch([item])
+
+        ticks = 0
+
+        async def tick() -> None:
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        asyncio.get_running_loop().call_later(0.2, storage.gate.set)
+
+        wait_start = time.monotonic()
+        await queued.wait_writable()
+
+        assert time.monotonic() - wait_start >= 0.2
+        # the event loop has been running while waiting
+        assert ticks >= 10
+
+        ticker.cancel()
+        queued.close()
+
+        assert storage.records == list(range(4))
+        assert queued.dropped_count == 0
+
+    asyncio.run(run())
+
+
+def test_commands_are_done_after_spill(tmp_path):
+    storage = GatedStorage()
+    queued = QueuedStorage(
+        storage, StorageQueueSettings(enabled=True, max_size=2, overflow_policy="SPILL", spill_path=str(tmp_path))
+    )
+
+    for item in range(5):
+        queued.save_batch([item])
+    queued.flush()
+    queued.save_batch([5])
+
+    storage.gate.set()
+    queued.close()
+
+    assert storage.records == list(range(6))
+    # the flush and the stop commands are done after the spill has been replayed
+    assert storage.flushes == [6, 6]
+
+
+def test_stop_command_in_spill_of_previous_run_is_skipped(tmp_path):
+    # a spill file of an older version has a stop command in the middle
+    _write_spill(tmp_path.joinpath("storage_queue.spill"), [["spill-1"], "STOP", ["spill-2"]])
+
+    storage = GatedStorage()
+    storage.gate.set()
+    queued = QueuedStorage(
+        storage, StorageQueueSettings(enabled=True, max_size=10, overflow_policy="SPILL", spill_path=str(tmp_path))
+    )
+
+    queued.save_batch(["new"])
+    time.sleep(0.1)
+    # the writer is still running
+    queued.save_batch(["newer"])
+    queued.close()
+
+    assert storage.records == ["spill-1", "spill-2", "new", "newer"]
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,101 @@
+import collections
+import datetime
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from tinkoff.invest import Candle, LastPrice, MarketDataResponse, Quotation, Trade, TradeDirection
+
+from configuration.settings import MarketDataStreamSettings
+from invest_api.services.market_data_stream_service import MarketDataStreamService
+
+FIGI = "BBG004730N88"
+TIME = datetime.datetime(2022, 11, 2, 10, 0, tzinfo=datetime.timezone.utc)
+
+is_first = MarketDataStreamService._MarketDataStreamService__is_first
+
+
+def _candle(volume: int) -> MarketDataResponse:
+    price = Quotation(units=100, nano=0)
+
+    return MarketDataResponse(
+        candle=Candle(figi=FIGI, open=price, high=price, low=price, close=price, volume=volume, time=TIME)
+    )
+
+
+def _trade(quantity: int) -> MarketDataResponse:
+    return MarketDataResponse(
+        trade=Trade(
+            figi=FIGI, direction=TradeDirection.TRADE_DIRECTION_BUY, price=Quotation(units=100, nano=0),
+            quantity=quantity, time=TIME
+        )
+    )
+
+
+def _merge(events: list[tuple[int, MarketDataResponse]], window_size: int = 100) -> list[MarketDataResponse]:
+    """
+    :param events: copy and market data in arrival order
+    :return: forwarded market data
+    """
+    window = collections.OrderedDict()
+
+    return [market_data for copy, market_data in events if is_first(window, window_size, copy, market_data)]
+
+
+def test_copy_of_event_is_dropped():
+    forwarded = _merge([(0, _trade(1)), (1, _trade(1)), (1, _trade(2)), (0, _trade(2))])
+
+    assert [market_data.trade.quantity for market_data in forwarded] == [1, 2]
+
+
+def test_equal_events_of_one_stream_are_kept():
+    forwarded = _merge([(0, _trade(1)), (0, _trade(1)), (1, _trade(1)), (1, _trade(1)), (1, _trade(1))])
+
+    assert [market_data.trade.quantity for market_data in forwarded] == [1, 1, 1]
+
+
+def test_candle_updates_are_forwarded_by_growing_volume():
+    # the copy 1 lags: its updates of the candle come after newer updates of the copy 0
+    forwarded = _merge([(0, _candle(10)), (0, _candle(20)), (1, _candle(10)), (1, _candle(20)),
+                        (1, _candle(30)), (0, _candle(30))])
+
+    assert [market_data.candle.volume for market_data in forwarded] == [10, 20, 30]
+
+
+def test_service_messages_are_forwarded():
+    forwarded = _merge([(0, MarketDataResponse()), (1, MarketDataResponse())])
+
+    assert len(forwarded) == 2
+
+
+def test_last_prices_are_deduplicated():
+    last_price = MarketDataResponse(last_price=LastPrice(figi=FIGI, price=Quotation(units=1, nano=0), time=TIME))
+
+    assert len(_merge([(0, last_price), (1, last_price)])) == 1
+
+
+class _Shard:
+    def __init__(self, shard_id: int) -> None:
+        self.shard_id = shard_id
+        self.restarts = 0
+
+    def restart(self) -> None:
+        self.restarts += 1
+
+
+def test_silent_shard_is_restarted():
+    service = MarketDataStreamService(
+        "token", "tests", MarketDataStreamSettings(shards_count=2, redundant=True, redundant_silence_sec=30)
+    )
+    shards = [_Shard(shard_id) for shard_id in range(4)]
+    service._MarketDataStreamService__shards = shards
+
+    now = 1000.0
+    # shard 1 is silent while shard 3 (the same subscriptions) receives market data, shards 0 and 2 are quiet both
+    last_events = [now - 60, now - 60, now - 60, now - 1]
+
+    service._MarketDataStreamService__restart_silent_shards(last_events, 2, now)
+
+    assert [shard.restarts for shard in shards] == [0, 1, 0, 0]
+    assert last_events[1] == now
@@ -0,0 +1,49 @@
+import datetime
+import sqlite3
+import time
+
+import pytest
+
+pytest.importorskip("tinkoff.invest")
+
+from configuration.settings import StorageSettings
+from data_storage.sqlite.sqlite_data_storage import SQLiteDataStorage
+from invest_api.market_data_record import TradeRecord, figi_id, datetime_to_ns
+
+FIGI = "BBG004730N88"
+
+
+def _trade(day: int, quantity: int) -> TradeRecord:
+    time_ns = datetime_to_ns(datetime.datetime(2022, 11, day, 10, tzinfo=datetime.timezone.utc))
+
+    return TradeRecord(figi_id(FIGI), time_ns, 1, 100_000_000_000, quantity)
+
+
+def _quantities(root_path, day: int) -> list[int]:
+    with sqlite3.connect(root_path.joinpath("2022", "11", str(day), "market_data.sqlite")) as connection:
+        return [quantity for (quantity,) in connection.execute("SELECT quantity FROM trade ORDER BY rowid")]
+
+
+def test_rows_are_committed_by_timer(tmp_path):
+    storage = SQLiteDataStorage(StorageSettings({"root_path": str(tmp_path), "commit_interval_sec": "0.2"}))
+
+    storage.save_batch([_trade(2, 1)])
+    storage.save_batch([_trade(2, 2)])
+    # no market data after that
+    time.sleep(0.5)
+
+    assert _quantities(tmp_path, 2) == [1, 2]
+
+    storage.close()
+
+
+def test_rows_of_older_day_are_written_into_own_database(tmp_path):
+    storage = SQLiteDataStorage(StorageSettings({"root_path": str(tmp_path), "commit_interval_sec": "60"}))
+
+    storage.save_batch([_trade(1, 1), _trade(2, 2)])
+    # e.g. a backfilled or a late row
+    storage.save_batch([_trade(1, 3), _trade(2, 4)])
+    storage.close()
+
+    assert _quantities(tmp_path, 1) == [1, 3]
+    assert _quantities(tmp_path, 2) == [2, 4]